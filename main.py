@@ -1,33 +1,18 @@
-import pandas as pd
-import yfinance as yf
-
 from src.backtest_engine import BacktestEngine
+from src.ingestion import read_order_book
+from src.ohlcv_store import OHLCVStore
 
-# Read Trade Order Data
-trade_orders = pd.read_csv("src/data_store/order_input/aapl_demo_trade_order_v2.csv")
-
-# Convert the 'order_date' column to datetime
-trade_orders["order_date"] = pd.to_datetime(trade_orders["order_date"], format="%Y-%m-%d")
-
-trade_orders["limit_offset"] = trade_orders["limit_offset"].fillna(0.0)
-trade_orders["limit_price"] = trade_orders["limit_price"].fillna(0.0)
-trade_orders["stop_price"] = trade_orders["stop_price"].fillna(0.0)
-trade_orders["trail_type"] = trade_orders["trail_type"].fillna("N.A.")
+# Read Trade Order Data, typed and validated, missing prices and trail types are filled with their defaults
+trade_orders = read_order_book("src/data_store/order_input/aapl_demo_trade_order_v2.csv")
 
 
 # Fetching data for three stocks
 symbols = ["AAPL", "GOOGL", "MSFT"]
-dfs = []
-
-# Fetch and store each stock's data in a DataFrame
-for symbol in symbols:
-    # df = yf.download(symbol, start="2022-09-01", end="2022-10-01")
-    df = yf.download(symbol, start="2022-01-01", end="2024-02-01")
-    df.columns = pd.MultiIndex.from_product([[symbol], df.columns])
-    dfs.append(df)
 
-# Combine all DataFrames horizontally
-df_combined = pd.concat(dfs, axis=1)
+# Only dates missing from the local store are downloaded, the backtest runs offline once they are cached
+ohlcv_store = OHLCVStore("src/data_store/ohlcv")
+ohlcv_store.update(symbols, start="2022-01-01", end="2024-02-01")
+df_combined = ohlcv_store.load(symbols, start="2022-01-01", end="2024-02-01")
 
 # No need volume
 
@@ -0,0 +1,196 @@
+import time
+import typing
+from dataclasses import dataclass, field
+from typing import Dict, Union
+
+import numpy as np
+import pandas as pd
+
+from src import constants
+from src.backtest_engine import BacktestEngine
+from src.cost_models import CommissionModel, SlippageModel
+from src.instrumentation import NULL_PROFILER, Profiler, progress_bar
+from src.market_data import MarketData
+
+if typing.TYPE_CHECKING:
+    from tqdm import tqdm
+
+
+@dataclass
+class Account:
+    # Orders of the account, in the format of BacktestEngine.order_book
+    order_book: pd.DataFrame
+    initial_capital: float = 100000.0
+    fee_model: Union[str, CommissionModel] = constants.FEE_MODEL_FIXED
+    slippage_model: Union[str, SlippageModel] = None
+    ticker_fee_models: Dict[str, Union[str, CommissionModel]] = field(default_factory=dict)
+    ticker_slippage_models: Dict[str, Union[str, SlippageModel]] = field(default_factory=dict)
+
+
+def split_accounts(order_book: pd.DataFrame, column: str = "account", **account_kwargs) -> Dict[str, Account]:
+    """
+    Accounts of an order book whose orders are tagged by account in column
+
+    :param order_book:
+    :param column:
+    :param account_kwargs: initial_capital, cost models... of every account, see Account
+    :return: accounts keyed by the values of column
+    """
+    return {
+        name: Account(order_book=orders.drop(columns=column).reset_index(drop=True), **account_kwargs)
+        for name, orders in order_book.groupby(column, sort=False)
+    }
+
+
+class MultiAccountEngine:
+    """
+    Backtest several accounts, e.g. strategies, over the same OHLCV data in a single pass over the bars
+
+    Every account keeps its own order book, capital, cost models and stock entities in a BacktestEngine, while the
+    price matrices and trading sessions are built once and shared. On every bar the orders of all the accounts due
+    on that bar are processed before moving to the next bar. With skip_idle_bars, an account is only visited on its
+    own event bars and its records are filled in up to its next event, so accounts without orders on a bar cost
+    nothing. The results of every account are the same as those of a BacktestEngine run on its own.
+
+    The per-bar step is not batched across accounts: the accounts due on a bar are processed one after the other, each
+    with its own fill detection, see BacktestEngine.select_orders_to_process, and its own settlement. Only the market
+    data, the sessions and the pass over the bars are shared.
+    """
+
+    def __init__(
+        self,
+        accounts: Dict[str, Account],
+        ohlvc: pd.DataFrame = None,
+        market_data: MarketData = None,
+        fill_mode: str = constants.FILL_MODE_SEQUENTIAL,
+        skip_idle_bars: bool = False,
+        show_progress: bool = True,
+        profiler: Profiler = None,
+        session_start: str = "00:00:00",
+        validate: bool = True,
+    ):
+        """
+        :param accounts: accounts keyed by name
+        :param ohlvc: DataFrame with (ticker, field) MultiIndex columns
+        :param market_data: price matrices shared with other engines, instead of ohlvc
+        :param fill_mode: see BacktestEngine, the same for every account
+        :param skip_idle_bars:
+        :param show_progress:
+        :param profiler: timing of every phase, accumulated over all the accounts
+        :param session_start:
+        :param validate: validate the order book of every account, see ingestion.validate_order_book
+        """
+        if market_data is None:
+            tickers = pd.unique(pd.concat([account.order_book["ticker"] for account in accounts.values()]))
+            market_data = MarketData.from_ohlvc(ohlvc, tickers=tickers)
+        self.ohlvc = ohlvc
+        self.market_data = market_data
+        self.skip_idle_bars = skip_idle_bars
+        self.show_progress = show_progress
+        self.profiler = NULL_PROFILER if profiler is None else profiler
+        self.session_start = pd.Timedelta(session_start).value
+        self.engines = {
+            name: BacktestEngine(
+                order_book=account.order_book,
+                ohlvc=ohlvc,
+                initial_capital=account.initial_capital,
+                fill_mode=fill_mode,
+                skip_idle_bars=skip_idle_bars,
+                market_data=market_data,
+                show_progress=False,
+                profiler=self.profiler,
+                fee_model=account.fee_model,
+                slippage_model=account.slippage_model,
+                ticker_fee_models=account.ticker_fee_models,
+                ticker_slippage_models=account.ticker_slippage_models,
+                session_start=session_start,
+                validate=validate,
+            )
+            for name, account in accounts.items()
+        }
+
+    def run_bars(self, progress: "tqdm"):
+        """
+        Process every bar once, for all the accounts with an order that can change state on it
+
+        The accounts due on a bar are processed one at a time, the fill detection of their orders is not stacked
+        into a single call.
+
+        :param progress: progress bar, see instrumentation.progress_bar
+        :return:
+        """
+        market_data = self.market_data
+        profiler = self.profiler
+        engines = list(self.engines.values())
+        session, session_end = market_data.sessions(self.session_start)
+        for backtest_engine in engines:
+            backtest_engine.session, backtest_engine.session_end = session, session_end
+
+        # Next bar every account has to be processed on
+        next_bars = np.zeros(len(engines), dtype=np.int64)
+        bar = 0
+        while bar < len(market_data):
+            bar_start = time.perf_counter() if profiler.enabled else 0.0
+            current_timestamp = typing.cast(pd.Timestamp, market_data.index[bar])
+
+            for i in np.flatnonzero(next_bars == bar):
+                backtest_engine = engines[i]
+                backtest_engine.process_orders(bar, current_timestamp)
+                if self.skip_idle_bars:
+                    with profiler.phase("next_event_bar"):
+                        next_bar = backtest_engine.next_event_bar(bar)
+                else:
+                    next_bar = bar + 1
+                with profiler.phase("update_records"):
+                    backtest_engine.update_records(bar, next_bar)
+                backtest_engine.bar = next_bars[i] = next_bar
+
+            next_bar = int(next_bars.min()) if len(engines) else len(market_data)
+            if profiler.enabled:
+                profiler.record_bar(bar, time.perf_counter() - bar_start)
+            progress.update(next_bar - bar)
+            bar = next_bar
+
+        for backtest_engine in engines:
+            backtest_engine.settle_trailing_stops(len(market_data) - 1)
+
+    def backtest(self):
+        for backtest_engine in self.engines.values():
+            backtest_engine.start_backtest()
+
+        progress = progress_bar(total=len(self.market_data), enabled=self.show_progress)
+        self.run_bars(progress)
+        progress.close()
+
+        for backtest_engine in self.engines.values():
+            backtest_engine.finish_backtest()
+
+    @property
+    def combined_holding_records(self) -> Dict[str, pd.DataFrame]:
+        """
+        Combined holding records of every account, see BacktestEngine.combined_holding_records
+
+        :return:
+        """
+        return {name: backtest_engine.combined_holding_records for name, backtest_engine in self.engines.items()}
+
+    @property
+    def summary(self) -> pd.DataFrame:
+        """
+        Final NAV, fees, total return, Sharpe ratio and max drawdown of every account
+
+        :return: one row per account
+        """
+        rows = {}
+        for name, backtest_engine in self.engines.items():
+            analytics = backtest_engine.analytics
+            nav = analytics.nav.to_numpy()
+            final_nav = nav[-1] if len(nav) else backtest_engine.initial_capital
+            rows[name] = {
+                "final_nav": final_nav,
+                "total_fees": backtest_engine.fees,
+                "total_return": final_nav / backtest_engine.initial_capital - 1,
+                "sharpe": analytics.sharpe,
+                "max_drawdown": analytics.max_drawdown,
+            }
+        return pd.DataFrame.from_dict(rows, orient="index").rename_axis("account")
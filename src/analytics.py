@@ -0,0 +1,208 @@
+from functools import cached_property
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+
+class PortfolioAnalytics:
+    """
+    Portfolio metrics derived from the holding and portfolio record arrays of a backtest
+
+    Every metric is computed on first access and cached, so asking for one metric only pays for the arrays it
+    depends on and repeated accesses are free. Build it from a finished backtest with BacktestEngine.analytics,
+    which is rebuilt whenever new bars are recorded.
+    """
+
+    PORTFOLIO_STATS_COLUMNS = [
+        "sharpe",
+        "turnover",
+        "returns",
+        "max_drawdown",
+        "margin",
+        "long_count",
+        "short_count",
+    ]
+
+    def __init__(
+        self,
+        dates: np.ndarray,
+        tickers: List[str],
+        quantities: List[np.ndarray],
+        prices: List[np.ndarray],
+        capital: np.ndarray,
+        fees: np.ndarray,
+        periods_per_year: int = 252,
+    ):
+        """
+        :param dates: datetime64 date of every record
+        :param tickers:
+        :param quantities: position of every ticker on every record, one array per ticker
+        :param prices: adjusted close of every ticker on every record, one array per ticker
+        :param capital: cash on every record
+        :param fees: fees paid up to every record
+        :param periods_per_year: number of records per year, used to annualize the Sharpe ratio
+        """
+        self.dates = dates
+        self.tickers = list(tickers)
+        self.quantities = quantities
+        self.prices = prices
+        self.capital = capital
+        self.fees = fees
+        self.periods_per_year = periods_per_year
+
+    @classmethod
+    def from_engine(cls, backtest_engine, periods_per_year: int = 252) -> "PortfolioAnalytics":
+        """
+        Analytics of the bars recorded so far by a BacktestEngine, the record arrays are used without copying
+
+        :param backtest_engine:
+        :param periods_per_year:
+        :return:
+        """
+        n = backtest_engine.portfolio_records_size
+        stocks = backtest_engine.stocks
+        return cls(
+            dates=backtest_engine.portfolio_dates[:n],
+            tickers=list(stocks),
+            quantities=[stock_entity.holding_quantity[:n] for stock_entity in stocks.values()],
+            prices=[stock_entity.holding_adjusted_close[:n] for stock_entity in stocks.values()],
+            capital=backtest_engine.portfolio_capital[:n],
+            fees=backtest_engine.portfolio_fees[:n],
+            periods_per_year=periods_per_year,
+        )
+
+    def last_of_session(self, session: np.ndarray) -> "PortfolioAnalytics":
+        """
+        Analytics of the last record of every trading session, e.g. the daily view of intraday records
+
+        :param session: session of every record, non decreasing, see MarketData.session_of
+        :return: self when every record is a session of its own, e.g. with daily bars
+        """
+        last = np.append(session[1:] != session[:-1], True) if len(session) else np.zeros(0, dtype=bool)
+        if last.all():
+            return self
+        return PortfolioAnalytics(
+            dates=self.dates[last],
+            tickers=self.tickers,
+            quantities=[quantity[last] for quantity in self.quantities],
+            prices=[price[last] for price in self.prices],
+            capital=self.capital[last],
+            fees=self.fees[last],
+            periods_per_year=self.periods_per_year,
+        )
+
+    def __len__(self):
+        return len(self.dates)
+
+    @cached_property
+    def index(self) -> pd.DatetimeIndex:
+        return pd.DatetimeIndex(self.dates)
+
+    @cached_property
+    def quantity(self) -> np.ndarray:
+        """Positions, shape (records, tickers)"""
+        return self._stack(self.quantities)
+
+    @cached_property
+    def price(self) -> np.ndarray:
+        """Adjusted close prices, shape (records, tickers)"""
+        return self._stack(self.prices)
+
+    def _stack(self, columns: List[np.ndarray]) -> np.ndarray:
+        return np.column_stack(columns) if columns else np.zeros((len(self), 0))
+
+    @cached_property
+    def position_values(self) -> np.ndarray:
+        """Market value of every position, shape (records, tickers), NaN where the ticker has no price"""
+        return self.quantity * self.price
+
+    @cached_property
+    def nav(self) -> pd.Series:
+        """Net asset value: capital plus the market value of every position, missing prices count as 0"""
+        # Summed ticker by ticker, in the same order as the combined holding records
+        nav = np.zeros(len(self))
+        for column in range(self.position_values.shape[1]):
+            values = self.position_values[:, column]
+            nav = nav + np.where(np.isnan(values), 0.0, values)
+        return pd.Series(nav + self.capital, index=self.index, name="nav")
+
+    @cached_property
+    def returns(self) -> pd.Series:
+        """Returns of the NAV from one record to the next, NaN on the first record"""
+        return self.nav.pct_change().rename("returns")
+
+    @cached_property
+    def drawdown(self) -> pd.Series:
+        """Drop of the NAV from its running maximum, 0 at a new high"""
+        nav = self.nav.to_numpy()
+        return pd.Series(nav / np.maximum.accumulate(nav) - 1, index=self.index, name="drawdown")
+
+    @cached_property
+    def max_drawdown(self) -> float:
+        return float(self.drawdown.min()) if len(self) else 0.0
+
+    @cached_property
+    def gross_exposure(self) -> pd.Series:
+        """Sum of the absolute market values of the positions"""
+        return pd.Series(np.nansum(np.abs(self.position_values), axis=1), index=self.index, name="gross_exposure")
+
+    @cached_property
+    def net_exposure(self) -> pd.Series:
+        """Long minus short market value of the positions"""
+        return pd.Series(np.nansum(self.position_values, axis=1), index=self.index, name="net_exposure")
+
+    @cached_property
+    def margin(self) -> pd.Series:
+        """Gross exposure as a fraction of the NAV"""
+        return (self.gross_exposure / self.nav).rename("margin")
+
+    @cached_property
+    def long_count(self) -> pd.Series:
+        return pd.Series((self.quantity > 0).sum(axis=1), index=self.index, name="long_count")
+
+    @cached_property
+    def short_count(self) -> pd.Series:
+        return pd.Series((self.quantity < 0).sum(axis=1), index=self.index, name="short_count")
+
+    @cached_property
+    def turnover(self) -> pd.Series:
+        """Market value traded since the previous record as a fraction of the NAV"""
+        traded = np.abs(np.diff(self.quantity, axis=0, prepend=0.0)) * self.price
+        return pd.Series(np.nansum(traded, axis=1), index=self.index).div(self.nav).rename("turnover")
+
+    @cached_property
+    def sharpe(self) -> float:
+        """Annualized Sharpe ratio of the returns, with a zero risk free rate"""
+        returns = self.returns.to_numpy()[1:]
+        if len(returns) < 2 or returns.std(ddof=1) == 0:
+            return np.nan
+        return float(returns.mean() / returns.std(ddof=1) * np.sqrt(self.periods_per_year))
+
+    @cached_property
+    def expanding_sharpe(self) -> pd.Series:
+        """Annualized Sharpe ratio of the returns up to every record"""
+        returns = np.nan_to_num(self.returns.to_numpy())
+        count = np.arange(len(returns), dtype=np.float64)  # The first record has no return
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = np.cumsum(returns) / count
+            variance = (np.cumsum(returns**2) - count * mean**2) / (count - 1)
+            sharpe = mean / np.sqrt(variance) * np.sqrt(self.periods_per_year)
+        sharpe[(count < 2) | ~(variance > 0)] = np.nan
+        return pd.Series(sharpe, index=self.index, name="sharpe")
+
+    @cached_property
+    def portfolio_stats(self) -> pd.DataFrame:
+        """Portfolio statistics of every record, the max_drawdown column is the largest drawdown so far"""
+        return pd.DataFrame(
+            {
+                "sharpe": self.expanding_sharpe,
+                "turnover": self.turnover,
+                "returns": self.returns,
+                "max_drawdown": self.drawdown.cummin(),
+                "margin": self.margin,
+                "long_count": self.long_count,
+                "short_count": self.short_count,
+            },
+            columns=self.PORTFOLIO_STATS_COLUMNS,
+        ).rename_axis("date")
@@ -1,15 +1,28 @@
+import time
 import typing
+from collections import deque
 from dataclasses import dataclass
 from datetime import datetime
-from typing import List
+from typing import Dict, Iterable, Iterator, List, Union
 
+import numpy as np
 import pandas as pd
-from tqdm import tqdm
 
 from src import constants
+from src.analytics import PortfolioAnalytics
+from src.checkpoint import read_checkpoint, write_checkpoint
+from src.cost_models import CommissionModel, SlippageModel, get_commission_model, get_slippage_model
 from src.entity import StockEntity, Trade
+from src.events import Event, EventStream
 from src.ibkr_fees import calculate_ibkr_fixed_cost
-import quantstats as qs
+from src.ingestion import validate_order_book
+from src.instrumentation import NULL_PROFILER, Profiler, progress_bar
+from src.market_data import MarketData
+from src.order_book import OrderBook
+from src.report import TearDownReport
+
+if typing.TYPE_CHECKING:
+    from tqdm import tqdm
 
 
 @dataclass
@@ -26,6 +39,7 @@ class Order:
     stop_price: float = 0.0
     trail_type: str = ""
     trail: float = 0.0
+    oco_group: str = ""
 
     @staticmethod
     def get_pandas_timestamp(date) -> pd.Timestamp:
@@ -69,18 +83,74 @@ class BacktestEngine:
     def __init__(
         self,
         order_book: pd.DataFrame,
-        ohlvc: pd.DataFrame,
+        ohlvc: pd.DataFrame = None,
         initial_capital: float = 100000.0,
+        fill_mode: str = constants.FILL_MODE_SEQUENTIAL,
+        skip_idle_bars: bool = False,
+        market_data: MarketData = None,
+        show_progress: bool = True,
+        profiler: Profiler = None,
+        fee_model: Union[str, CommissionModel] = constants.FEE_MODEL_FIXED,
+        slippage_model: Union[str, SlippageModel] = None,
+        ticker_fee_models: Dict[str, Union[str, CommissionModel]] = None,
+        ticker_slippage_models: Dict[str, Union[str, SlippageModel]] = None,
+        session_start: str = "00:00:00",
+        validate: bool = True,
+        event_stream: EventStream = None,
     ):
+        # Fail before the run on orders the engine cannot process, see ingestion.validate_order_book
+        if validate:
+            validate_order_book(order_book)
         self.order_book = order_book.copy()
         self.stocks = {}  # Dictionary to store the stock entities
-        self.ohlvc = ohlvc.copy()
+        # Price matrices (bars x tickers) of every ticker in the order book, validated before the run starts
+        if market_data is None and ohlvc is None:
+            # Market data is read chunk by chunk in backtest_stream
+            self.ohlvc = None
+            self.market_data = None
+        elif market_data is None:
+            self.ohlvc = ohlvc.copy()
+            self.market_data = MarketData.from_ohlvc(self.ohlvc, tickers=self.order_book["ticker"].unique())
+        else:
+            # Price matrices shared between engines, e.g. across the runs of a parameter sweep
+            self.ohlvc = ohlvc
+            self.market_data = market_data
+            self.market_data.validate_tickers(self.order_book["ticker"].unique())
+        self.show_progress = show_progress
+        # Timing of every phase of the backtest, see instrumentation.Profiler
+        self.profiler = NULL_PROFILER if profiler is None else profiler
         self.initial_capital = initial_capital
+        self.fill_mode = fill_mode
+        # Jump straight to the next bar where an order can become active or change state
+        self.skip_idle_bars = skip_idle_bars
+        # Time of the day the trading sessions start at, Day orders expire at the end of their session
+        self.session_start = pd.Timedelta(session_start).value
+        self.session = np.empty(0, dtype=np.int64)  # Session of every bar of the current market data
+        self.session_end = np.empty(0, dtype=np.int64)  # Last bar of the session of every bar
         self.current_capital = initial_capital
         self.fees = 0.0
-        self.portfolio_records = self._initialize_dataframe(self.PORTFOLIO_RECORDS_COLUMNS)
-        self.portfolio_stats = self._initialize_dataframe(self.PORTFOLIO_STATS_COLUMNS)
-        self.combined_holding_records = pd.DataFrame()
+        # Commission and slippage models of every ticker, see cost_models
+        self.fee_model = get_commission_model(fee_model)
+        self.slippage_model = get_slippage_model(slippage_model)
+        self.ticker_fee_models = {
+            ticker: get_commission_model(model) for ticker, model in (ticker_fee_models or {}).items()
+        }
+        self.ticker_slippage_models = {
+            ticker: get_slippage_model(model) for ticker, model in (ticker_slippage_models or {}).items()
+        }
+        # Share volume traded in the current month, used by volume tiered commission models
+        self.volume_month = None
+        self.monthly_volume = 0.0
+        # Fills of the current bar, their slippage and fees are settled together at the end of the bar
+        self.pending_fills = []
+        # True while process_orders works through the orders created or activated during the current bar
+        self.processing_appended_orders = False
+        # Next bar of the current market data to process
+        self.bar = 0
+        # Order, position and NAV events published after every processed bar, see events.EventStream
+        self.event_stream = event_stream
+        self.initialize_portfolio_records(0)
+        self.book = OrderBook()
 
         self.order_book["status"] = ""
         self.order_book["comments"] = ""
@@ -138,436 +208,1303 @@ class BacktestEngine:
             elif action == constants.TRADE_ACTION_SELL:
                 return price * (1 - trail)
 
-    def create_limit_order(self, order: Order):
+    # Bars of the first block searched for the trigger bar of a trailing stop order, see trailing_stop_path
+    TRAILING_STOP_BLOCK_SIZE = 32
+
+    @staticmethod
+    def update_trailing_stop_prices(trail_type, trail, action, prices: np.ndarray) -> np.ndarray:
+        """
+        Vectorized update_trailing_stop_price over an array of prices, with the same arithmetic
+
+        :param trail_type:
+        :param trail:
+        :param action:
+        :param prices:
+        :return:
+        """
+        if trail_type == constants.TRAIL_TYPE_VALUE:
+            return prices + trail if action == constants.TRADE_ACTION_BUY else prices - trail
+        return prices + (1 + trail) if action == constants.TRADE_ACTION_BUY else prices * (1 - trail)
+
+    def precompute_trailing_stop(self, idx: int) -> bool:
+        """
+        Whether the stop path of a trailing stop order is precomputed instead of checking the order every bar
+
+        Only needed when the fill mode or skip_idle_bars can leave the order out of the bars it is not triggered on.
+        Day orders are processed every bar anyway and orders with an unknown action or trail type keep the per-bar
+        update.
+
+        :param idx: row of the order in the order book
+        :return:
+        """
+        book = self.book
+        return (
+            (self.fill_mode == constants.FILL_MODE_BATCHED or self.skip_idle_bars)
+            and book.attached_order[idx]
+            and book.order_type[idx] in [constants.TRAILING_STOP_ORDER, constants.TRAILING_STOP_LIMIT_ORDER]
+            and book.time_in_force[idx] != constants.TIME_IN_FORCE_DAY
+            and book.action[idx] in [constants.TRADE_ACTION_BUY, constants.TRADE_ACTION_SELL]
+            and book.trail_type[idx] in [constants.TRAIL_TYPE_VALUE, constants.TRAIL_TYPE_PERCENTAGE]
+            and book.ticker_column[idx] >= 0
+        )
+
+    def trailing_stop_path(self, idx: int, start: int):
+        """
+        Precompute the stop path of a trailing stop order processed from bar start on and find its trigger bar
+
+        The stop price after bar t is the running min (Buy) / max (Sell) of the stop levels of the bars start to t
+        and of the current stop price, and the order triggers on the first bar whose High (Buy) / Low (Sell) reaches
+        the stop price of the previous bar. Both are found with accumulates and searches over blocks of bars of
+        doubling size, the stop price itself is only applied to the order book when the order is processed, see
+        catch_up_trailing_stop. The path stops at the first bar without a High, which is processed bar by bar.
+
+        :param idx: row of the order in the order book
+        :param start: first bar the order is processed on
+        :return:
+        """
+        book = self.book
+        column = book.ticker_column[idx]
+        action = book.action[idx]
+        trail_type = book.trail_type[idx]
+        trail = book.trail[idx]
+        stop_price = book.stop_price[idx]
+        bars = len(self.market_data)
+        trigger_bar = bars
+        block_start = start
+        block_size = self.TRAILING_STOP_BLOCK_SIZE
+
+        while block_start < bars:
+            high = self.market_data.high[block_start : block_start + block_size, column]
+            missing = np.flatnonzero(np.isnan(high))
+            if len(missing) != 0:
+                high = high[: missing[0]]
+            levels = self.update_trailing_stop_prices(trail_type, trail, action, high)
+
+            # fmin / fmax: a NaN stop price is replaced by the first level, as min / max do in process_order
+            if action == constants.TRADE_ACTION_BUY:
+                stops = np.minimum.accumulate(np.fmin(levels, stop_price))
+                triggered = high >= np.concatenate(([stop_price], stops[:-1]))
+            else:
+                stops = np.maximum.accumulate(np.fmax(levels, stop_price))
+                low = self.market_data.low[block_start : block_start + len(high), column]
+                triggered = low <= np.concatenate(([stop_price], stops[:-1]))
+
+            triggers = np.flatnonzero(triggered)
+            if len(triggers) != 0:
+                trigger_bar = block_start + triggers[0]
+                break
+            if len(missing) != 0:
+                trigger_bar = block_start + missing[0]
+                break
+            stop_price = stops[-1]
+            block_start += len(high)
+            block_size *= 2
+
+        book.stop_path_start[idx] = start
+        book.stop_path_trigger[idx] = trigger_bar
+        book.stop_updated_bar[idx] = start - 1
+
+    def catch_up_trailing_stop(self, idx: int, bar: int):
+        """
+        Apply the trailing stop updates of the bars up to bar that were skipped to the stop and limit prices
+
+        :param idx: row of the order in the order book
+        :param bar: last bar to apply
+        :return:
+        """
+        book = self.book
+        updated_bar = book.stop_updated_bar[idx]
+        if book.stop_path_start[idx] < 0 or bar <= updated_bar:
+            return
+
+        action = book.action[idx]
+        high = self.market_data.high[updated_bar + 1 : bar + 1, book.ticker_column[idx]]
+        levels = self.update_trailing_stop_prices(book.trail_type[idx], book.trail[idx], action, high)
+        if action == constants.TRADE_ACTION_BUY:
+            stop_price = np.fmin(book.stop_price[idx], levels.min())
+            book.limit_price[idx] = stop_price + book.limit_offset[idx]
+        else:
+            stop_price = np.fmax(book.stop_price[idx], levels.max())
+            book.limit_price[idx] = stop_price - book.limit_offset[idx]
+        book.stop_price[idx] = stop_price
+        book.stop_updated_bar[idx] = bar
+
+    def settle_trailing_stops(self, bar: int):
+        """
+        Apply the trailing stop updates up to bar to every open order and drop the precomputed paths
+
+        Called once the bars of the current market data are processed, the paths refer to bar positions in it.
+
+        :param bar: last processed bar
+        :return:
+        """
+        book = self.book
+        for idx in np.flatnonzero(book.stop_path_start[: book.size] >= 0):
+            if not book.is_closed(idx):
+                self.catch_up_trailing_stop(idx, bar)
+        book.stop_path_start[: book.size] = -1
+        book.stop_path_trigger[: book.size] = -1
+
+    def create_limit_order(self, order: Order) -> int:
         """
         Create a limit order and append it to the order book
 
         Limit order will only execute when the price reaches the limit price
 
         :param order:
-        :return:
+        :return: row of the new order in the order book
         """
-        # Add order into order book
-        new_order = pd.DataFrame(
-            {
-                "order_id": order.order_id,
-                "order_date": order.order_date,
-                "ticker": order.ticker,
-                "order_type": order.order_type,
-                "action": order.action,
-                "limit_price": order.limit_price,
-                "time_in_force": order.time_in_force,
-                "quantity": order.quantity,
-                "stop_price": order.stop_price,
-                "trail_type": order.trail_type,
-                "trail": order.trail,
-                "attached_order": order.attached_order,
-                "status": constants.ORDER_STATUS_PENDING,
-                "comments": "",
-                "filled_date": "",
-            },
-            index=[0],
+        return self.book.append(
+            order_id=order.order_id,
+            attached_order=order.attached_order,
+            order_date=order.get_pandas_timestamp(order.order_date).value,
+            ticker=order.ticker,
+            order_type=order.order_type,
+            action=order.action,
+            limit_price=order.limit_price,
+            time_in_force=order.time_in_force,
+            quantity=order.quantity,
+            stop_price=order.stop_price,
+            trail_type=order.trail_type,
+            trail=order.trail,
+            oco_group=order.oco_group,
         )
 
-        new_order["order_date"] = pd.to_datetime(new_order["order_date"])
-        if self.order_book.empty:
-            self.order_book = new_order
-        else:
-            self.order_book = pd.concat([self.order_book, new_order], ignore_index=True)
-
-    def get_active_orders(self, current_timestamp):
-        return self.order_book[
-            (self.order_book["order_date"] <= current_timestamp)
-            & (self.order_book["status"] != constants.ORDER_STATUS_FILLED)
-            & (self.order_book["status"] != constants.ORDER_STATUS_CANCELLED)
-            & (self.order_book["status"] != constants.ORDER_STATUS_EXPIRED)
-        ]
+    def get_active_orders(self, current_timestamp) -> np.ndarray:
+        """
+        Fetch the rows of all orders dated on or before the current timestamp that are not filled, cancelled or expired
+
+        :param current_timestamp:
+        :return:
+        """
+        return self.book.active_rows(current_timestamp.value)
 
     def initialize_stocks(self):
         for stock in self.order_book["ticker"].unique():
             self.stocks[stock] = StockEntity(symbol=stock)
+            self.stocks[stock].initialize_holding_records(len(self.market_data))
+
+    def initialize_portfolio_records(self, size: int):
+        """
+        Preallocate the portfolio record arrays, size should be the number of bars in the backtest
+
+        :param size:
+        :return:
+        """
+        self.portfolio_records_size = 0
+        self.portfolio_dates = np.empty(size, dtype="datetime64[ns]")
+        self.portfolio_fees = np.empty(size, dtype=np.float64)
+        self.portfolio_capital = np.empty(size, dtype=np.float64)
+        self._portfolio_records = None
+        self._analytics = None
+        self._combined_holding_records = None
+
+    def _grow_portfolio_records(self, size: int):
+        for name in ["portfolio_dates", "portfolio_fees", "portfolio_capital"]:
+            old = getattr(self, name)
+            new = np.empty(max(size, 2 * len(old)), dtype=old.dtype)
+            new[: len(old)] = old
+            setattr(self, name, new)
 
     def update_portfolio_records(self, current_timestamp):
-        new_record = pd.DataFrame(
-            {
-                "total_fees": [self.fees],
-                "capital": [self.current_capital],
-            },
-            index=[current_timestamp],
-        )
+        self.update_portfolio_records_range(np.array([pd.Timestamp(current_timestamp).to_datetime64()]))
 
-        if self.portfolio_records.empty:
-            self.portfolio_records = new_record
-        else:
-            self.portfolio_records = pd.concat([self.portfolio_records, new_record])
+    def update_portfolio_records_range(self, timestamps: np.ndarray):
+        """
+        Append the portfolio records of several bars, capital and fees are unchanged between them
+
+        :param timestamps: datetime64 array
+        :return:
+        """
+        i = self.portfolio_records_size
+        j = i + len(timestamps)
+        if j > len(self.portfolio_capital):
+            self._grow_portfolio_records(j)
+
+        self.portfolio_dates[i:j] = timestamps
+        self.portfolio_fees[i:j] = self.fees
+        self.portfolio_capital[i:j] = self.current_capital
+        self.portfolio_records_size = j
+        self._portfolio_records = None
+        self._analytics = None
+        self._combined_holding_records = None
+
+    def clear_cached_records(self):
+        """
+        Drop the portfolio records, analytics and combined holding records built from the record arrays, they are
+        rebuilt on their next access
+        """
+        self._portfolio_records = None
+        self._analytics = None
+        self._combined_holding_records = None
+
+    @property
+    def portfolio_records(self) -> pd.DataFrame:
+        if self._portfolio_records is None:
+            n = self.portfolio_records_size
+            if n == 0:
+                self._portfolio_records = self._initialize_dataframe(self.PORTFOLIO_RECORDS_COLUMNS)
+            else:
+                self._portfolio_records = pd.DataFrame(
+                    {
+                        "total_fees": self.portfolio_fees[:n],
+                        "capital": self.portfolio_capital[:n],
+                    },
+                    index=pd.DatetimeIndex(self.portfolio_dates[:n]),
+                )
+        return self._portfolio_records
+
+    @property
+    def analytics(self) -> PortfolioAnalytics:
+        """
+        Lazily computed portfolio metrics of the bars recorded so far, see analytics.PortfolioAnalytics
+
+        :return:
+        """
+        if self._analytics is None:
+            self._analytics = PortfolioAnalytics.from_engine(self)
+        return self._analytics
+
+    @property
+    def session_analytics(self) -> PortfolioAnalytics:
+        """
+        Portfolio metrics of the last recorded bar of every trading session, the daily view of intraday bars used for
+        reporting. self.analytics keeps every bar; with daily bars every bar is a session and both are the same.
+
+        :return:
+        """
+        analytics = self.analytics
+        return analytics.last_of_session(MarketData.session_of(analytics.dates.view(np.int64), self.session_start))
+
+    @property
+    def portfolio_stats(self) -> pd.DataFrame:
+        return self.analytics.portfolio_stats
+
+    @property
+    def combined_holding_records(self) -> pd.DataFrame:
+        """
+        Quantity and market value of every stock and the portfolio capital, fees, value and returns of every bar
+
+        Built from the record arrays on first access.
+
+        :return:
+        """
+        if self._combined_holding_records is None:
+            self.combine_holding_records()
+        return self._combined_holding_records
 
     def combine_holding_records(self):
-        holding_records_list = []
+        with self.profiler.phase("combine_holding_records"):
+            self._combine_holding_records()
+
+    @property
+    def session_holding_records(self) -> pd.DataFrame:
+        """
+        Combined holding records of the last bar of every trading session, returns are between session closes
+
+        :return:
+        """
+        return self.holding_records_frame(self.session_analytics)
+
+    def _combine_holding_records(self):
+        self._combined_holding_records = self.holding_records_frame(self.analytics)
+
+    @staticmethod
+    def holding_records_frame(analytics: PortfolioAnalytics) -> pd.DataFrame:
+        columns = {}
+        for column, symbol in enumerate(analytics.tickers):
+            columns[(symbol, "quantity")] = analytics.quantities[column]
+            columns[(symbol, "portfolio_value")] = analytics.position_values[:, column]
+
+        # Portfolio value: capital + the portfolio value of all the stocks
+        columns[("Portfolio", "capital")] = analytics.capital
+        columns[("Portfolio", "total_fees")] = analytics.fees
+        columns[("Portfolio", "portfolio_value")] = analytics.nav.to_numpy()
+        columns[("Portfolio", "returns")] = analytics.returns.to_numpy()
+
+        return pd.DataFrame(columns, index=analytics.index)
+
+    def generate_tear_down(self, file_name, benchmark: pd.Series = None) -> TearDownReport:
+        """
+        Write the tear down report of the backtest, as JSON if file_name ends with .json and as HTML otherwise
+
+        The report is computed offline, see report.TearDownReport.
+
+        :param file_name:
+        :param benchmark: returns of the benchmark, e.g. report.load_benchmark(ohlcv_store, "SPY")
+        :return:
+        """
+        with self.profiler.phase("generate_tear_down"):
+            report = TearDownReport.from_engine(self, benchmark=benchmark)
+            report.write(file_name)
+        return report
+
+    def generate_quantstats_tear_down(self, file_name, benchmark="SPY"):
+        """
+        Write the quantstats HTML tear down report, a ticker benchmark is downloaded by quantstats
+
+        :param file_name:
+        :param benchmark: ticker or returns of the benchmark
+        :return:
+        """
+        # quantstats imports matplotlib, seaborn and scipy, it is only loaded when its report is requested
+        import quantstats as qs
+
+        returns = self.session_analytics.returns
+        with self.profiler.phase("generate_tear_down"):
+            qs.reports.html(returns, benchmark, output=file_name)
+
+    def export_results(self, base_dir: str, run_id="0", export_format: str = "parquet"):
+        """
+        Write the order book, trades, holding records and portfolio records to a dataset partitioned by run id and
+        ticker, built from the internal arrays with typed columns, see export.export_results
+
+        :param base_dir:
+        :param run_id:
+        :param export_format: parquet or arrow
+        :return:
+        """
+        from src.export import export_results
+
+        with self.profiler.phase("export_results"):
+            export_results(self, base_dir, run_id=run_id, export_format=export_format)
+
+    def execute_order(self, stock_entity: StockEntity, order_type, action, limit_price, quantity, trade_date, bar):
+        """
+        Execute a Limit or Market order against the current bar
+
+        Limit orders are filled at the limit price if it is within the High / Low range of the bar,
+        Market orders are filled at the Open price of the bar
+
+        Fees and the slippage of Market orders are applied when the fills of the bar are settled, in settle_fills
 
-        # Add the stock symbol as a level in the DataFrame's columns
-        for symbol, stock_entity in self.stocks.items():
-            stock_holding_records = stock_entity.holding_records[["quantity", "portfolio_value"]].copy()
+        :return: order status, message and filled price
+        """
+        symbol = stock_entity.symbol
+        column = self.market_data.columns[symbol]
+        if order_type == constants.LIMIT_ORDER:
+            filled_price = limit_price
+            order_status, msg = stock_entity.limit_order(
+                trade=Trade(
+                    date=trade_date,
+                    symbol=symbol,
+                    order_type=order_type,
+                    action=action,
+                    limit_price=limit_price,
+                    quantity=quantity,
+                    fees=0.0,
+                ),
+                high_price=self.market_data.high[bar, column],
+                low_price=self.market_data.low[bar, column],
+            )
+        elif order_type == constants.MARKET_ORDER:
+            filled_price = self.market_data.open[bar, column]
+            order_status, msg = stock_entity.market_order(
+                trade=Trade(
+                    date=trade_date,
+                    symbol=symbol,
+                    order_type=order_type,
+                    action=action,
+                    limit_price=filled_price,  # Use Open price as the limit price for Market Order
+                    quantity=quantity,
+                    fees=0.0,
+                )
+            )
+        else:
+            return False, "", 0.0
+
+        return order_status, msg, filled_price
+
+    def update_capital(self, action, quantity, filled_price, fees_incurred: float = None):
+        with self.profiler.phase("update_capital"):
+            if fees_incurred is None:
+                fees_incurred = self.calculate_fees(qty=quantity, price_per_share=filled_price)
+            if action == constants.TRADE_ACTION_BUY:
+                self.current_capital -= filled_price * quantity
+                self.current_capital -= fees_incurred
+            else:
+                self.current_capital += filled_price * quantity
+                self.current_capital -= fees_incurred
+            self.fees += fees_incurred
+
+    # Minimum number of fills of a bar for a vectorized cost model to be evaluated on arrays rather than per fill
+    VECTORIZE_MIN_FILLS = 8
+
+    def queue_fill(self, idx: int, stock_entity: StockEntity, action, quantity, filled_price):
+        """
+        Queue the fill of an order, its slippage, fees and capital change are applied in settle_fills
+
+        :param idx: row of the filled order in the order book
+        :param stock_entity: stock entity the trade was recorded in
+        :param action:
+        :param quantity:
+        :param filled_price:
+        :return:
+        """
+        trade_index = len(stock_entity.trade_ledger) - 1
+        self.pending_fills.append((idx, stock_entity, trade_index, action, quantity, filled_price))
 
-            stock_holding_records.columns = pd.MultiIndex.from_product([[symbol], stock_holding_records.columns])
-            holding_records_list.append(stock_holding_records)
+    def fill_costs(self, bar: int, fills: list, month_volume: float):
+        """
+        Slipped price and fees of every fill, one fill at a time
+
+        :param bar:
+        :param fills: fills queued by queue_fill
+        :param month_volume: share volume traded earlier in the month
+        :return: filled prices and fees
+        """
+        book = self.book
+        market_data = self.market_data
+        volume = market_data.fields.get("Volume")
+        prices = []
+        fees = []
+        for idx, stock_entity, _, action, quantity, price in fills:
+            ticker = stock_entity.symbol
+            # Slippage of Market orders, Limit orders are filled at their limit price
+            if book.order_type[idx] == constants.MARKET_ORDER:
+                column = book.ticker_column[idx]
+                price = self.ticker_slippage_models.get(ticker, self.slippage_model).slipped_price(
+                    action == constants.TRADE_ACTION_BUY,
+                    price,
+                    quantity,
+                    market_data.high[bar, column],
+                    market_data.low[bar, column],
+                    np.nan if volume is None else volume[bar, column],
+                )
+            prices.append(price)
+            fees.append(self.ticker_fee_models.get(ticker, self.fee_model).commission(quantity, price, month_volume))
+            month_volume += quantity
+        return prices, fees
 
-        # Add the portfolio capital as a level in the DataFrame's columns
-        portfolio_capital = self.portfolio_records[["capital", "total_fees"]].copy()
-        portfolio_capital.columns = pd.MultiIndex.from_product([["Portfolio"], portfolio_capital.columns])
-        holding_records_list.append(portfolio_capital)
+    def fill_costs_vectorized(self, bar: int, fills: list, month_volume: float):
+        """
+        Slipped price and fees of every fill, fills sharing a vectorized model are evaluated in one call
 
-        # Concatenate all holding records along the columns axis
-        combined_holding_records = pd.concat(holding_records_list, axis=1)
+        :param bar:
+        :param fills: fills queued by queue_fill
+        :param month_volume: share volume traded earlier in the month
+        :return: filled prices and fees
+        """
+        book = self.book
+        market_data = self.market_data
+        rows = np.array([fill[0] for fill in fills])
+        tickers = [fill[1].symbol for fill in fills]
+        is_buy = np.array([fill[3] == constants.TRADE_ACTION_BUY for fill in fills])
+        quantity = np.array([fill[4] for fill in fills], dtype=np.float64)
+        prices = np.array([fill[5] for fill in fills], dtype=np.float64)
 
-        # Calculate portfolio value (capital + all stock portfolio value) TODO: check this calculation
-        sum_all_portfolio_value = combined_holding_records.xs("portfolio_value", level=1, axis=1).sum(axis=1)
+        # Slippage of Market orders, Limit orders are filled at their limit price
+        market = np.flatnonzero(book.order_type[rows] == constants.MARKET_ORDER)
+        if len(market) != 0:
+            columns = book.ticker_column[rows[market]]
+            volume = market_data.fields.get("Volume")
+            prices[market] = self._evaluate_models(
+                [self.ticker_slippage_models.get(tickers[i], self.slippage_model) for i in market],
+                lambda model, *fill: model.slipped_price(*fill),
+                lambda model, *arrays: model.slipped_prices(*arrays),
+                [
+                    is_buy[market],
+                    prices[market],
+                    quantity[market],
+                    market_data.high[bar, columns],
+                    market_data.low[bar, columns],
+                    np.full(len(market), np.nan) if volume is None else volume[bar, columns],
+                ],
+            )
 
-        combined_holding_records[("Portfolio", "portfolio_value")] = (
-            sum_all_portfolio_value + combined_holding_records[("Portfolio", "capital")]
+        fees = self._evaluate_models(
+            [self.ticker_fee_models.get(ticker, self.fee_model) for ticker in tickers],
+            lambda model, *fill: model.commission(*fill),
+            lambda model, *arrays: model.commissions(*arrays),
+            [quantity, prices, month_volume + np.cumsum(quantity) - quantity],
         )
+        return prices, fees
 
-        # Calculate returns
-        combined_holding_records[("Portfolio", "returns")] = combined_holding_records[
-            ("Portfolio", "portfolio_value")
-        ].pct_change()
+    @staticmethod
+    def _evaluate_models(models: list, single, vectorized, columns: list) -> np.ndarray:
+        """
+        Evaluate the cost model of every fill, fills sharing a vectorized model are evaluated in one call
 
-        self.combined_holding_records = combined_holding_records
+        :param models: model of every fill
+        :param single: function of (model, *fill values) for one fill
+        :param vectorized: function of (model, *arrays) for arrays of fills
+        :param columns: arrays of the fill values passed to the models
+        :return: result of every fill
+        """
+        results = np.empty(len(models), dtype=np.float64)
+        groups = {}
+        for i, model in enumerate(models):
+            groups.setdefault(id(model), (model, []))[1].append(i)
 
-    def generate_tear_down(self, file_name):
-        returns = self.combined_holding_records[("Portfolio", "returns")]
-        qs.reports.html(returns, "SPY", output=file_name)
+        for model, positions in groups.values():
+            if model.vectorized:
+                results[positions] = vectorized(model, *[column[positions] for column in columns])
+            else:
+                for i in positions:
+                    results[i] = single(model, *[column[i] for column in columns])
+        return results
 
-    def backtest(self):
-        # Create StockEntity for each stock and store in the stocks dictionary
-        self.initialize_stocks()
+    def settle_fills(self, bar: int):
+        """
+        Apply the slippage and fees of the fills of the bar and update the capital, in the order of the fills
 
-        for current_timestamp, row in tqdm(self.ohlvc.iterrows(), total=len(self.ohlvc)):
-            # Convert current_timestamp to pd.Timestamp type
-            current_timestamp = typing.cast(pd.Timestamp, current_timestamp)
-            # Fetch all pending orders that are earlier or equal to the current timestamp and status not filled or cancelled
-            active_orders = self.get_active_orders(current_timestamp)
-            # Using while loop because there are additional orders created and appended into the active_orders df
-            while len(active_orders) != 0:
-                idx = active_orders.head(1).index[0]
-                order = active_orders.loc[idx]
-
-                # Fetch Order Details
-                order_id = order["order_id"]
-                date = order["order_date"]
-                symbol = order["ticker"]
-                order_type = order["order_type"]
-                action = order["action"]
-                limit_price = order["limit_price"]
-                limit_offset = order["limit_offset"]
-                stop_price = order["stop_price"]
-                quantity = order["quantity"]
-                trail_type = order["trail_type"]
-                trail = order["trail"]
-                time_in_force = order["time_in_force"]
-                attached_order = order["attached_order"]
-                order_status = False
-                msg = ""
-                filled_price = 0.0
-                stock_entity = self.stocks[symbol]
-
-                """
-                Unattached Order: Orders that are sent to the market without any attached orders
-                Example: 
-                1. Long Position: BUY 100 AAPL @ 150
-                2. Short Position: SELL 100 AAPL @ 170
-                
-                Attached Order: Orders that are tagged to an order to act like the stop loss / take profit orders
-                Example:
-                1. BUY 100 AAPL @ 150 (Unattached Order)
-                2. Attached a sell order to the BUY order to sell 100 AAPL @ 170 (Attached Order)
-                3. Attached a stop limit order to the BUY order to create a limit order of 125 when price goes under 130 (Attached Order)
-                    a. When price reaches 130 --> Stop Limit Order is triggered and a Stop Limit order is created @ 125
-                    b. When price reaches 125 --> Stop Limit Order is executed
-                """
-
-                if attached_order:
-                    # If it is a Day order, check if the order is still valid
-                    if time_in_force == constants.TIME_IN_FORCE_DAY:
-                        if current_timestamp.date() != order["order_date"].date():
-                            self.order_book.loc[idx, "status"] = constants.ORDER_STATUS_EXPIRED
-                            self.order_book.loc[idx, "comments"] = "Order Expired"
-                            self.order_book.loc[idx, "filled_date"] = current_timestamp
-                            continue
-
-                    if order_type == constants.LIMIT_ORDER:
-                        filled_price = limit_price
-                        order_status, msg = stock_entity.limit_order(
-                            trade=Trade(
-                                date=current_timestamp.strftime(format="%Y-%m-%d %H:%M:%S"),
-                                symbol=symbol,
-                                order_type=order_type,
-                                action=action,
-                                limit_price=limit_price,
-                                quantity=quantity,
-                                fees=self.calculate_fees(qty=quantity, price_per_share=filled_price),
+        :param bar:
+        :return:
+        """
+        fills = self.pending_fills
+        if not fills:
+            return
+
+        with self.profiler.phase("settle_fills"):
+            timestamp = self.market_data.index[bar]
+            month = (timestamp.year, timestamp.month)
+            if month != self.volume_month:
+                self.volume_month = month
+                self.monthly_volume = 0.0
+
+            if len(fills) >= self.VECTORIZE_MIN_FILLS:
+                prices, fees = self.fill_costs_vectorized(bar, fills, self.monthly_volume)
+            else:
+                prices, fees = self.fill_costs(bar, fills, self.monthly_volume)
+
+            book = self.book
+            for fill, price, fee in zip(fills, prices, fees):
+                idx, stock_entity, trade_index, action, quantity, filled_price = fill
+                if price != filled_price:
+                    book.filled_price[idx] = price
+                stock_entity.update_trade_costs(trade_index, price, fee)
+                self.update_capital(action, quantity, price, fee)
+                self.monthly_volume += quantity
+
+            fills.clear()
+
+    def select_orders_to_process(self, rows: np.ndarray, bar: int) -> np.ndarray:
+        """
+        Vectorized fill detection of the active orders against the High / Low of the current bar
+
+        Returns the rows that can change state on this bar, in row order:
+        1. Limit orders whose limit price is within the bar range and Market orders
+        2. Attached Stop / Stop Limit orders that are triggered, and attached Trailing Stop orders on the trigger
+           bar of their precomputed stop path, or every bar when the path is not precomputed
+        3. Day orders that expire on the bar, i.e. the bar is in a later session than their order date, and
+           unattached Day orders that are filled or cancelled on the bar: unfilled Day Limit orders are cancelled
+           on the last bar of their session
+
+        Every other active order is a resting order that process_order would leave untouched, so it is skipped.
+
+        :param rows: active rows
+        :param bar:
+        :return:
+        """
+        book = self.book
+        columns = book.ticker_column[rows]
+        high = self.market_data.high[bar, columns]
+        low = self.market_data.low[bar, columns]
+        # Integer codes of the enumerated columns, see constants.ORDER_TYPE_CODES
+        order_type = book.order_type_code[rows]
+        action = book.action_code[rows]
+        time_in_force = book.time_in_force_code[rows]
+        limit_price = book.limit_price[rows]
+        stop_price = book.stop_price[rows]
+
+        is_buy = action == constants.TRADE_ACTION_BUY_CODE
+        is_sell = action == constants.TRADE_ACTION_SELL_CODE
+        is_limit = order_type == constants.LIMIT_ORDER_CODE
+        is_market = order_type == constants.MARKET_ORDER_CODE
+        is_trailing = (order_type == constants.TRAILING_STOP_ORDER_CODE) | (
+            order_type == constants.TRAILING_STOP_LIMIT_ORDER_CODE
+        )
+        is_stop = is_trailing | (order_type == constants.STOP_ORDER_CODE) | (
+            order_type == constants.STOP_LIMIT_ORDER_CODE
+        )
+
+        limit_filled = is_limit & (is_buy | is_sell) & (low <= limit_price) & (limit_price <= high)
+        stop_triggered = np.where(is_buy, high >= stop_price, low <= stop_price)
+
+        # Trailing stop orders seen for the first time get their stop path from this bar on
+        for idx in rows[is_trailing & (book.stop_path_start[rows] < 0)]:
+            if self.precompute_trailing_stop(idx):
+                self.trailing_stop_path(idx, bar)
+        trailing_due = is_trailing & ((book.stop_path_start[rows] < 0) | (book.stop_path_trigger[rows] == bar))
+
+        attached_orders = limit_filled | is_market | (is_stop & ~is_trailing & stop_triggered) | trailing_due
+        unattached_orders = limit_filled & (time_in_force == constants.TIME_IN_FORCE_GTC_CODE)
+
+        selected = np.where(book.attached_order[rows], attached_orders, unattached_orders)
+
+        is_day = time_in_force == constants.TIME_IN_FORCE_DAY_CODE
+        if is_day.any():
+            expired = MarketData.session_of(book.order_date[rows], self.session_start) != self.session[bar]
+            # Unfilled unattached Day Limit orders rest until the last bar of the session, then are cancelled
+            day_orders = np.where(
+                book.attached_order[rows],
+                attached_orders,
+                limit_filled | ~is_limit | (self.session_end[bar] == bar),
+            )
+            selected |= is_day & (expired | day_orders)
+        return rows[selected]
+
+    def process_orders(self, bar: int, current_timestamp: pd.Timestamp):
+        """
+        Process all active orders against the current bar
+
+        :param bar:
+        :param current_timestamp:
+        :return:
+        """
+        # Fetch all pending orders that are earlier or equal to the current timestamp and status not filled or cancelled
+        profiler = self.profiler
+        with profiler.phase("select_active_orders"):
+            rows = self.get_active_orders(current_timestamp)
+            if self.fill_mode == constants.FILL_MODE_BATCHED and len(rows) != 0:
+                rows = self.select_orders_to_process(rows, bar)
+
+        # Using a deque because there are additional orders created and appended into the active orders
+        active_orders = deque(rows)
+        book = self.book
+        remaining_rows = len(rows)
+        self.processing_appended_orders = False
+        while active_orders:
+            idx = active_orders.popleft()
+            remaining_rows -= 1
+            self.processing_appended_orders = remaining_rows < 0
+            with profiler.phase(book.order_type[idx], "fill"):
+                self.process_order(idx, bar, current_timestamp, active_orders)
+
+        self.settle_fills(bar)
+
+    def process_order(self, idx: int, bar: int, current_timestamp: pd.Timestamp, active_orders: deque):
+        """
+        Process a single order against the current bar
+
+        Orders created or activated by this order are appended to active_orders to be processed on the same bar
+
+        :param idx: row of the order in the order book
+        :param bar:
+        :param current_timestamp:
+        :param active_orders:
+        :return:
+        """
+        book = self.book
+        # Skip orders closed earlier in this bar, e.g. the other leg of an attached order that was filled
+        if book.is_closed(idx):
+            return
+        # Trailing stop orders with a precomputed stop path may have skipped bars since they were last processed
+        if book.stop_path_start[idx] >= 0:
+            self.catch_up_trailing_stop(idx, bar - 1)
+
+        # Fetch Order Details
+        order_id = book.order_id[idx]
+        symbol = book.ticker[idx]
+        order_type = book.order_type[idx]
+        action = book.action[idx]
+        limit_price = book.limit_price[idx]
+        limit_offset = book.limit_offset[idx]
+        stop_price = book.stop_price[idx]
+        quantity = book.quantity[idx]
+        trail_type = book.trail_type[idx]
+        trail = book.trail[idx]
+        time_in_force = book.time_in_force[idx]
+        attached_order = book.attached_order[idx]
+        order_status = False
+        msg = ""
+        filled_price = 0.0
+        stock_entity = self.stocks[symbol]
+        column = book.ticker_column[idx]
+        timestamp = current_timestamp.value
+        trade_date = current_timestamp.strftime(format="%Y-%m-%d %H:%M:%S")
+
+        """
+        Unattached Order: Orders that are sent to the market without any attached orders
+        Example: 
+        1. Long Position: BUY 100 AAPL @ 150
+        2. Short Position: SELL 100 AAPL @ 170
+        
+        Attached Order: Orders that are tagged to an order to act like the stop loss / take profit orders
+        Example:
+        1. BUY 100 AAPL @ 150 (Unattached Order)
+        2. Attached a sell order to the BUY order to sell 100 AAPL @ 170 (Attached Order)
+        3. Attached a stop limit order to the BUY order to create a limit order of 125 when price goes under 130 (Attached Order)
+            a. When price reaches 130 --> Stop Limit Order is triggered and a Stop Limit order is created @ 125
+            b. When price reaches 125 --> Stop Limit Order is executed
+
+        One-Triggers-Other: filling the unattached order activates all the attached orders with the same order_id,
+        cancelling it cancels them.
+        One-Cancels-Other: filling an attached order cancels the pending attached orders of its oco_group. Orders
+        without an oco_group share the empty group, so by default every attached order of an order_id cancels the
+        others. Example:
+        1. BUY 100 AAPL @ 150 (Unattached Order)
+        2. SELL 50 AAPL @ 170 and Stop SELL 50 AAPL @ 140 (Attached Orders, oco_group "A")
+        3. SELL 50 AAPL @ 180 and Stop SELL 50 AAPL @ 130 (Attached Orders, oco_group "B")
+            a. When price reaches 170 --> the 170 take profit is filled and the 140 stop is cancelled, the 180 take
+               profit and the 130 stop stay pending
+        """
+
+        # If it is a Day order, check if the order is still valid
+        if time_in_force == constants.TIME_IN_FORCE_DAY:
+            if MarketData.session_of(book.order_date[idx], self.session_start) != self.session[bar]:
+                book.set_status(idx, constants.ORDER_STATUS_EXPIRED, timestamp, comments="Order Expired")
+                return
+
+        if attached_order:
+            if order_type in [constants.LIMIT_ORDER, constants.MARKET_ORDER]:
+                order_status, msg, filled_price = self.execute_order(
+                    stock_entity, order_type, action, limit_price, quantity, trade_date, bar
+                )
+            elif order_type in constants.STOP_LOST_TRIGGERS:
+                high_price = self.market_data.high[bar, column]
+                low_price = self.market_data.low[bar, column]
+                if action == constants.TRADE_ACTION_BUY:
+                    if order_type in [constants.TRAILING_STOP_ORDER, constants.TRAILING_STOP_LIMIT_ORDER]:
+                        new_stop_price = min(
+                            self.update_trailing_stop_price(
+                                trail_type=trail_type, trail=trail, action=action, price=high_price
                             ),
-                            high_price=row[symbol]["High"],
-                            low_price=row[symbol]["Low"],
-                        )
-                    elif order_type == constants.MARKET_ORDER:
-                        filled_price = row[symbol]["Open"]
-                        order_status, msg = stock_entity.market_order(
-                            trade=Trade(
-                                date=current_timestamp.strftime(format="%Y-%m-%d %H:%M:%S"),
-                                symbol=symbol,
-                                order_type=order_type,
-                                action=action,
-                                limit_price=row[symbol]["Open"],  # Use Open price as the limit price for Market Order
-                                quantity=quantity,
-                                fees=self.calculate_fees(qty=quantity, price_per_share=filled_price),
-                            )
+                            stop_price,
                         )
-                    elif order_type in constants.STOP_LOST_TRIGGERS:
-                        if action == constants.TRADE_ACTION_BUY:
-                            if order_type in [constants.TRAILING_STOP_ORDER, constants.TRAILING_STOP_LIMIT_ORDER]:
-                                new_stop_price = min(
-                                    self.update_trailing_stop_price(
-                                        trail_type=trail_type, trail=trail, action=action, price=row[symbol]["High"]
-                                    ),
-                                    stop_price,
-                                )
-                                new_limit_price = (
-                                    new_stop_price + limit_offset
-                                )  # Limit Price = Stop Price - Limit Offset
-                                self.order_book.at[idx, "stop_price"] = new_stop_price
-                                self.order_book.at[idx, "limit_price"] = new_limit_price
-                                # Update Active Orders stop and limit price
-                                active_orders.loc[idx, "stop_price"] = new_stop_price
-                                active_orders.loc[idx, "limit_price"] = new_limit_price
-
-                            if self.stop_loss_trigger(stop_price=stop_price, action=action, price=row[symbol]["High"]):
-                                self.create_limit_order(
-                                    Order(
-                                        order_id=order_id,
-                                        attached_order=True,
-                                        order_date=current_timestamp.strftime(format="%Y-%m-%d %H:%M:%S"),
-                                        ticker=symbol,
-                                        order_type=constants.LIMIT_ORDER,
-                                        action=constants.TRADE_ACTION_BUY,
-                                        limit_price=limit_price,
-                                        time_in_force=constants.TIME_IN_FORCE_GTC,  # Defaults to GTC order for now
-                                        quantity=quantity,
-                                    )
-                                )
-                                # Update the status of the current order to "Filled"
-                                self.order_book.loc[idx, "status"] = constants.ORDER_STATUS_FILLED
-                                self.order_book.loc[idx, "filled_date"] = current_timestamp
-                                new_order = self.order_book.tail(1)
-                                active_orders = pd.concat([active_orders, new_order])
-
-                        else:
-                            if order_type in [constants.TRAILING_STOP_ORDER, constants.TRAILING_STOP_LIMIT_ORDER]:
-                                # TODO: check if we need to see if it is triggered on the same day or not
-                                new_stop_price = max(
-                                    self.update_trailing_stop_price(
-                                        trail_type=trail_type, trail=trail, action=action, price=row[symbol]["High"]
-                                    ),
-                                    stop_price,
-                                )
-                                new_limit_price = (
-                                    new_stop_price - limit_offset
-                                )  # Limit Price = Stop Price - Limit Offset
-
-                                # Update Order Book stop and limit price
-                                self.order_book.at[idx, "stop_price"] = new_stop_price
-                                self.order_book.at[idx, "limit_price"] = new_limit_price
-                                # Update Active Orders stop and limit price
-                                active_orders.loc[idx, "stop_price"] = new_stop_price
-                                active_orders.loc[idx, "limit_price"] = new_limit_price
-
-                            if self.stop_loss_trigger(stop_price=stop_price, action=action, price=row[symbol]["Low"]):
-                                self.create_limit_order(
-                                    Order(
-                                        order_id=order_id,
-                                        attached_order=True,
-                                        order_date=current_timestamp.strftime(format="%Y-%m-%d %H:%M:%S"),
-                                        ticker=symbol,
-                                        order_type=constants.LIMIT_ORDER,
-                                        action=constants.TRADE_ACTION_SELL,
-                                        limit_price=limit_price,
-                                        time_in_force=constants.TIME_IN_FORCE_GTC,  # Defaults to GTC order for now
-                                        quantity=quantity,
-                                    )
-                                )
-                                # Update the status of the current order to "Filled"
-                                self.order_book.loc[idx, "status"] = constants.ORDER_STATUS_FILLED
-                                self.order_book.loc[idx, "filled_date"] = current_timestamp
-                                # Append the new order to the active orders df
-                                new_order = self.order_book.tail(1)
-                                active_orders = pd.concat([active_orders, new_order])
-
-                    # Check if attached order is filled
-                    if order_status:
-                        self.order_book.loc[idx, "status"] = constants.ORDER_STATUS_FILLED
-                        self.order_book.loc[idx, "filled_date"] = current_timestamp
-                        self.order_book.loc[idx, "filled_price"] = filled_price
-                        # Find index of the other attached_order with the same order id and update status to cancelled
-                        attached_order_idx_list = self.order_book[
-                            (self.order_book["order_id"] == order_id)
-                            & (self.order_book["status"] == constants.ORDER_STATUS_PENDING)
-                        ].index.tolist()
-                        if len(attached_order_idx_list) != 0:
-                            for order_idx in attached_order_idx_list:
-                                self.order_book.loc[order_idx, "status"] = constants.ORDER_STATUS_CANCELLED
-                                self.order_book.loc[order_idx, "comments"] = "Attached Order Cancelled"
-                                self.order_book.loc[order_idx, "filled_date"] = current_timestamp
-
-                        # Update Capital and fees
-                        fees_incurred = self.calculate_fees(qty=quantity, price_per_share=filled_price)
-                        if action == constants.TRADE_ACTION_BUY:
-                            self.current_capital -= filled_price * quantity
-                            self.current_capital -= fees_incurred
-                        else:
-                            self.current_capital += filled_price * quantity
-                            self.current_capital -= fees_incurred
-                        self.fees += fees_incurred
+                        # Limit Price = Stop Price + Limit Offset
+                        book.stop_price[idx] = new_stop_price
+                        book.limit_price[idx] = new_stop_price + limit_offset
 
+                    triggered = self.stop_loss_trigger(stop_price=stop_price, action=action, price=high_price)
                 else:
-                    # If it is a Day order, check if the order is still valid
-                    if time_in_force == constants.TIME_IN_FORCE_DAY:
-                        if current_timestamp.date() != order["order_date"].date():
-                            self.order_book.loc[idx, "status"] = constants.ORDER_STATUS_EXPIRED
-                            self.order_book.loc[idx, "comments"] = "Order Expired"
-                            self.order_book.loc[idx, "filled_date"] = current_timestamp
-                            continue
-
-                        if order_type == constants.LIMIT_ORDER:
-                            filled_price = limit_price
-                            order_status, msg = stock_entity.limit_order(
-                                trade=Trade(
-                                    date=current_timestamp.strftime(format="%Y-%m-%d %H:%M:%S"),
-                                    symbol=symbol,
-                                    order_type=order_type,
-                                    action=action,
-                                    limit_price=limit_price,
-                                    quantity=quantity,
-                                    fees=self.calculate_fees(qty=quantity, price_per_share=filled_price),
-                                ),
-                                high_price=row[symbol]["High"],
-                                low_price=row[symbol]["Low"],
-                            )
-                        elif order_type == constants.MARKET_ORDER:
-                            filled_price = row[symbol]["Open"]
-                            order_status, msg = stock_entity.market_order(
-                                trade=Trade(
-                                    date=current_timestamp.strftime(format="%Y-%m-%d %H:%M:%S"),
-                                    symbol=symbol,
-                                    order_type=order_type,
-                                    action=action,
-                                    limit_price=row[symbol]["Open"],  # Use Open price as the limit price
-                                    quantity=quantity,
-                                    fees=self.calculate_fees(qty=quantity, price_per_share=filled_price),
+                    if order_type in [constants.TRAILING_STOP_ORDER, constants.TRAILING_STOP_LIMIT_ORDER]:
+                        # TODO: check if we need to see if it is triggered on the same day or not
+                        new_stop_price = max(
+                            self.update_trailing_stop_price(
+                                trail_type=trail_type, trail=trail, action=action, price=high_price
+                            ),
+                            stop_price,
+                        )
+                        # Limit Price = Stop Price - Limit Offset
+                        book.stop_price[idx] = new_stop_price
+                        book.limit_price[idx] = new_stop_price - limit_offset
+
+                    triggered = self.stop_loss_trigger(stop_price=stop_price, action=action, price=low_price)
+
+                if book.stop_path_start[idx] < 0 and self.precompute_trailing_stop(idx):
+                    # Stop path of the following bars, the update of this bar is applied above
+                    self.trailing_stop_path(idx, bar)
+                if book.stop_path_start[idx] >= 0:
+                    book.stop_updated_bar[idx] = bar
+                    if not triggered and bar >= book.stop_path_trigger[idx]:
+                        # End of the path on a bar without a High, the path is computed again from the next bar
+                        book.stop_path_start[idx] = -1
+
+                if triggered:
+                    new_order_idx = self.create_limit_order(
+                        Order(
+                            order_id=order_id,
+                            attached_order=True,
+                            order_date=trade_date,
+                            ticker=symbol,
+                            order_type=constants.LIMIT_ORDER,
+                            action=action,
+                            limit_price=limit_price,
+                            time_in_force=constants.TIME_IN_FORCE_GTC,  # Defaults to GTC order for now
+                            quantity=quantity,
+                            oco_group=book.oco_group[idx],
+                        )
+                    )
+                    # Update the status of the current order to "Filled"
+                    book.set_status(idx, constants.ORDER_STATUS_FILLED, timestamp)
+                    # Append the new order to the active orders
+                    active_orders.append(new_order_idx)
+
+            # Check if attached order is filled
+            if order_status:
+                book.set_status(idx, constants.ORDER_STATUS_FILLED, timestamp)
+                book.filled_price[idx] = filled_price
+                # Cancel the other pending attached orders of the same one-cancels-other group
+                with self.profiler.phase("attached_order_cascade"):
+                    for order_idx in book.oco_rows(idx):
+                        if book.status[order_idx] == constants.ORDER_STATUS_PENDING:
+                            if book.stop_path_start[order_idx] >= 0:
+                                # The stop price is left as of the last bar the order was processed on: this bar
+                                # if it was active from the start of the bar and comes first in row order
+                                processed = book.is_active(order_idx) and (
+                                    self.processing_appended_orders or order_idx < idx
                                 )
+                                self.catch_up_trailing_stop(order_idx, bar if processed else bar - 1)
+                            book.set_status(
+                                order_idx,
+                                constants.ORDER_STATUS_CANCELLED,
+                                timestamp,
+                                comments="Attached Order Cancelled",
                             )
-                        if order_status:
-                            self.order_book.loc[idx, "status"] = constants.ORDER_STATUS_FILLED
-                            self.order_book.loc[idx, "filled_date"] = current_timestamp
-                            self.order_book.loc[idx, "filled_price"] = filled_price
-                            # Find the attached orders and mark the status and pending
-                            attached_order_idx_list = self.order_book[
-                                (self.order_book["order_id"] == order_id) & (self.order_book.index != idx)
-                            ].index.tolist()
-                            if len(attached_order_idx_list) != 0:
-                                # Send all the attached orders to "Pending"
-                                for order_idx in attached_order_idx_list:
-                                    self.order_book.loc[order_idx, "status"] = constants.ORDER_STATUS_PENDING
-                                    self.order_book.loc[order_idx, "order_date"] = current_timestamp
-                                    # Add orders into active_orders to check if limit or stop loss orders triggered on the same day
-                                    new_order = self.order_book.loc[[order_idx]]
-                                    active_orders = pd.concat([active_orders, new_order])
-
-                            # Update Capital and fees
-                            fees_incurred = self.calculate_fees(qty=quantity, price_per_share=filled_price)
-                            if action == constants.TRADE_ACTION_BUY:
-                                self.current_capital -= filled_price * quantity
-                                self.current_capital -= fees_incurred
-                            else:
-                                self.current_capital += filled_price * quantity
-                                self.current_capital -= fees_incurred
-                            self.fees += fees_incurred
-
-                        else:
-                            self.order_book.loc[idx, "status"] = constants.ORDER_STATUS_CANCELLED
-                            self.order_book.loc[idx, "comments"] = msg
-                            self.order_book.loc[idx, "filled_date"] = current_timestamp
-                            # Cancel the attached orders
-                            attached_order_idx_list = self.order_book[
-                                (self.order_book["order_id"] == order_id) & (self.order_book.index != idx)
-                            ].index.tolist()
-                            if len(attached_order_idx_list) != 0:
-                                # Send all the attached orders to "Cancelled"
-                                for order_idx in attached_order_idx_list:
-                                    self.order_book.loc[order_idx, "status"] = constants.ORDER_STATUS_CANCELLED
-                                    self.order_book.loc[order_idx, "filled_date"] = current_timestamp
-                                    self.order_book.loc[order_idx, "comments"] = "Original Order Cancelled"
-
-                    elif time_in_force == constants.TIME_IN_FORCE_GTC:
-                        if order_type == constants.LIMIT_ORDER:
-                            if order_type == constants.LIMIT_ORDER:
-                                filled_price = limit_price
-                                order_status, msg = stock_entity.limit_order(
-                                    trade=Trade(
-                                        date=current_timestamp.strftime(format="%Y-%m-%d %H:%M:%S"),
-                                        symbol=symbol,
-                                        order_type=order_type,
-                                        action=action,
-                                        limit_price=limit_price,
-                                        quantity=quantity,
-                                        fees=self.calculate_fees(qty=quantity, price_per_share=filled_price),
-                                    ),
-                                    high_price=row[symbol]["High"],
-                                    low_price=row[symbol]["Low"],
-                                )
-                            elif order_type == constants.MARKET_ORDER:
-                                filled_price = row[symbol]["Open"]
-                                order_status, msg = stock_entity.market_order(
-                                    trade=Trade(
-                                        date=current_timestamp.strftime(format="%Y-%m-%d %H:%M:%S"),
-                                        symbol=symbol,
-                                        order_type=order_type,
-                                        action=action,
-                                        limit_price=row[symbol]["Open"],  # Use Open price as the limit price
-                                        quantity=quantity,
-                                        fees=self.calculate_fees(qty=quantity, price_per_share=filled_price),
-                                    )
-                                )
-                        if order_status:
-                            self.order_book.loc[idx, "status"] = constants.ORDER_STATUS_FILLED
-                            self.order_book.loc[idx, "filled_date"] = current_timestamp
-                            self.order_book.loc[idx, "filled_price"] = filled_price
-                            # Find the attached orders and mark the status and pending
-                            attached_order_idx_list = self.order_book[
-                                (self.order_book["order_id"] == order_id) & (self.order_book.index != idx)
-                            ].index.tolist()
-                            if len(attached_order_idx_list) != 0:
-                                for order_idx in attached_order_idx_list:
-                                    self.order_book.loc[order_idx, "status"] = constants.ORDER_STATUS_PENDING
-                                    self.order_book.loc[order_idx, "order_date"] = current_timestamp
-
-                            # Update Capital and fees
-                            fees_incurred = self.calculate_fees(qty=quantity, price_per_share=filled_price)
-                            if action == constants.TRADE_ACTION_BUY:
-                                self.current_capital -= filled_price * quantity
-                                self.current_capital -= fees_incurred
-                            else:
-                                self.current_capital += filled_price * quantity
-                                self.current_capital -= fees_incurred
-                            self.fees += fees_incurred
-
-                # Remove row from df
-                active_orders = active_orders.drop(index=idx)
-
-            # Update Stock Records
-            for ticker, stock_entity in self.stocks.items():
-                stock_entity.update_holding_records(timestamp=current_timestamp, price=row[ticker]["Adj Close"])
-
-            # Update Portfolio Records
-            self.update_portfolio_records(current_timestamp)
-
-        # Combine all the positions from all stock entities and portfolio capital
-        self.combine_holding_records()
+
+                self.queue_fill(idx, stock_entity, action, quantity, filled_price)
+
+        elif time_in_force == constants.TIME_IN_FORCE_DAY:
+            order_status, msg, filled_price = self.execute_order(
+                stock_entity, order_type, action, limit_price, quantity, trade_date, bar
+            )
+            if order_status:
+                book.set_status(idx, constants.ORDER_STATUS_FILLED, timestamp)
+                book.filled_price[idx] = filled_price
+                # Send all the attached orders to "Pending"
+                with self.profiler.phase("attached_order_cascade"):
+                    for order_idx in book.group(order_id):
+                        if order_idx != idx:
+                            book.set_status(order_idx, constants.ORDER_STATUS_PENDING)
+                            book.set_order_date(order_idx, timestamp)
+                            # Add orders into active orders to check if limit or stop loss orders triggered on the
+                            # same day
+                            active_orders.append(order_idx)
+
+                self.queue_fill(idx, stock_entity, action, quantity, filled_price)
+
+            elif order_type != constants.LIMIT_ORDER or self.session_end[bar] == bar:
+                # Limit orders rest until the last bar of the session, which is every bar with daily bars
+                book.set_status(idx, constants.ORDER_STATUS_CANCELLED, timestamp, comments=msg)
+                # Send all the attached orders to "Cancelled"
+                with self.profiler.phase("attached_order_cascade"):
+                    for order_idx in book.group(order_id):
+                        if order_idx != idx:
+                            book.set_status(
+                                order_idx,
+                                constants.ORDER_STATUS_CANCELLED,
+                                timestamp,
+                                comments="Original Order Cancelled",
+                            )
+
+        elif time_in_force == constants.TIME_IN_FORCE_GTC:
+            if order_type == constants.LIMIT_ORDER:
+                order_status, msg, filled_price = self.execute_order(
+                    stock_entity, order_type, action, limit_price, quantity, trade_date, bar
+                )
+            if order_status:
+                book.set_status(idx, constants.ORDER_STATUS_FILLED, timestamp)
+                book.filled_price[idx] = filled_price
+                # Send all the attached orders to "Pending", they become active from the next bar
+                with self.profiler.phase("attached_order_cascade"):
+                    for order_idx in book.group(order_id):
+                        if order_idx != idx:
+                            book.set_status(order_idx, constants.ORDER_STATUS_PENDING)
+                            book.set_order_date(order_idx, timestamp)
+
+                self.queue_fill(idx, stock_entity, action, quantity, filled_price)
+
+    def order_trigger_bar(self, idx: int, start: int) -> int:
+        """
+        First bar from start on which process_order can change the state of an active order
+
+        Mirrors select_orders_to_process: Market orders have to be processed on the next bar, Limit and Stop orders
+        on the first bar whose High / Low range reaches their limit / stop price and Trailing Stop orders on the
+        trigger bar of their stop path. Day orders are also processed on the last bar of their session if they are
+        unattached, and on the first bar of the next session, where they expire, if they are attached.
+
+        :param idx: row of the order in the order book
+        :param start: first bar to search
+        :return: bar index, the number of bars if the order can never change state
+        """
+        book = self.book
+        market_data = self.market_data
+        order_type = book.order_type[idx]
+        action = book.action[idx]
+        column = book.ticker_column[idx]
+        is_limit = order_type == constants.LIMIT_ORDER and action in [
+            constants.TRADE_ACTION_BUY,
+            constants.TRADE_ACTION_SELL,
+        ]
+
+        if start >= len(market_data):
+            return len(market_data)
+
+        if book.time_in_force[idx] == constants.TIME_IN_FORCE_DAY:
+            if MarketData.session_of(book.order_date[idx], self.session_start) != self.session[start]:
+                return start
+            if not book.attached_order[idx]:
+                # Filled within the session or cancelled on its last bar
+                if order_type != constants.LIMIT_ORDER:
+                    return start
+                fill_bar = len(market_data)
+                if is_limit:
+                    fill_bar = market_data.first_bar_in_range(column, book.limit_price[idx], start)
+                return min(fill_bar, self.session_end[start])
+            # Attached Day orders are also processed on the first bar of the next session, where they expire
+            return min(self.attached_order_trigger_bar(idx, start), self.session_end[start] + 1)
+
+        if book.attached_order[idx]:
+            return self.attached_order_trigger_bar(idx, start)
+        if is_limit and book.time_in_force[idx] == constants.TIME_IN_FORCE_GTC:
+            return market_data.first_bar_in_range(column, book.limit_price[idx], start)
+
+        return len(market_data)
+
+    def attached_order_trigger_bar(self, idx: int, start: int) -> int:
+        """
+        First bar from start on which an active attached order can be filled or triggered, see order_trigger_bar
+
+        :param idx: row of the order in the order book
+        :param start: first bar to search
+        :return:
+        """
+        book = self.book
+        market_data = self.market_data
+        order_type = book.order_type[idx]
+        action = book.action[idx]
+        column = book.ticker_column[idx]
+
+        if order_type == constants.LIMIT_ORDER and action in [constants.TRADE_ACTION_BUY, constants.TRADE_ACTION_SELL]:
+            return market_data.first_bar_in_range(column, book.limit_price[idx], start)
+        if order_type in [constants.TRAILING_STOP_ORDER, constants.TRAILING_STOP_LIMIT_ORDER]:
+            # Trigger bar of the precomputed stop path, otherwise the stop price is updated every bar
+            return book.stop_path_trigger[idx] if book.stop_path_start[idx] >= 0 else start
+        if order_type == constants.MARKET_ORDER:
+            return start
+        if order_type in constants.STOP_LOST_TRIGGERS:
+            if action == constants.TRADE_ACTION_BUY:
+                return market_data.first_bar_high_at_or_above(column, book.stop_price[idx], start)
+            return market_data.first_bar_low_at_or_below(column, book.stop_price[idx], start)
+        return len(market_data)
+
+    def next_event_bar(self, bar: int) -> int:
+        """
+        Next bar after the current bar on which an order becomes active or can change state
+
+        The trigger bar of every active order is computed once with a search over the price matrices and cached in
+        the order book, so the cost of finding the next event scales with the number of orders rather than bars.
+
+        :param bar: current bar, already processed
+        :return:
+        """
+        book = self.book
+        market_data = self.market_data
+        next_bar = len(market_data)
+
+        # Next order that becomes active from its order_date
+        order_date = book.next_order_date()
+        if order_date is not None:
+            next_bar = min(next_bar, int(np.searchsorted(market_data.index.asi8, order_date, side="left")))
+
+        rows = book.active_rows(market_data.index.asi8[bar])
+        if len(rows) != 0:
+            for idx in rows[book.trigger_bar[rows] <= bar]:
+                book.trigger_bar[idx] = self.order_trigger_bar(idx, bar + 1)
+            next_bar = min(next_bar, book.trigger_bar[rows].min())
+
+        return max(next_bar, bar + 1)
+
+    def update_records(self, start: int, end: int):
+        """
+        Update the stock holding records and portfolio records of bars start to end (exclusive)
+
+        :param start:
+        :param end:
+        :return:
+        """
+        market_data = self.market_data
+        bars = slice(start, end)
+        timestamps = market_data.index.values[bars]
+
+        # Update Stock Records
+        for ticker, stock_entity in self.stocks.items():
+            prices = market_data.adj_close[bars, market_data.columns[ticker]]
+            if len(timestamps) == 1:
+                stock_entity.update_holding_records(timestamp=timestamps[0], price=prices[0])
+            else:
+                stock_entity.update_holding_records_range(timestamps=timestamps, prices=prices)
+
+        # Update Portfolio Records
+        self.update_portfolio_records_range(timestamps)
+
+    def start_backtest(self):
+        # Create StockEntity for each stock and store in the stocks dictionary
+        self.initialize_stocks()
+        self.initialize_portfolio_records(len(self.market_data))
+        # Work on the columnar order book during the run, the order_book DataFrame is rebuilt once at the end
+        with self.profiler.phase("load_order_book"):
+            self.book = OrderBook.from_dataframe(self.order_book)
+            self.book.set_ticker_columns(self.market_data.columns)
+        self.bar = 0
+
+    def checkpoint_state(self) -> dict:
+        """
+        Full state of the backtest before bar self.bar: order book, stocks, capital, fees and records
+
+        A fingerprint of the bars already processed is kept to check that a resumed backtest runs on the same history.
+
+        :return:
+        """
+        n = self.portfolio_records_size
+        return {
+            "bar": self.bar,
+            "history": self.market_data.fingerprint(self.bar),
+            "session_start": self.session_start,
+            "current_capital": self.current_capital,
+            "fees": self.fees,
+            "volume_month": self.volume_month,
+            "monthly_volume": self.monthly_volume,
+            "portfolio_dates": self.portfolio_dates[:n],
+            "portfolio_fees": self.portfolio_fees[:n],
+            "portfolio_capital": self.portfolio_capital[:n],
+            "book": self.book.to_state(),
+            "stocks": {ticker: stock_entity.to_state() for ticker, stock_entity in self.stocks.items()},
+        }
+
+    def save_checkpoint(self, path: str):
+        """
+        Write the state of the backtest between two bars to a binary checkpoint file, see load_checkpoint
+
+        :param path:
+        :return:
+        """
+        with self.profiler.phase("save_checkpoint"):
+            write_checkpoint(path, self.checkpoint_state())
+
+    def load_checkpoint(self, path: str):
+        """
+        Restore the state saved by save_checkpoint, the backtest then continues from the bar it was saved at
+
+        The market data must start with the same bars, tickers and prices as the ones processed before the
+        checkpoint. The bars after them may differ, e.g. to warm start variants sharing a common history: trailing stop paths and
+        trigger bars refer to the bars following the checkpoint, so they are settled and recomputed.
+
+        :param path:
+        :return:
+        """
+        state = read_checkpoint(path)
+        market_data = self.market_data
+        bar = state["bar"]
+        if len(market_data) < bar or market_data.fingerprint(bar) != state["history"]:
+            raise ValueError(f"The market data does not start with the {bar} bars processed before checkpoint {path}")
+        if state["session_start"] != self.session_start:
+            raise ValueError(f"Checkpoint {path} was saved with a different session_start")
+        if state.get("session_records"):
+            raise ValueError(f"Checkpoint {path} only holds the records of the last bar of every session")
+
+        self.bar = bar
+        self.current_capital = state["current_capital"]
+        self.fees = state["fees"]
+        self.volume_month = state["volume_month"]
+        self.monthly_volume = state["monthly_volume"]
+
+        n = len(state["portfolio_dates"])
+        self.initialize_portfolio_records(max(len(market_data), n))
+        self.portfolio_dates[:n] = state["portfolio_dates"]
+        self.portfolio_fees[:n] = state["portfolio_fees"]
+        self.portfolio_capital[:n] = state["portfolio_capital"]
+        self.portfolio_records_size = n
+
+        self.stocks = {
+            ticker: StockEntity.from_state(stock_state, size=len(market_data))
+            for ticker, stock_state in state["stocks"].items()
+        }
+        self.book = OrderBook.from_state(state["book"])
+        self.settle_trailing_stops(bar - 1)
+        self.book.reset_trigger_bars()
+
+    def run_bars(self, progress: "tqdm", checkpoint_path: str = None, checkpoint_every: int = None):
+        """
+        Process the bars of the current market data from bar self.bar on
+
+        :param progress: progress bar, see instrumentation.progress_bar
+        :param checkpoint_path: file the state is saved to every checkpoint_every bars, see save_checkpoint
+        :param checkpoint_every:
+        :return:
+        """
+        for _ in self.iterate_bars(progress, checkpoint_path=checkpoint_path, checkpoint_every=checkpoint_every):
+            pass
+
+    def iterate_bars(
+        self, progress: "tqdm", checkpoint_path: str = None, checkpoint_every: int = None
+    ) -> Iterator[int]:
+        """
+        Process the bars of the current market data from bar self.bar on, yielding after every processed bar
+
+        The backtest stops early once the event stream is stopped, e.g. on its drawdown threshold.
+
+        :param progress: progress bar, see instrumentation.progress_bar
+        :param checkpoint_path: file the state is saved to every checkpoint_every bars, see save_checkpoint
+        :param checkpoint_every:
+        :return: the bar just processed
+        """
+        market_data = self.market_data
+        profiler = self.profiler
+        event_stream = self.event_stream
+        self.session, self.session_end = market_data.sessions(self.session_start)
+        if event_stream is not None:
+            if self.book.changes is None:
+                self.book.record_changes()
+            event_stream.start_bars(self)
+
+        bar = self.bar
+        next_checkpoint = bar + checkpoint_every if checkpoint_every else len(market_data)
+        while bar < len(market_data):
+            bar_start = time.perf_counter() if profiler.enabled else 0.0
+            # Convert current_timestamp to pd.Timestamp type
+            current_timestamp = typing.cast(pd.Timestamp, market_data.index[bar])
+
+            self.process_orders(bar, current_timestamp)
+
+            # Bars skipped until the next event only need their holding and portfolio records filled in
+            if self.skip_idle_bars:
+                with profiler.phase("next_event_bar"):
+                    next_bar = self.next_event_bar(bar)
+            else:
+                next_bar = bar + 1
+            next_bar = min(next_bar, len(market_data))
+            with profiler.phase("update_records"):
+                self.update_records(bar, next_bar)
+            if event_stream is not None:
+                with profiler.phase("publish_events"):
+                    event_stream.publish_bars(self, bar, next_bar)
+
+            if profiler.enabled:
+                profiler.record_bar(bar, time.perf_counter() - bar_start)
+            progress.update(next_bar - bar)
+            processed_bar = bar
+            bar = self.bar = next_bar
+
+            if bar >= next_checkpoint and bar < len(market_data):
+                self.save_checkpoint(checkpoint_path)
+                next_checkpoint = bar + checkpoint_every
+            yield processed_bar
+            if event_stream is not None and event_stream.stopped:
+                break
+
+        self.settle_trailing_stops(bar - 1)
+        if event_stream is not None:
+            event_stream.flush()
+
+    def finish_backtest(self):
+        # Rebuild the order book DataFrame from the columnar order book
+        with self.profiler.phase("build_order_book"):
+            self.order_book = self.book.to_dataframe()
+        # The combined holding records and portfolio analytics are built on first access
+
+    def backtest(self, checkpoint_path: str = None, checkpoint_every: int = None, resume: bool = False):
+        """
+        Run the backtest over the market data
+
+        With checkpoint_path and checkpoint_every, the state is saved to checkpoint_path every checkpoint_every bars.
+        With resume, the backtest continues from the checkpoint saved in checkpoint_path instead of starting over,
+        the results are the same as those of an uninterrupted backtest.
+
+        :param checkpoint_path:
+        :param checkpoint_every: number of bars between two checkpoints
+        :param resume:
+        :return:
+        """
+        if (checkpoint_every or resume) and checkpoint_path is None:
+            raise ValueError("checkpoint_every and resume need a checkpoint_path")
+
+        if resume:
+            with self.profiler.phase("load_checkpoint"):
+                self.load_checkpoint(checkpoint_path)
+        else:
+            self.start_backtest()
+
+        progress = progress_bar(total=len(self.market_data), enabled=self.show_progress)
+        progress.update(self.bar)
+        self.run_bars(progress, checkpoint_path=checkpoint_path, checkpoint_every=checkpoint_every)
+        progress.close()
+
+        self.finish_backtest()
+
+    def start_chunk(self, market_data: MarketData, first: bool, keep_records: bool = False):
+        """
+        Continue the backtest on market_data, whose bars follow the bars of the previous market data
+
+        The order book, positions and capital are carried over. The holding and portfolio records of the previous
+        chunks are dropped, unless keep_records, in which case the records of the new bars are appended to them.
+
+        :param market_data:
+        :param first: the first chunk of the backtest
+        :param keep_records:
+        :return:
+        """
+        self.market_data = market_data
+        if first:
+            self.start_backtest()
+        else:
+            if not keep_records:
+                for stock_entity in self.stocks.values():
+                    stock_entity.initialize_holding_records(len(market_data))
+                self.initialize_portfolio_records(len(market_data))
+            # Cached trigger bars are positions within the previous chunk
+            self.book.reset_trigger_bars()
+        self.bar = 0
+
+    def backtest_events(self, event_stream: EventStream = None) -> Iterator[List[Event]]:
+        """
+        Run the backtest, yielding the batches of events of the event stream as they are published
+
+        Stopping the iteration leaves the backtest where it is, stopping the event stream (e.g. on its drawdown
+        threshold) ends the backtest early. The results are available once the iteration completes.
+
+        :param event_stream: defaults to self.event_stream, or an EventStream with the default batch size
+        :return:
+        """
+        if event_stream is not None:
+            self.event_stream = event_stream
+        elif self.event_stream is None:
+            self.event_stream = EventStream()
+        batches = deque()
+        self.event_stream.subscribe(batches.append)
+
+        try:
+            self.start_backtest()
+            progress = progress_bar(total=len(self.market_data), enabled=self.show_progress)
+            for _ in self.iterate_bars(progress):
+                while batches:
+                    yield batches.popleft()
+            progress.close()
+            self.finish_backtest()
+            while batches:
+                yield batches.popleft()
+        finally:
+            self.event_stream.unsubscribe(batches.append)
+
+    def backtest_stream(self, chunks: Iterable[pd.DataFrame], records_path: str):
+        """
+        Backtest over an iterator of OHLCV chunks instead of a single DataFrame
+
+        Each chunk has the same (ticker, field) MultiIndex columns as ohlvc and holds the bars following the previous
+        chunk. Only the chunk being processed and the next one are held in memory: the order book, positions and
+        capital are carried over, while the combined holding records of every chunk are appended to the records_path
+        CSV file and dropped from memory. Read them back with pd.read_csv(records_path, header=[0, 1], index_col=0,
+        parse_dates=True). The next chunk is read before a chunk is processed, so that a session continuing into it
+        stays open and its Day orders do not expire at the end of the chunk.
+
+        :param chunks: iterable of OHLCV DataFrames in date order, e.g. a generator reading row groups from disk
+        :param records_path: CSV file the combined holding records are written to, overwritten if it exists
+        :return:
+        """
+        tickers = list(self.order_book["ticker"].unique())
+        progress = progress_bar(enabled=self.show_progress)
+        previous_portfolio_value = None
+
+        chunks = iter(chunks)
+        chunk = next(chunks, None)
+        i = 0
+        while chunk is not None:
+            next_chunk = next(chunks, None)
+            market_data = MarketData.from_ohlvc(chunk, tickers=tickers)
+            if next_chunk is not None and len(chunk) and len(next_chunk):
+                # Session of the last bar of the chunk and of the first bar of the next chunk
+                session = MarketData.session_of(
+                    pd.DatetimeIndex([chunk.index[-1], next_chunk.index[0]]).asi8, self.session_start
+                )
+                market_data.open_session = bool(session[0] == session[1])
+            self.start_chunk(market_data, first=i == 0)
+            self.run_bars(progress)
+            self.combine_holding_records()
+
+            # The returns of the first bar of a chunk are relative to the last bar of the previous chunk
+            portfolio_value = self.combined_holding_records[("Portfolio", "portfolio_value")]
+            if previous_portfolio_value is not None and len(portfolio_value) != 0:
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    first_return = portfolio_value.iloc[0] / previous_portfolio_value - 1
+                returns_column = self.combined_holding_records.columns.get_loc(("Portfolio", "returns"))
+                self.combined_holding_records.iat[0, returns_column] = first_return
+            if len(portfolio_value) != 0:
+                previous_portfolio_value = portfolio_value.iloc[-1]
+
+            self.combined_holding_records.to_csv(records_path, mode="w" if i == 0 else "a", header=i == 0)
+            chunk = next_chunk
+            i += 1
+
+        progress.close()
+        self.order_book = self.book.to_dataframe()
@@ -0,0 +1,376 @@
+"""
+Benchmark suite of the backtest loop on synthetic data
+
+Usage:
+    python -m src.benchmark --suite small --output benchmark.json
+    python -m src.benchmark --tickers 50 --bars 2520 --groups 5000 --fill-mode batched --skip-idle-bars
+    python -m src.benchmark --suite small --compare benchmark.json
+    python -m src.benchmark --import-time
+    python -m src.benchmark --tickers 100 --bars 98280 --groups 20000 --intraday-freq 1min --fill-mode batched
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from src import constants
+from src.backtest_engine import BacktestEngine
+from src.entity import StockEntity
+from src.ibkr_fees import calculate_ibkr_fixed_cost, calculate_ibkr_fixed_costs
+from src.synthetic import (
+    DEFAULT_ATTACHED_MIX,
+    DEFAULT_PARENT_MIX,
+    generate_ohlcv,
+    generate_order_book,
+    intraday_index,
+)
+
+
+@dataclass
+class BenchmarkConfig:
+    name: str
+    tickers: int
+    bars: int
+    groups: int
+    parent_mix: Dict[str, float] = field(default_factory=lambda: dict(DEFAULT_PARENT_MIX))
+    attached_mix: Dict[str, float] = field(default_factory=lambda: dict(DEFAULT_ATTACHED_MIX))
+    attached_ratio: float = 1.0
+    fill_mode: str = constants.FILL_MODE_SEQUENTIAL
+    skip_idle_bars: bool = False
+    seed: int = 0
+    # Number of timed runs, the fastest one is reported
+    repeat: int = 3
+    # Frequency of intraday bars in 09:30 - 16:00 sessions, e.g. 1min, None for daily bars. Intraday backtests keep
+    # the holding records of the last bar of every session only
+    intraday_freq: str = None
+
+
+SUITES = {
+    "small": [
+        BenchmarkConfig(name="small", tickers=5, bars=250, groups=200),
+        BenchmarkConfig(
+            name="small-batched",
+            tickers=5,
+            bars=250,
+            groups=200,
+            fill_mode=constants.FILL_MODE_BATCHED,
+            skip_idle_bars=True,
+        ),
+    ],
+    "medium": [
+        BenchmarkConfig(name="medium", tickers=20, bars=1260, groups=2000, repeat=1),
+        BenchmarkConfig(
+            name="medium-batched",
+            tickers=20,
+            bars=1260,
+            groups=2000,
+            fill_mode=constants.FILL_MODE_BATCHED,
+            skip_idle_bars=True,
+        ),
+    ],
+    "intraday": [
+        BenchmarkConfig(
+            name="intraday-batched",
+            tickers=20,
+            bars=390 * 20,
+            groups=2000,
+            fill_mode=constants.FILL_MODE_BATCHED,
+            skip_idle_bars=True,
+            repeat=1,
+            intraday_freq="1min",
+        ),
+    ],
+    "large": [
+        BenchmarkConfig(
+            name="large-batched",
+            tickers=100,
+            bars=2520,
+            groups=20000,
+            fill_mode=constants.FILL_MODE_BATCHED,
+            skip_idle_bars=True,
+            repeat=1,
+        ),
+    ],
+}
+
+
+def best_time(function: Callable[[], object], repeat: int) -> float:
+    """Fastest wall time of repeat calls of function, in seconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def peak_memory(function: Callable[[], object]) -> int:
+    """Peak memory allocated while calling function, in bytes"""
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def run_benchmark(config: BenchmarkConfig) -> dict:
+    """
+    Time the backtest and its components on synthetic data generated from the config
+
+    :param config:
+    :return: timings in seconds, throughputs and peak memory in bytes
+    """
+    index = None
+    if config.intraday_freq is not None:
+        bars_per_session = len(intraday_index(1, freq=config.intraday_freq))
+        index = intraday_index(-(-config.bars // bars_per_session), freq=config.intraday_freq)
+    ohlcv = generate_ohlcv([f"T{i}" for i in range(config.tickers)], config.bars, seed=config.seed, index=index)
+    order_book = generate_order_book(
+        ohlcv,
+        config.groups,
+        seed=config.seed,
+        parent_mix=config.parent_mix,
+        attached_mix=config.attached_mix,
+        attached_ratio=config.attached_ratio,
+    )
+
+    def make_engine() -> BacktestEngine:
+        return BacktestEngine(
+            order_book=order_book,
+            ohlvc=ohlcv,
+            fill_mode=config.fill_mode,
+            skip_idle_bars=config.skip_idle_bars,
+            show_progress=False,
+        )
+
+    engines: List[BacktestEngine] = []
+
+    def backtest():
+        engine = make_engine()
+        engine.backtest()
+        engines.append(engine)
+
+    backtest_time = best_time(backtest, config.repeat)
+    backtest_memory = peak_memory(lambda: make_engine().backtest())
+    engine = engines[-1]
+    filled = int((engine.order_book["status"] == constants.ORDER_STATUS_FILLED).sum())
+
+    # Holding records of one stock updated bar by bar
+    timestamps = ohlcv.index.values
+    prices = np.linspace(100.0, 200.0, len(timestamps))
+
+    def update_holding_records():
+        stock_entity = StockEntity(symbol="T0")
+        stock_entity.initialize_holding_records(len(timestamps))
+        for timestamp, price in zip(timestamps, prices):
+            stock_entity.update_holding_records(timestamp, price)
+        return stock_entity.holding_records
+
+    # Fees of a batch of fills
+    rng = np.random.default_rng(config.seed)
+    quantities = rng.integers(1, 1000, 10_000).astype(np.float64)
+    fill_prices = rng.uniform(1, 500, 10_000)
+
+    def calculate_fees():
+        return [calculate_ibkr_fixed_cost(qty, price) for qty, price in zip(quantities, fill_prices)]
+
+    def combine_holding_records():
+        # The analytics the records are combined from are cached by the engine, rebuild them on every call
+        engine.clear_cached_records()
+        engine.combine_holding_records()
+
+    holding_records_time = best_time(update_holding_records, config.repeat)
+    combine_time = best_time(combine_holding_records, config.repeat)
+    fees_time = best_time(calculate_fees, config.repeat)
+    vectorized_fees_time = best_time(lambda: calculate_ibkr_fixed_costs(quantities, fill_prices), config.repeat)
+
+    return {
+        "orders": len(order_book),
+        "filled_orders": filled,
+        "backtest_seconds": backtest_time,
+        "bars_per_second": config.bars / backtest_time,
+        "orders_per_second": len(order_book) / backtest_time,
+        "backtest_peak_memory_bytes": backtest_memory,
+        "update_holding_records_seconds": holding_records_time,
+        "holding_records_per_second": len(timestamps) / holding_records_time,
+        "combine_holding_records_seconds": combine_time,
+        "fees_seconds": fees_time,
+        "fees_per_second": len(quantities) / fees_time,
+        "vectorized_fees_seconds": vectorized_fees_time,
+    }
+
+
+# Modules the backtest loop must not import, they are only needed for reporting and progress bars
+OPTIONAL_MODULES = ["quantstats", "matplotlib", "seaborn", "scipy", "tqdm", "yfinance", "IPython"]
+
+IMPORT_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(seconds, *[name for name in {optional_modules} if name in sys.modules])
+"""
+
+
+def import_time(module: str = "src.backtest_engine", repeat: int = 3) -> dict:
+    """
+    Time the import of module in fresh interpreters, the way a sweep worker process starts
+
+    :param module:
+    :param repeat:
+    :return: fastest import time in seconds and the OPTIONAL_MODULES the import loaded
+    """
+    timings = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_SCRIPT.format(module=module, optional_modules=OPTIONAL_MODULES)],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        ).stdout.split()
+        timings.append(float(output[0]))
+    return {"module": module, "import_seconds": min(timings), "optional_modules": output[1:]}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(configs: List[BenchmarkConfig]) -> dict:
+    return {
+        "commit": git_commit(),
+        "created": pd.Timestamp.now().isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "import": import_time(),
+        "benchmarks": [{"config": asdict(config), "results": run_benchmark(config)} for config in configs],
+    }
+
+
+def ratio(value: float, baseline: float) -> float:
+    """value / baseline, NaN when the baseline is missing or 0"""
+    if baseline is None or baseline == 0:
+        return np.nan
+    return value / baseline
+
+
+def compare(baseline: dict, results: dict) -> pd.DataFrame:
+    """
+    Ratio of every timing between two benchmark JSON files, above 1 means the results are slower than the baseline
+
+    Metrics missing from the baseline, e.g. added since it was recorded, or 0 in the baseline have a NaN ratio.
+
+    :param baseline:
+    :param results:
+    :return:
+    """
+    baseline_results = {benchmark["config"]["name"]: benchmark["results"] for benchmark in baseline["benchmarks"]}
+    rows = []
+    for benchmark in results["benchmarks"]:
+        name = benchmark["config"]["name"]
+        if name not in baseline_results:
+            continue
+        for metric, value in benchmark["results"].items():
+            if metric.endswith("_seconds") or metric.endswith("_bytes"):
+                baseline_value = baseline_results[name].get(metric)
+                rows.append(
+                    {
+                        "benchmark": name,
+                        "metric": metric,
+                        "baseline": np.nan if baseline_value is None else baseline_value,
+                        "result": value,
+                        "ratio": ratio(value, baseline_value),
+                    }
+                )
+    if "import" in baseline and "import" in results:
+        baseline_value = baseline["import"].get("import_seconds")
+        rows.append(
+            {
+                "benchmark": "import",
+                "metric": "import_seconds",
+                "baseline": np.nan if baseline_value is None else baseline_value,
+                "result": results["import"]["import_seconds"],
+                "ratio": ratio(results["import"]["import_seconds"], baseline_value),
+            }
+        )
+    return pd.DataFrame(rows, columns=["benchmark", "metric", "baseline", "result", "ratio"])
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Benchmark the backtest engine on synthetic data")
+    parser.add_argument("--suite", choices=list(SUITES), help="predefined benchmarks to run")
+    parser.add_argument("--tickers", type=int, default=10)
+    parser.add_argument("--bars", type=int, default=500)
+    parser.add_argument("--groups", type=int, default=500, help="number of parent orders")
+    parser.add_argument("--attached-ratio", type=float, default=1.0, help="average attached orders per parent")
+    parser.add_argument(
+        "--fill-mode",
+        choices=[constants.FILL_MODE_SEQUENTIAL, constants.FILL_MODE_BATCHED],
+        default=constants.FILL_MODE_SEQUENTIAL,
+    )
+    parser.add_argument("--skip-idle-bars", action="store_true")
+    parser.add_argument("--intraday-freq", help="frequency of intraday bars, e.g. 1min, daily bars by default")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="JSON file to save the results to")
+    parser.add_argument("--compare", help="JSON file of a previous run to compare the results with")
+    parser.add_argument("--import-time", action="store_true", help="only time the import of the backtest engine")
+    args = parser.parse_args(argv)
+
+    if args.import_time:
+        json.dump(import_time(repeat=args.repeat), sys.stdout, indent=2)
+        print()
+        return
+
+    if args.suite is not None:
+        configs = SUITES[args.suite]
+    else:
+        configs = [
+            BenchmarkConfig(
+                name="custom",
+                tickers=args.tickers,
+                bars=args.bars,
+                groups=args.groups,
+                attached_ratio=args.attached_ratio,
+                fill_mode=args.fill_mode,
+                skip_idle_bars=args.skip_idle_bars,
+                seed=args.seed,
+                intraday_freq=args.intraday_freq,
+                repeat=args.repeat,
+            )
+        ]
+
+    results = run_suite(configs)
+    if args.output is None:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            print(compare(json.load(f), results).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+import os
+import pickle
+
+# Bumped whenever the layout of the engine state changes, older checkpoints are rejected
+CHECKPOINT_VERSION = 2
+
+
+def write_checkpoint(path: str, state: dict):
+    """
+    Write the state of a backtest to a binary checkpoint file
+
+    NumPy arrays are pickled with protocol 5 as raw buffers. The file is written to a temporary file first, so an
+    interrupted write never replaces the previous checkpoint with a truncated one.
+
+    :param path:
+    :param state: e.g. BacktestEngine.checkpoint_state()
+    :return:
+    """
+    with open(path + ".tmp", "wb") as f:
+        pickle.dump({"version": CHECKPOINT_VERSION, "state": state}, f, protocol=5)
+    os.replace(path + ".tmp", path)
+
+
+def read_checkpoint(path: str) -> dict:
+    """
+    Read the state written by write_checkpoint
+
+    :param path:
+    :return:
+    """
+    with open(path, "rb") as f:
+        checkpoint = pickle.load(f)
+    if checkpoint.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(
+            f"Checkpoint {path} has version {checkpoint.get('version')}, expected version {CHECKPOINT_VERSION}"
+        )
+    return checkpoint["state"]
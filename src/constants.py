@@ -33,6 +33,64 @@ TRADE_ACTION_SELL = "Sell"
 TIME_IN_FORCE_DAY = "Day"
 TIME_IN_FORCE_GTC = "Good Till Cancelled"
 
+# Fill Modes
+FILL_MODE_SEQUENTIAL = "sequential"  # Every active order is checked one at a time
+FILL_MODE_BATCHED = "batched"  # Active orders are checked against the bar in one NumPy pass first
+
+# Fee Models
+FEE_MODEL_FIXED = "fixed"  # IBKR fixed pricing
+FEE_MODEL_TIERED = "tiered"  # IBKR tiered pricing, based on the share volume traded in the month
+
 
 # Stop Loss Triggers
 STOP_LOST_TRIGGERS = [TRAILING_STOP_ORDER, TRAILING_STOP_LIMIT_ORDER, STOP_ORDER, STOP_LIMIT_ORDER]
+
+# Integer codes of the order book enumerations. The order book stores them next to the strings so that the backtest
+# loop selects orders with NumPy integer comparisons instead of comparing object arrays of strings. 0 is the code of
+# missing and unknown values
+MARKET_ORDER_CODE = 1
+LIMIT_ORDER_CODE = 2
+STOP_ORDER_CODE = 3
+STOP_LIMIT_ORDER_CODE = 4
+TRAILING_STOP_ORDER_CODE = 5
+TRAILING_STOP_LIMIT_ORDER_CODE = 6
+ORDER_TYPE_CODES = {
+    MARKET_ORDER: MARKET_ORDER_CODE,
+    LIMIT_ORDER: LIMIT_ORDER_CODE,
+    STOP_ORDER: STOP_ORDER_CODE,
+    STOP_LIMIT_ORDER: STOP_LIMIT_ORDER_CODE,
+    TRAILING_STOP_ORDER: TRAILING_STOP_ORDER_CODE,
+    TRAILING_STOP_LIMIT_ORDER: TRAILING_STOP_LIMIT_ORDER_CODE,
+}
+
+TRADE_ACTION_BUY_CODE = 1
+TRADE_ACTION_SELL_CODE = 2
+TRADE_ACTION_CODES = {TRADE_ACTION_BUY: TRADE_ACTION_BUY_CODE, TRADE_ACTION_SELL: TRADE_ACTION_SELL_CODE}
+
+TIME_IN_FORCE_DAY_CODE = 1
+TIME_IN_FORCE_GTC_CODE = 2
+TIME_IN_FORCE_CODES = {TIME_IN_FORCE_DAY: TIME_IN_FORCE_DAY_CODE, TIME_IN_FORCE_GTC: TIME_IN_FORCE_GTC_CODE}
+
+TRAIL_TYPE_VALUE_CODE = 1
+TRAIL_TYPE_PERCENTAGE_CODE = 2
+TRAIL_TYPE_CODES = {TRAIL_TYPE_VALUE: TRAIL_TYPE_VALUE_CODE, TRAIL_TYPE_PERCENTAGE: TRAIL_TYPE_PERCENTAGE_CODE}
+
+ORDER_STATUS_PENDING_CODE = 1
+ORDER_STATUS_FILLED_CODE = 2
+ORDER_STATUS_CANCELLED_CODE = 3
+ORDER_STATUS_EXPIRED_CODE = 4
+ORDER_STATUS_CODES = {
+    ORDER_STATUS_PENDING: ORDER_STATUS_PENDING_CODE,
+    ORDER_STATUS_FILLED: ORDER_STATUS_FILLED_CODE,
+    ORDER_STATUS_CANCELLED: ORDER_STATUS_CANCELLED_CODE,
+    ORDER_STATUS_EXPIRED: ORDER_STATUS_EXPIRED_CODE,
+}
+
+# Kinds of the events published during a backtest, see events.EventStream
+EVENT_ORDER_ACTIVATED = "order_activated"
+EVENT_ORDER_TRIGGERED = "order_triggered"  # A stop order whose stop price was reached, replaced by a Limit order
+EVENT_ORDER_FILLED = "order_filled"
+EVENT_ORDER_EXPIRED = "order_expired"
+EVENT_ORDER_CANCELLED = "order_cancelled"
+EVENT_POSITION_CHANGED = "position_changed"
+EVENT_NAV_SNAPSHOT = "nav_snapshot"
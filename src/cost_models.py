@@ -0,0 +1,280 @@
+from typing import Callable, Dict, Type, Union
+
+import numpy as np
+
+from src import constants
+from src.ibkr_fees import (
+    calculate_ibkr_fixed_cost,
+    calculate_ibkr_fixed_costs,
+    calculate_ibkr_tiered_cost,
+    calculate_ibkr_tiered_costs,
+)
+
+
+class CommissionModel:
+    """
+    Commission charged on a fill
+
+    Subclasses implement commission for a single fill. Models that also implement commissions for arrays of fills
+    set vectorized = True, the engine then evaluates all the fills of a bar in one call.
+    """
+
+    vectorized = False
+
+    def commission(self, quantity: float, price: float, month_volume: float) -> float:
+        """
+        :param quantity: number of shares filled
+        :param price: filled price
+        :param month_volume: shares traded earlier in the month, for volume tiered pricing
+        :return:
+        """
+        raise NotImplementedError
+
+    def commissions(self, quantity: np.ndarray, price: np.ndarray, month_volume: np.ndarray) -> np.ndarray:
+        return np.array([self.commission(q, p, v) for q, p, v in zip(quantity, price, month_volume)])
+
+
+class SlippageModel:
+    """
+    Price adjustment of Market order fills, e.g. to model the spread or the market impact of the order
+
+    Limit order fills are never adjusted, they are filled at their limit price. Subclasses implement slipped_price
+    for a single fill, and slipped_prices for arrays of fills when vectorized = True.
+    """
+
+    vectorized = False
+
+    def slipped_price(
+        self, is_buy: bool, price: float, quantity: float, high: float, low: float, volume: float
+    ) -> float:
+        """
+        :param is_buy: True for buy orders, False for sell orders
+        :param price: unadjusted filled price, the Open of the bar
+        :param quantity: number of shares filled
+        :param high: High of the bar
+        :param low: Low of the bar
+        :param volume: Volume of the bar, NaN if the OHLCV data has no volume
+        :return: filled price
+        """
+        raise NotImplementedError
+
+    def slipped_prices(
+        self,
+        is_buy: np.ndarray,
+        price: np.ndarray,
+        quantity: np.ndarray,
+        high: np.ndarray,
+        low: np.ndarray,
+        volume: np.ndarray,
+    ) -> np.ndarray:
+        return np.array(
+            [self.slipped_price(*fill) for fill in zip(is_buy, price, quantity, high, low, volume)], dtype=np.float64
+        )
+
+
+COMMISSION_MODELS: Dict[str, Type[CommissionModel]] = {}
+SLIPPAGE_MODELS: Dict[str, Type[SlippageModel]] = {}
+
+
+def register_commission_model(name: str) -> Callable:
+    """Class decorator registering a CommissionModel under a name usable as BacktestEngine(fee_model=name)"""
+
+    def register(cls):
+        COMMISSION_MODELS[name] = cls
+        return cls
+
+    return register
+
+
+def register_slippage_model(name: str) -> Callable:
+    """Class decorator registering a SlippageModel under a name usable as BacktestEngine(slippage_model=name)"""
+
+    def register(cls):
+        SLIPPAGE_MODELS[name] = cls
+        return cls
+
+    return register
+
+
+def get_commission_model(model: Union[str, CommissionModel]) -> CommissionModel:
+    """
+    Commission model from a registered name or a model instance
+
+    :param model:
+    :return:
+    """
+    if isinstance(model, CommissionModel):
+        return model
+    if model not in COMMISSION_MODELS:
+        raise ValueError(f"Unknown commission model {model}, expected one of {list(COMMISSION_MODELS)}")
+    return COMMISSION_MODELS[model]()
+
+
+def get_slippage_model(model: Union[str, SlippageModel, None]) -> SlippageModel:
+    """
+    Slippage model from a registered name or a model instance, None means no slippage
+
+    :param model:
+    :return:
+    """
+    if model is None:
+        model = "none"
+    if isinstance(model, SlippageModel):
+        return model
+    if model not in SLIPPAGE_MODELS:
+        raise ValueError(f"Unknown slippage model {model}, expected one of {list(SLIPPAGE_MODELS)}")
+    return SLIPPAGE_MODELS[model]()
+
+
+@register_commission_model(constants.FEE_MODEL_FIXED)
+class IBKRFixedCommission(CommissionModel):
+    vectorized = True
+
+    def commission(self, quantity, price, month_volume):
+        return calculate_ibkr_fixed_cost(qty=quantity, price_per_share=price)
+
+    def commissions(self, quantity, price, month_volume):
+        return calculate_ibkr_fixed_costs(quantity, price)
+
+
+@register_commission_model(constants.FEE_MODEL_TIERED)
+class IBKRTieredCommission(CommissionModel):
+    vectorized = True
+
+    def commission(self, quantity, price, month_volume):
+        return calculate_ibkr_tiered_cost(current_month_vol=month_volume, qty=quantity, price=price)
+
+    def commissions(self, quantity, price, month_volume):
+        return calculate_ibkr_tiered_costs(month_volume, quantity, price)
+
+
+@register_commission_model("per_share")
+class PerShareCommission(CommissionModel):
+    """Commission per share with a minimum per order"""
+
+    vectorized = True
+
+    def __init__(self, per_share: float = 0.005, minimum: float = 1.0):
+        self.per_share = per_share
+        self.minimum = minimum
+
+    def commission(self, quantity, price, month_volume):
+        return max(self.minimum, quantity * self.per_share)
+
+    def commissions(self, quantity, price, month_volume):
+        return np.maximum(self.minimum, np.asarray(quantity, dtype=np.float64) * self.per_share)
+
+
+@register_commission_model("zero")
+class ZeroCommission(CommissionModel):
+    vectorized = True
+
+    def commission(self, quantity, price, month_volume):
+        return 0.0
+
+    def commissions(self, quantity, price, month_volume):
+        return np.zeros(len(quantity))
+
+
+@register_slippage_model("none")
+class NoSlippage(SlippageModel):
+    vectorized = True
+
+    def slipped_price(self, is_buy, price, quantity, high, low, volume):
+        return price
+
+    def slipped_prices(self, is_buy, price, quantity, high, low, volume):
+        return np.asarray(price, dtype=np.float64)
+
+
+@register_slippage_model("fixed_bps")
+class FixedBpsSlippage(SlippageModel):
+    """Buy orders are filled bps basis points above the Open, sell orders below it"""
+
+    vectorized = True
+
+    def __init__(self, bps: float = 5.0):
+        self.bps = bps
+
+    def slipped_price(self, is_buy, price, quantity, high, low, volume):
+        return price * (1 + self.bps / 10000) if is_buy else price * (1 - self.bps / 10000)
+
+    def slipped_prices(self, is_buy, price, quantity, high, low, volume):
+        price = np.asarray(price, dtype=np.float64)
+        return np.where(is_buy, price * (1 + self.bps / 10000), price * (1 - self.bps / 10000))
+
+
+@register_slippage_model("range")
+class RangeSlippage(SlippageModel):
+    """Slippage of a fraction of the High - Low range of the bar, a proxy of the spread"""
+
+    vectorized = True
+
+    def __init__(self, fraction: float = 0.1):
+        self.fraction = fraction
+
+    def slipped_price(self, is_buy, price, quantity, high, low, volume):
+        slippage = self.fraction * (high - low)
+        return price + slippage if is_buy else price - slippage
+
+    def slipped_prices(self, is_buy, price, quantity, high, low, volume):
+        slippage = self.fraction * (np.asarray(high, dtype=np.float64) - np.asarray(low, dtype=np.float64))
+        price = np.asarray(price, dtype=np.float64)
+        return np.where(is_buy, price + slippage, price - slippage)
+
+
+@register_slippage_model("volume_share")
+class VolumeShareSlippage(SlippageModel):
+    """Market impact proportional to the share of the bar volume traded, no slippage without volume data"""
+
+    vectorized = True
+
+    def __init__(self, impact: float = 0.1):
+        self.impact = impact
+
+    def slipped_price(self, is_buy, price, quantity, high, low, volume):
+        if not volume > 0:
+            return price
+        slippage = price * self.impact * quantity / volume
+        return price + slippage if is_buy else price - slippage
+
+    def slipped_prices(self, is_buy, price, quantity, high, low, volume):
+        price = np.asarray(price, dtype=np.float64)
+        volume = np.asarray(volume, dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            slippage = np.where(volume > 0, price * self.impact * np.asarray(quantity) / volume, 0.0)
+        return np.where(is_buy, price + slippage, price - slippage)
+
+
+@register_slippage_model("participation")
+class ParticipationSlippage(SlippageModel):
+    """
+    Cap on the share of the bar volume filled at the Open, the rest of the order is filled at the High (Buy) / Low
+    (Sell) of the bar
+
+    The cap is per bar, so it follows the resolution of the bars: an order within the cap of a daily bar can exceed
+    the cap of every minute bar, and is then filled mostly at the worst price of the bar. No slippage without volume
+    data
+    """
+
+    vectorized = True
+
+    def __init__(self, max_participation: float = 0.1):
+        self.max_participation = max_participation
+
+    def slipped_price(self, is_buy, price, quantity, high, low, volume):
+        cap = self.max_participation * volume
+        worst = high if is_buy else low
+        if not volume > 0 or quantity <= cap or np.isnan(worst):
+            return price
+        return (cap * price + (quantity - cap) * worst) / quantity
+
+    def slipped_prices(self, is_buy, price, quantity, high, low, volume):
+        price = np.asarray(price, dtype=np.float64)
+        quantity = np.asarray(quantity, dtype=np.float64)
+        volume = np.asarray(volume, dtype=np.float64)
+        worst = np.where(is_buy, high, low)
+        excess = np.where(volume > 0, quantity - self.max_participation * volume, 0.0)
+        excess = np.where((excess > 0) & ~np.isnan(worst), excess, 0.0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(excess > 0, price + excess * (worst - price) / quantity, price)
@@ -1,6 +1,7 @@
 from dataclasses import dataclass
 from typing import List, Tuple
 
+import numpy as np
 import pandas as pd
 
 from src import constants
@@ -8,6 +9,8 @@ from src import constants
 
 @dataclass
 class Trade:
+    __slots__ = ("date", "symbol", "order_type", "action", "limit_price", "quantity", "fees")
+
     date: str
     symbol: str
     order_type: str
@@ -25,6 +28,93 @@ class HoldingRecords:
     portfolio_value: float
 
 
+class TradeLedger:
+    """
+    Append-only list of trades stored in growable typed arrays
+
+    Dates are stored as int64 nanoseconds and the string fields as int16 codes into a per-column list of values, so
+    a trade takes 38 bytes and appending is amortised O(1). The trades DataFrame is built with to_dataframe, dates
+    are formatted back to strings with DATE_FORMAT, the format the backtest engine records trades with.
+    """
+
+    DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+    FLOAT_COLUMNS = ["limit_price", "quantity", "fees"]
+    CODE_COLUMNS = ["symbol", "order_type", "action"]
+    COLUMNS = ["date", "symbol", "order_type", "action", "limit_price", "quantity", "fees"]
+
+    def __init__(self, capacity: int = 16):
+        self.size = 0
+        self.date = np.empty(capacity, dtype=np.int64)
+        for column in self.FLOAT_COLUMNS:
+            setattr(self, column, np.empty(capacity, dtype=np.float64))
+        for column in self.CODE_COLUMNS:
+            setattr(self, column, np.empty(capacity, dtype=np.int16))
+        # Distinct values of every code column, the code of a value is its position in the list
+        self.values = {column: [] for column in self.CODE_COLUMNS}
+        self._codes = {column: {} for column in self.CODE_COLUMNS}
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self):
+        for column in self.COLUMNS:
+            old = getattr(self, column)
+            new = np.empty(max(2 * len(old), 1), dtype=old.dtype)
+            new[: len(old)] = old
+            setattr(self, column, new)
+
+    def _code(self, column: str, value) -> int:
+        codes = self._codes[column]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(self.values[column])
+            self.values[column].append(value)
+        return code
+
+    def append(self, trade: Trade):
+        if self.size == len(self.date):
+            self._grow()
+
+        i = self.size
+        self.date[i] = pd.Timestamp(trade.date).value
+        self.symbol[i] = self._code("symbol", trade.symbol)
+        self.order_type[i] = self._code("order_type", trade.order_type)
+        self.action[i] = self._code("action", trade.action)
+        self.limit_price[i] = trade.limit_price
+        self.quantity[i] = trade.quantity
+        self.fees[i] = trade.fees
+        self.size += 1
+
+    def to_state(self) -> dict:
+        n = self.size
+        state = {column: getattr(self, column)[:n] for column in self.COLUMNS}
+        state.update(size=n, values=self.values)
+        return state
+
+    @classmethod
+    def from_state(cls, state: dict) -> "TradeLedger":
+        n = state["size"]
+        ledger = cls(capacity=max(n, 16))
+        for column in cls.COLUMNS:
+            getattr(ledger, column)[:n] = state[column]
+        ledger.size = n
+        ledger.values = {column: list(values) for column, values in state["values"].items()}
+        ledger._codes = {
+            column: {value: code for code, value in enumerate(values)} for column, values in ledger.values.items()
+        }
+        return ledger
+
+    def to_dataframe(self) -> pd.DataFrame:
+        n = self.size
+        data = {"date": np.asarray(pd.DatetimeIndex(self.date[:n]).strftime(self.DATE_FORMAT), dtype=object)}
+        for column in self.CODE_COLUMNS:
+            data[column] = np.array(self.values[column], dtype=object)[getattr(self, column)[:n]]
+        for column in self.FLOAT_COLUMNS:
+            data[column] = getattr(self, column)[:n]
+        return pd.DataFrame(data, columns=self.COLUMNS)
+
+
 class StockEntity:
     TRADE_COLUMNS = [
         "date",
@@ -39,8 +129,59 @@ class StockEntity:
 
     def __init__(self, symbol: str):
         self.symbol = symbol
-        self.trades = self._initialize_dataframe(self.TRADE_COLUMNS)
-        self.holding_records = self._initialize_dataframe(self.HOLDING_RECORDS_COLUMNS)
+        self.trade_ledger = TradeLedger()
+        self._trades = None
+        # Net position (long quantity - short quantity), updated on every trade
+        self.position = 0.0
+        self.initialize_holding_records(0)
+
+    def initialize_holding_records(self, size: int):
+        """
+        Preallocate the holding record arrays, size should be the number of bars in the backtest
+
+        :param size:
+        :return:
+        """
+        self.holding_records_size = 0
+        self.holding_dates = np.empty(size, dtype="datetime64[ns]")
+        self.holding_adjusted_close = np.empty(size, dtype=np.float64)
+        self.holding_quantity = np.empty(size, dtype=np.float64)
+        self._holding_records = None
+
+    def to_state(self) -> dict:
+        """
+        Position, trades and holding records of the stock, e.g. to checkpoint a backtest, see from_state
+
+        :return:
+        """
+        n = self.holding_records_size
+        return {
+            "symbol": self.symbol,
+            "position": self.position,
+            "trade_ledger": self.trade_ledger.to_state(),
+            "holding_dates": self.holding_dates[:n],
+            "holding_adjusted_close": self.holding_adjusted_close[:n],
+            "holding_quantity": self.holding_quantity[:n],
+        }
+
+    @classmethod
+    def from_state(cls, state: dict, size: int = 0) -> "StockEntity":
+        """
+        Rebuild a stock entity from to_state
+
+        :param state:
+        :param size: number of holding records to preallocate, at least the number of records in the state
+        :return:
+        """
+        stock_entity = cls(symbol=state["symbol"])
+        stock_entity.position = state["position"]
+        stock_entity.trade_ledger = TradeLedger.from_state(state["trade_ledger"])
+        n = len(state["holding_quantity"])
+        stock_entity.initialize_holding_records(max(size, n))
+        for name in ["holding_dates", "holding_adjusted_close", "holding_quantity"]:
+            getattr(stock_entity, name)[:n] = state[name]
+        stock_entity.holding_records_size = n
+        return stock_entity
 
     @staticmethod
     def _initialize_dataframe(columns: List[str]) -> pd.DataFrame:
@@ -62,20 +203,23 @@ class StockEntity:
         else:
             return (entry_quantity * entry_price) - (exit_quantity * exit_price) - entry_fees - exit_fees
 
+    @staticmethod
+    def limit_price_reached(action: str, limit_price: float, high_price: float, low_price: float) -> bool:
+        if action == constants.TRADE_ACTION_BUY:
+            return high_price >= limit_price >= low_price
+        elif action == constants.TRADE_ACTION_SELL:
+            return low_price <= limit_price <= high_price
+        return False
+
     def limit_order(
         self,
         trade: Trade,
         high_price: float,
         low_price: float,
     ) -> Tuple[bool, str]:
-        if trade.action == constants.TRADE_ACTION_BUY:
-            if high_price >= trade.limit_price >= low_price:
-                self.update_trades(trade)
-                return True, ""
-        elif trade.action == constants.TRADE_ACTION_SELL:
-            if low_price <= trade.limit_price <= high_price:
-                self.update_trades(trade)
-                return True, ""
+        if self.limit_price_reached(trade.action, trade.limit_price, high_price, low_price):
+            self.update_trades(trade)
+            return True, ""
 
         return False, "Ask/Bid price is not met"
 
@@ -83,53 +227,122 @@ class StockEntity:
         self.update_trades(trade)
         return True, ""
 
+    @property
+    def trades(self) -> pd.DataFrame:
+        """
+        Trades DataFrame, built from the trade ledger on first access
+
+        :return:
+        """
+        if self._trades is None:
+            if len(self.trade_ledger) == 0:
+                self._trades = self._initialize_dataframe(self.TRADE_COLUMNS)
+            else:
+                self._trades = self.trade_ledger.to_dataframe()
+        return self._trades
+
     def update_trades(self, trade: Trade):
-        # No open position, add new row to add new trade
-        if self.trades.empty:
-            self.trades = pd.DataFrame([trade.__dict__])
-        else:
-            new_trade = pd.DataFrame([trade.__dict__]).dropna(axis=1)
-            self.trades = pd.concat([self.trades, new_trade], ignore_index=True)
+        self.trade_ledger.append(trade)
+        self._trades = None
+
+        if trade.action == constants.TRADE_ACTION_BUY:
+            self.position += trade.quantity
+        elif trade.action == constants.TRADE_ACTION_SELL:
+            self.position -= trade.quantity
+
+    def update_trade_costs(self, index: int, price: float, fees: float):
+        """
+        Set the filled price and fees of a recorded trade once the costs of the fill are known
+
+        :param index: position of the trade in the trade ledger
+        :param price:
+        :param fees:
+        :return:
+        """
+        self.trade_ledger.limit_price[index] = price
+        self.trade_ledger.fees[index] = fees
+        self._trades = None
 
     def update_holding_records(self, timestamp, price):
-        long_positions = self.trades[self.trades["action"] == constants.TRADE_ACTION_BUY]
-        short_positions = self.trades[self.trades["action"] == constants.TRADE_ACTION_SELL]
-        long_position_quantity = long_positions["quantity"].sum()
-        short_position_quantity = short_positions["quantity"].sum()
-        net_position = long_position_quantity - short_position_quantity
-
-        holding_records = HoldingRecords(
-            date=timestamp,
-            adjusted_close=price,
-            quantity=net_position,
-            portfolio_value=net_position * price,
-        )
+        if self.holding_records_size == len(self.holding_quantity):
+            self._grow_holding_records()
 
-        new_record = pd.DataFrame([holding_records.__dict__]).dropna(axis=1)
-        new_record["date"] = pd.to_datetime(new_record["date"])
-        new_record = new_record.set_index("date")
+        i = self.holding_records_size
+        self.holding_dates[i] = pd.Timestamp(timestamp).to_datetime64()
+        self.holding_adjusted_close[i] = price
+        self.holding_quantity[i] = self.position
+        self.holding_records_size += 1
+        self._holding_records = None
 
-        if self.holding_records.empty:
-            self.holding_records = new_record
-        else:
-            self.holding_records = pd.concat([self.holding_records, new_record])
+    def update_holding_records_range(self, timestamps: np.ndarray, prices: np.ndarray):
+        """
+        Append the holding records of several bars without any trade in between, the position is unchanged
+
+        :param timestamps: datetime64 array
+        :param prices: adjusted close of every bar
+        :return:
+        """
+        while self.holding_records_size + len(timestamps) > len(self.holding_quantity):
+            self._grow_holding_records()
+
+        i = self.holding_records_size
+        j = i + len(timestamps)
+        self.holding_dates[i:j] = timestamps
+        self.holding_adjusted_close[i:j] = prices
+        self.holding_quantity[i:j] = self.position
+        self.holding_records_size = j
+        self._holding_records = None
+
+    def _grow_holding_records(self):
+        size = max(2 * len(self.holding_quantity), 1)
+        for name in ["holding_dates", "holding_adjusted_close", "holding_quantity"]:
+            old = getattr(self, name)
+            new = np.empty(size, dtype=old.dtype)
+            new[: len(old)] = old
+            setattr(self, name, new)
+
+    @property
+    def holding_records(self) -> pd.DataFrame:
+        """
+        Holding records DataFrame indexed by date, built from the holding record arrays on first access
+
+        :return:
+        """
+        if self._holding_records is None:
+            self._holding_records = self._build_holding_records()
+        return self._holding_records
+
+    def _build_holding_records(self) -> pd.DataFrame:
+        n = self.holding_records_size
+        if n == 0:
+            return self._initialize_dataframe(self.HOLDING_RECORDS_COLUMNS)
+
+        quantity = self.holding_quantity[:n]
+        portfolio_value = quantity * self.holding_adjusted_close[:n]
+        holding_records = pd.DataFrame(
+            {
+                "adjusted_close": self.holding_adjusted_close[:n],
+                "quantity": quantity,
+                "portfolio_value": portfolio_value,
+            },
+            index=pd.DatetimeIndex(self.holding_dates[:n], name="date"),
+        )
 
         # Calculate daily returns
         """
         Does it make sense to track daily returns using close price? what if the po
         """
         # TODO: check how to calculate for short positions
-        self.holding_records["daily_returns"] = self.holding_records["portfolio_value"].pct_change().fillna(0)
+        daily_returns = holding_records["portfolio_value"].pct_change().fillna(0)
 
         # Correct daily returns where the previous day's portfolio value was zero
-        previous_portfolio_value = self.holding_records["portfolio_value"].shift(1)
-        self.holding_records.loc[previous_portfolio_value == 0, "daily_returns"] = 0
+        previous_portfolio_value = holding_records["portfolio_value"].shift(1)
+        daily_returns[previous_portfolio_value == 0] = 0
 
         # Adjust returns for short positions
-        short_return_indices = self.holding_records["quantity"] < 0
-        self.holding_records.loc[short_return_indices, "daily_returns"] *= -1
+        daily_returns[quantity < 0] *= -1
 
         # Format the daily returns to avoid negative zero
-        self.holding_records["daily_returns"] = self.holding_records["daily_returns"].apply(
-            lambda x: 0 if x == -0 else x
-        )
+        holding_records["daily_returns"] = daily_returns + 0.0
+
+        return holding_records
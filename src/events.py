@@ -0,0 +1,195 @@
+import typing
+from dataclasses import dataclass
+from typing import Callable, List, Union
+
+import numpy as np
+import pandas as pd
+
+from src import constants
+
+if typing.TYPE_CHECKING:
+    from src.backtest_engine import BacktestEngine
+
+ORDER_STATUS_EVENTS = {
+    constants.ORDER_STATUS_PENDING: constants.EVENT_ORDER_ACTIVATED,
+    constants.ORDER_STATUS_FILLED: constants.EVENT_ORDER_FILLED,
+    constants.ORDER_STATUS_EXPIRED: constants.EVENT_ORDER_EXPIRED,
+    constants.ORDER_STATUS_CANCELLED: constants.EVENT_ORDER_CANCELLED,
+}
+
+
+@dataclass
+class OrderEvent:
+    kind: str
+    timestamp: pd.Timestamp
+    # Row of the order in the order book, orders created during the run (e.g. by a triggered stop) are appended
+    row: int
+    order_id: object
+    ticker: str
+    order_type: str
+    action: str
+    quantity: float
+    # Filled price for filled orders, limit price otherwise
+    price: float
+    comments: str
+
+
+@dataclass
+class PositionEvent:
+    timestamp: pd.Timestamp
+    ticker: str
+    quantity: float
+    price: float
+    market_value: float
+    kind: str = constants.EVENT_POSITION_CHANGED
+
+
+@dataclass
+class NavEvent:
+    timestamp: pd.Timestamp
+    nav: float
+    capital: float
+    fees: float
+    # Drop of the NAV from its running maximum
+    drawdown: float
+    kind: str = constants.EVENT_NAV_SNAPSHOT
+
+
+Event = Union[OrderEvent, PositionEvent, NavEvent]
+
+
+class EventStream:
+    """
+    Order, position and NAV events of a backtest published to subscribers while it runs
+
+    The engine publishes the events of every processed bar once its fills are settled: the orders activated,
+    triggered, filled, expired or cancelled, the positions changed by the fills and a NAV snapshot of every recorded
+    bar. Events are buffered and handed to the subscribers in batches of batch_size, and when the run ends. Setting
+    max_drawdown stops the backtest after the first bar whose NAV drops that far from its running maximum.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 1000,
+        nav_every: int = 1,
+        max_drawdown: float = None,
+        subscribers: List[Callable[[List[Event]], None]] = None,
+    ):
+        """
+        :param batch_size: number of events buffered before they are handed to the subscribers
+        :param nav_every: publish the NAV snapshot of one recorded bar out of nav_every, the drawdown is checked on all
+        :param max_drawdown: stop the backtest once the drawdown reaches it, e.g. 0.2 for a 20% drop
+        :param subscribers: called with every batch of events
+        """
+        self.batch_size = batch_size
+        self.nav_every = nav_every
+        self.max_drawdown = max_drawdown
+        self.subscribers = list(subscribers or [])
+        self.buffer: List[Event] = []
+        self.stopped = False
+        self.peak = -np.inf
+        self.drawdown = 0.0
+        self.snapshots = 0
+        # Position of every ticker of the current market data, updated with the fills, see start_bars
+        self.positions = None
+
+    def subscribe(self, subscriber: Callable[[List[Event]], None]):
+        self.subscribers.append(subscriber)
+
+    def unsubscribe(self, subscriber: Callable[[List[Event]], None]):
+        self.subscribers.remove(subscriber)
+
+    def stop(self):
+        """Stop the backtest after the bar being processed"""
+        self.stopped = True
+
+    def flush(self):
+        if self.buffer:
+            batch = self.buffer
+            self.buffer = []
+            for subscriber in self.subscribers:
+                subscriber(batch)
+
+    def start_bars(self, backtest_engine: "BacktestEngine"):
+        """
+        Take the positions of the tickers of the current market data before its bars are processed, the position
+        events are published when the fills of a bar change them
+
+        :param backtest_engine:
+        :return:
+        """
+        stocks = backtest_engine.stocks
+        self.positions = np.array(
+            [stocks[ticker].position if ticker in stocks else 0.0 for ticker in backtest_engine.market_data.tickers]
+        )
+
+    def publish_bars(self, backtest_engine: "BacktestEngine", bar: int, end: int):
+        """
+        Publish the events of a processed bar and the NAV snapshots of the bars recorded up to end (exclusive)
+
+        :param backtest_engine:
+        :param bar:
+        :param end:
+        :return:
+        """
+        book = backtest_engine.book
+        market_data = backtest_engine.market_data
+        stocks = backtest_engine.stocks
+        events = self.buffer
+        timestamp = market_data.index[bar]
+        filled_tickers = set()
+        for row, status in book.drain_changes():
+            kind = ORDER_STATUS_EVENTS[status]
+            filled = status == constants.ORDER_STATUS_FILLED
+            if filled and book.order_type[row] in constants.STOP_LOST_TRIGGERS:
+                kind = constants.EVENT_ORDER_TRIGGERED
+                filled = False
+            elif filled:
+                filled_tickers.add(book.ticker[row])
+            events.append(
+                OrderEvent(
+                    kind=kind,
+                    timestamp=timestamp,
+                    row=row,
+                    order_id=book.order_id[row],
+                    ticker=book.ticker[row],
+                    order_type=book.order_type[row],
+                    action=book.action[row],
+                    quantity=book.quantity[row],
+                    price=book.filled_price[row] if filled else book.limit_price[row],
+                    comments=book.comments[row],
+                )
+            )
+
+        for ticker in filled_tickers:
+            column = market_data.columns[ticker]
+            position = stocks[ticker].position
+            if position != self.positions[column]:
+                self.positions[column] = position
+                price = market_data.adj_close[bar, column]
+                events.append(PositionEvent(timestamp, ticker, position, price, position * price))
+
+        bars = slice(bar, end)
+        prices = np.nan_to_num(market_data.adj_close[bars])
+        if len(prices):
+            capital = backtest_engine.current_capital
+            nav = prices @ self.positions + capital
+            peak = np.maximum.accumulate(np.maximum(nav, self.peak))
+            drawdown = nav / peak - 1
+            self.peak = peak[-1]
+            self.drawdown = drawdown[-1]
+            breached = self.max_drawdown is not None and drawdown.min() <= -self.max_drawdown
+            publish = (self.snapshots + np.arange(len(nav))) % self.nav_every == 0
+            if breached:
+                # Stop on the first bar past the threshold, it is the last NAV snapshot
+                last = np.argmax(drawdown <= -self.max_drawdown)
+                publish[last] = True
+                publish[last + 1 :] = False
+                self.stopped = True
+            timestamps = market_data.index[bars]
+            for i in np.flatnonzero(publish):
+                events.append(NavEvent(timestamps[i], float(nav[i]), capital, backtest_engine.fees, float(drawdown[i])))
+            self.snapshots += len(nav)
+
+        if len(events) >= self.batch_size:
+            self.flush()
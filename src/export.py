@@ -0,0 +1,199 @@
+import os
+import typing
+from typing import Dict, List
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+from src import constants
+from src.order_book import NAT
+
+if typing.TYPE_CHECKING:
+    from src.backtest_engine import BacktestEngine
+
+# Tables of an exported backtest, all but the portfolio table are partitioned by run id and ticker
+RESULT_TABLES = ["orders", "trades", "holdings", "portfolio"]
+
+# File format of every table: Parquet files or Arrow IPC (Feather V2) files
+EXPORT_FORMATS = {"parquet": "parquet", "arrow": "feather"}
+
+ORDER_CODED_COLUMNS = {
+    "order_type": constants.ORDER_TYPE_CODES,
+    "action": constants.TRADE_ACTION_CODES,
+    "time_in_force": constants.TIME_IN_FORCE_CODES,
+    "trail_type": constants.TRAIL_TYPE_CODES,
+    "status": constants.ORDER_STATUS_CODES,
+}
+
+
+def _timestamps(values: np.ndarray) -> pa.Array:
+    """int64 nanoseconds or datetime64 array as an Arrow timestamp array, NaT as null"""
+    values = values.view(np.int64)
+    return pa.array(values.view("datetime64[ns]"), type=pa.timestamp("ns"), mask=values == NAT)
+
+
+def _floats(values: np.ndarray, nan_as_null: bool = False) -> pa.Array:
+    return pa.array(values, type=pa.float64(), mask=np.isnan(values) if nan_as_null else None)
+
+
+def _coded(codes: np.ndarray, values: Dict[str, int]) -> pa.DictionaryArray:
+    """Codes of an enumerated column as a dictionary array of its values, code 0 (unknown) as null"""
+    dictionary = [""] + sorted(values, key=values.get)
+    return pa.DictionaryArray.from_arrays(pa.array(codes, mask=codes == 0), pa.array(dictionary, type=pa.string()))
+
+
+def _dictionary(indices: np.ndarray, values: List[str]) -> pa.DictionaryArray:
+    return pa.DictionaryArray.from_arrays(pa.array(indices), pa.array(values, type=pa.string()))
+
+
+def orders_table(backtest_engine: "BacktestEngine") -> pa.Table:
+    """
+    Order book of a backtest read from the columnar order book
+
+    Enumerated columns are dictionary encoded from the code arrays, the numeric and date arrays are handed to Arrow
+    without going through a DataFrame. filled_date and filled_price are null for orders that were not filled.
+
+    :param backtest_engine:
+    :return:
+    """
+    book = backtest_engine.book
+    n = book.size
+    columns = {
+        "order_id": pa.array(book.order_id[:n], from_pandas=True),
+        "attached_order": pa.array(book.attached_order[:n]),
+        "order_date": _timestamps(book.order_date[:n]),
+        "ticker": _dictionary(book.ticker_column[:n], backtest_engine.market_data.tickers),
+    }
+    for column in ["order_type", "action"]:
+        columns[column] = _coded(getattr(book, f"{column}_code")[:n], ORDER_CODED_COLUMNS[column])
+    for column in ["limit_price", "limit_offset", "stop_price", "quantity", "trail"]:
+        columns[column] = _floats(getattr(book, column)[:n])
+    for column in ["trail_type", "time_in_force", "status"]:
+        columns[column] = _coded(getattr(book, f"{column}_code")[:n], ORDER_CODED_COLUMNS[column])
+    columns["oco_group"] = pa.array(book.oco_group[:n], type=pa.string(), from_pandas=True)
+    columns["comments"] = pa.array(book.comments[:n], type=pa.string(), from_pandas=True)
+    columns["filled_date"] = _timestamps(book.filled_date[:n])
+    columns["filled_price"] = _floats(book.filled_price[:n], nan_as_null=True)
+    return pa.table(columns)
+
+
+def trades_table(stock_entity) -> pa.Table:
+    """
+    Trades of a stock read from its trade ledger, the string columns are dictionary encoded from the ledger codes
+
+    :param stock_entity:
+    :return:
+    """
+    ledger = stock_entity.trade_ledger
+    n = ledger.size
+    columns = {"date": _timestamps(ledger.date[:n])}
+    for column in ledger.CODE_COLUMNS:
+        columns[column] = _dictionary(getattr(ledger, column)[:n], ledger.values[column])
+    for column in ledger.FLOAT_COLUMNS:
+        columns[column] = _floats(getattr(ledger, column)[:n])
+    return pa.table(columns)
+
+
+def holdings_table(stock_entity) -> pa.Table:
+    """
+    Holding records of a stock read from its record arrays
+
+    :param stock_entity:
+    :return:
+    """
+    n = stock_entity.holding_records_size
+    quantity = stock_entity.holding_quantity[:n]
+    adjusted_close = stock_entity.holding_adjusted_close[:n]
+    return pa.table(
+        {
+            "date": _timestamps(stock_entity.holding_dates[:n]),
+            "adjusted_close": _floats(adjusted_close),
+            "quantity": _floats(quantity),
+            "portfolio_value": _floats(quantity * adjusted_close),
+        }
+    )
+
+
+def portfolio_table(backtest_engine: "BacktestEngine") -> pa.Table:
+    """
+    Portfolio columns of the combined holding records: capital, fees, NAV and returns of every record
+
+    :param backtest_engine:
+    :return:
+    """
+    analytics = backtest_engine.analytics
+    return pa.table(
+        {
+            "date": _timestamps(analytics.dates),
+            "capital": _floats(analytics.capital),
+            "total_fees": _floats(analytics.fees),
+            "portfolio_value": _floats(analytics.nav.to_numpy()),
+            "returns": _floats(analytics.returns.to_numpy(), nan_as_null=True),
+        }
+    )
+
+
+def _write(table: pa.Table, directory: str, export_format: str):
+    os.makedirs(directory, exist_ok=True)
+    if export_format == "parquet":
+        pq.write_table(table, os.path.join(directory, "part-0.parquet"))
+    else:
+        feather.write_feather(table, os.path.join(directory, "part-0.arrow"), compression="uncompressed")
+
+
+def export_results(backtest_engine: "BacktestEngine", base_dir: str, run_id="0", export_format: str = "parquet"):
+    """
+    Write the results of a finished backtest to a dataset partitioned by run id and ticker
+
+    Every table of RESULT_TABLES is written under base_dir/<table>/run_id=<run_id>/ticker=<ticker>/, the portfolio
+    table under base_dir/portfolio/run_id=<run_id>/. Runs exported to the same base_dir, e.g. the runs of a sweep,
+    form one dataset per table, see read_results. Exporting a run again replaces its files.
+
+    :param backtest_engine:
+    :param base_dir:
+    :param run_id:
+    :param export_format: parquet or arrow (IPC files)
+    :return:
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {export_format}, expected one of {list(EXPORT_FORMATS)}")
+
+    orders = orders_table(backtest_engine)
+    tickers = backtest_engine.book.ticker_column[: len(orders)]
+    # One sort of the rows by ticker, every partition is a zero-copy slice of the sorted table
+    order = np.argsort(tickers, kind="stable")
+    # The ticker of the partition files is read from their path
+    orders = orders.drop_columns(["ticker"]).take(pa.array(order))
+    bounds = np.searchsorted(tickers[order], np.arange(len(backtest_engine.market_data.tickers) + 1))
+
+    for column, ticker in enumerate(backtest_engine.market_data.tickers):
+        partition = f"run_id={run_id}/ticker={ticker}"
+        start, end = bounds[column], bounds[column + 1]
+        if end > start:
+            _write(orders.slice(start, end - start), os.path.join(base_dir, "orders", partition), export_format)
+        stock_entity = backtest_engine.stocks.get(ticker)
+        if stock_entity is not None:
+            _write(trades_table(stock_entity), os.path.join(base_dir, "trades", partition), export_format)
+            _write(holdings_table(stock_entity), os.path.join(base_dir, "holdings", partition), export_format)
+
+    _write(portfolio_table(backtest_engine), os.path.join(base_dir, "portfolio", f"run_id={run_id}"), export_format)
+
+
+def read_results(base_dir: str, table: str, export_format: str = "parquet") -> ds.Dataset:
+    """
+    Dataset of one table of every run exported to base_dir, scanned in one pass e.g. with to_table(filter=...)
+
+    :param base_dir:
+    :param table: one of RESULT_TABLES
+    :param export_format: parquet or arrow
+    :return: dataset with run_id and ticker partition columns
+    """
+    if table not in RESULT_TABLES:
+        raise ValueError(f"Unknown table {table}, expected one of {RESULT_TABLES}")
+    partitioning = ds.HivePartitioning.discover(infer_dictionary=True)
+    return ds.dataset(
+        os.path.join(base_dir, table), format=EXPORT_FORMATS[export_format], partitioning=partitioning
+    )
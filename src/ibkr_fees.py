@@ -1,5 +1,14 @@
+from bisect import bisect_right
+
 import numpy as np
 
+# IBKR tiered commission per share, by cumulative monthly share volume: volume below 300,000 shares is charged
+# 0.0035 per share, from 300,000 to 3,000,000 shares 0.002 per share, etc.
+TIER_VOLUMES = np.array([0, 300000, 3000000, 20000000, 100000000], dtype=np.float64)
+TIER_RATES = np.array([0.0035, 0.002, 0.0015, 0.001, 0.0005])
+# Commission of the monthly volume up to the start of every tier
+TIER_COSTS = np.concatenate([[0.0], np.cumsum(np.diff(TIER_VOLUMES) * TIER_RATES[:-1])])
+
 
 def calculate_ibkr_fixed_cost(qty, price_per_share):
     """Returns the fixed cost of IBKR for a given quantity and price per share."""
@@ -17,32 +26,19 @@ def calculate_ibkr_fixed_cost(qty, price_per_share):
     return final_fees
 
 
+def _tiered_commission(current_month_vol, qty):
+    """Tiered commission before the minimum / maximum of qty shares traded after current_month_vol shares"""
+    return _cumulative_tiered_commission(current_month_vol + qty) - _cumulative_tiered_commission(current_month_vol)
+
+
+def _cumulative_tiered_commission(volume):
+    tier = bisect_right(TIER_VOLUMES, volume) - 1
+    return TIER_COSTS[tier] + (volume - TIER_VOLUMES[tier]) * TIER_RATES[tier]
+
+
 def calculate_ibkr_tiered_cost(current_month_vol, qty, price):
     """Returns the tiered cost of IBKR for a given quantity, price, and current month volume."""
-    price_dict = {
-        300000: 0.0035,
-        3000000: 0.002,
-        20000000: 0.0015,
-        100000000: 0.001,
-        np.inf: 0.0005,
-    }
-
-    cost = 0
-    remaining_qty = qty
-    while remaining_qty > 0:
-        for key, value in price_dict.items():
-            if current_month_vol < key:
-                cost_per_share = value
-                if current_month_vol + remaining_qty <= key:
-                    cost += remaining_qty * cost_per_share
-                    remaining_qty = 0
-                    break
-
-                remaining_vol_in_tier = key - current_month_vol
-                remaining_qty -= remaining_vol_in_tier
-                cost += remaining_vol_in_tier * cost_per_share
-                current_month_vol += remaining_vol_in_tier
-                break
+    cost = float(_tiered_commission(current_month_vol, qty)) if qty > 0 else 0
 
     cost = max(0.35, min(cost, price * qty * 0.01))
 
@@ -76,3 +72,75 @@ def calculate_ibkr_tiered_cost(current_month_vol, qty, price):
     )
 
     return total_fees
+
+
+def calculate_ibkr_fixed_costs(qty: np.ndarray, price_per_share: np.ndarray) -> np.ndarray:
+    """Vectorized calculate_ibkr_fixed_cost, returns the fixed cost of every (quantity, price) pair."""
+    qty = np.asarray(qty, dtype=np.float64)
+    price_per_share = np.asarray(price_per_share, dtype=np.float64)
+
+    fixed_cost = np.maximum(1, np.minimum(qty * 0.005, price_per_share * qty * 0.01))
+
+    # Regulatory Fees
+    sec_transaction_fee = 0.0000278 * price_per_share * qty
+    finra_trading_activity_fee = np.minimum(0.000166 * qty, 8.30)
+
+    return fixed_cost + sec_transaction_fee + finra_trading_activity_fee
+
+
+def calculate_ibkr_tiered_costs(current_month_vol: np.ndarray, qty: np.ndarray, price: np.ndarray) -> np.ndarray:
+    """Vectorized calculate_ibkr_tiered_cost, current_month_vol is the monthly volume before every fill."""
+    current_month_vol = np.asarray(current_month_vol, dtype=np.float64)
+    qty = np.asarray(qty, dtype=np.float64)
+    price = np.asarray(price, dtype=np.float64)
+
+    def cumulative_commission(volume):
+        tier = np.searchsorted(TIER_VOLUMES, volume, side="right") - 1
+        return TIER_COSTS[tier] + (volume - TIER_VOLUMES[tier]) * TIER_RATES[tier]
+
+    commission = cumulative_commission(current_month_vol + qty) - cumulative_commission(current_month_vol)
+    cost = np.where(qty > 0, commission, 0)
+    cost = np.maximum(0.35, np.minimum(cost, price * qty * 0.01))
+
+    # Regulatory Fees
+    sec_transaction_fee = 0.0000278 * price * qty
+    finra_trading_activity_fee = 0.000166 * qty
+
+    # Exchange Fees
+    exchange_fees = 0.003 * qty
+
+    # Clearing Fees
+    clearing_fees = np.minimum(0.00020 * qty, qty * price * 0.005)
+
+    # Pass Through Fees
+    pass_through_base = sec_transaction_fee + finra_trading_activity_fee + exchange_fees + clearing_fees
+    nyse_pass_through_fees = pass_through_base * 0.000175
+    finra_pass_through_fees = np.minimum(pass_through_base * 0.000565, 8.30)
+
+    return (
+        sec_transaction_fee
+        + finra_trading_activity_fee
+        + exchange_fees
+        + clearing_fees
+        + nyse_pass_through_fees
+        + finra_pass_through_fees
+        + cost
+    )
+
+
+def monthly_volume_before(dates: np.ndarray, qty: np.ndarray) -> np.ndarray:
+    """
+    Share volume traded earlier in the same calendar month before every fill, for calculate_ibkr_tiered_costs
+
+    :param dates: datetime64 fill dates in execution order
+    :param qty: quantity of every fill
+    :return:
+    """
+    qty = np.asarray(qty, dtype=np.float64)
+    months = np.asarray(dates, dtype="datetime64[M]")
+    cumulative = np.cumsum(qty) - qty
+    # Subtract the cumulative volume at the first fill of every month
+    new_month = np.ones(len(months), dtype=bool)
+    new_month[1:] = months[1:] != months[:-1]
+    month_start = np.maximum.accumulate(np.where(new_month, np.arange(len(months)), 0))
+    return cumulative - cumulative[month_start]
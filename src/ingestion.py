@@ -0,0 +1,148 @@
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from src import constants
+
+# Columns of an order book and their dtypes, enumerated columns are validated against the constants
+ORDER_BOOK_SCHEMA = {
+    "order_id": object,
+    "attached_order": bool,
+    "order_date": "datetime64[ns]",
+    "ticker": object,
+    "order_type": object,
+    "action": object,
+    "limit_price": np.float64,
+    "limit_offset": np.float64,
+    "stop_price": np.float64,
+    "quantity": np.float64,
+    "trail_type": object,
+    "trail": np.float64,
+    "time_in_force": object,
+    "oco_group": object,
+}
+
+REQUIRED_COLUMNS = ["order_id", "attached_order", "ticker", "order_type", "action", "quantity", "time_in_force"]
+
+ENUMERATED_COLUMNS = {
+    "order_type": constants.ORDER_TYPE_CODES,
+    "action": constants.TRADE_ACTION_CODES,
+    "time_in_force": constants.TIME_IN_FORCE_CODES,
+}
+
+# Values of the optional columns when they are missing, the trail type is only read for trailing orders
+DEFAULT_VALUES = {"limit_price": 0.0, "limit_offset": 0.0, "stop_price": 0.0, "trail": 0.0, "trail_type": "N.A."}
+
+# Rows listed in the error message of every problem
+MAX_REPORTED_ROWS = 5
+
+
+class OrderBookValidationError(ValueError):
+    """Raised when an order book does not follow ORDER_BOOK_SCHEMA, every problem found is listed in the message"""
+
+    def __init__(self, problems: List[str]):
+        self.problems = problems
+        super().__init__("Invalid order book:\n" + "\n".join(f"- {problem}" for problem in problems))
+
+
+def _describe(order_book: pd.DataFrame, invalid: np.ndarray, description: str, column: str = None) -> str:
+    rows = order_book.index[invalid]
+    problem = f"{len(rows)} orders {description}, e.g. rows {list(rows[:MAX_REPORTED_ROWS])}"
+    if column is not None:
+        problem += f": {list(pd.unique(order_book.loc[invalid, column])[:MAX_REPORTED_ROWS])}"
+    return problem
+
+
+def validate_order_book(order_book: pd.DataFrame):
+    """
+    Check an order book before the backtest starts, raise an OrderBookValidationError listing every problem found
+
+    1. The required columns are present
+    2. order_type, action and time_in_force only hold known values, see constants
+    3. Trailing stop orders have a known trail_type and a trail
+    4. Every attached order has an unattached parent order with the same order_id
+    5. Quantities are positive and unattached orders have an order_date
+
+    :param order_book:
+    :return:
+    """
+    missing_columns = [column for column in REQUIRED_COLUMNS if column not in order_book.columns]
+    if missing_columns:
+        raise OrderBookValidationError([f"missing columns {missing_columns}"])
+
+    problems = []
+    for column, codes in ENUMERATED_COLUMNS.items():
+        invalid = ~order_book[column].isin(list(codes)).to_numpy()
+        if invalid.any():
+            problems.append(_describe(order_book, invalid, f"with an unknown {column}", column))
+
+    attached = order_book["attached_order"].fillna(False).to_numpy(dtype=bool)
+    trailing = order_book["order_type"].isin([constants.TRAILING_STOP_ORDER, constants.TRAILING_STOP_LIMIT_ORDER])
+    trailing = trailing.to_numpy()
+    if trailing.any():
+        missing = pd.Series(np.nan, index=order_book.index)
+        invalid = trailing & ~order_book.get("trail_type", missing).isin(list(constants.TRAIL_TYPE_CODES)).to_numpy()
+        if invalid.any():
+            problems.append(_describe(order_book, invalid, "trailing stop orders with an unknown trail_type"))
+        invalid = trailing & pd.to_numeric(order_book.get("trail", missing), errors="coerce").isna().to_numpy()
+        if invalid.any():
+            problems.append(_describe(order_book, invalid, "trailing stop orders without a trail"))
+
+    parents = set(order_book["order_id"][~attached])
+    invalid = attached & ~order_book["order_id"].isin(parents).to_numpy()
+    if invalid.any():
+        problems.append(_describe(order_book, invalid, "attached to an order_id without an unattached order"))
+
+    quantity = pd.to_numeric(order_book["quantity"], errors="coerce").to_numpy(dtype=np.float64)
+    invalid = ~(quantity > 0)
+    if invalid.any():
+        problems.append(_describe(order_book, invalid, "without a positive quantity"))
+
+    if "order_date" in order_book:
+        invalid = ~attached & pd.to_datetime(order_book["order_date"], errors="coerce").isna().to_numpy()
+    else:
+        invalid = ~attached
+    if invalid.any():
+        problems.append(_describe(order_book, invalid, "unattached without an order_date"))
+
+    if problems:
+        raise OrderBookValidationError(problems)
+
+
+def read_order_book(path: str, validate: bool = True) -> pd.DataFrame:
+    """
+    Read an order book from a CSV or Parquet file with the dtypes of ORDER_BOOK_SCHEMA
+
+    The order book is validated before the missing optional values are filled with DEFAULT_VALUES, so that e.g. a
+    trailing stop order without a trail is reported rather than given a trail of 0.
+
+    :param path: .parquet file, CSV otherwise
+    :param validate: raise an OrderBookValidationError if the order book is invalid, see validate_order_book
+    :return:
+    """
+    if path.endswith(".parquet"):
+        order_book = pd.read_parquet(path)
+    else:
+        dtypes = {column: dtype for column, dtype in ORDER_BOOK_SCHEMA.items() if dtype in [object, np.float64]}
+        order_book = pd.read_csv(
+            path, dtype=dtypes, true_values=["TRUE", "True", "true"], false_values=["FALSE", "False", "false"]
+        )
+
+    for column, dtype in ORDER_BOOK_SCHEMA.items():
+        if column not in order_book.columns:
+            continue
+        if column == "order_date":
+            order_book[column] = pd.to_datetime(order_book[column])
+        elif column == "attached_order":
+            order_book[column] = order_book[column].fillna(False).astype(bool)
+        elif dtype == np.float64:
+            order_book[column] = pd.to_numeric(order_book[column], errors="coerce").astype(np.float64)
+
+    if validate:
+        validate_order_book(order_book)
+
+    for column, value in DEFAULT_VALUES.items():
+        if column in order_book.columns:
+            order_book[column] = order_book[column].fillna(value)
+    return order_book
@@ -0,0 +1,175 @@
+import json
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class _Phase:
+    __slots__ = ("profiler", "key", "start")
+
+    def __init__(self, profiler: "Profiler", key: Tuple[str, str]):
+        self.profiler = profiler
+        self.key = key
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler.record(self.key, self.start, time.perf_counter())
+
+
+class Profiler:
+    """
+    Opt-in timing instrumentation of a backtest, pass it to BacktestEngine(profiler=...)
+
+    Records the wall time and number of calls of every phase of the backtest, and the time spent on every processed
+    bar. Phase times include the time of the phases nested in them, e.g. the fill of an attached order includes the
+    capital update and the cancellation of the other attached orders. With trace=True every phase call is also kept
+    as an event and can be saved in the Chrome trace format (chrome://tracing or https://ui.perfetto.dev).
+    """
+
+    enabled = True
+
+    def __init__(self, trace: bool = False):
+        self.trace = trace
+        self.seconds: Dict[Tuple[str, str], float] = defaultdict(float)
+        self.calls: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.bars = []
+        self.bar_seconds = []
+        self.events = []
+        self._origin = time.perf_counter()
+
+    def phase(self, name: str, category: str = "backtest") -> _Phase:
+        """
+        Context manager timing one call of a phase
+
+        :param name: phase name, e.g. the order type for the fill phases
+        :param category: group of the phase, e.g. fill
+        :return:
+        """
+        return _Phase(self, (category, name))
+
+    def record(self, key: Tuple[str, str], start: float, end: float):
+        self.seconds[key] += end - start
+        self.calls[key] += 1
+        if self.trace:
+            self.events.append((key, start, end))
+
+    def record_bar(self, bar: int, seconds: float):
+        self.bars.append(bar)
+        self.bar_seconds.append(seconds)
+
+    def summary(self) -> pd.DataFrame:
+        """
+        Total time and number of calls of every phase, slowest first
+
+        :return: DataFrame indexed by (category, phase)
+        """
+        rows = [
+            {"category": key[0], "phase": key[1], "calls": self.calls[key], "seconds": self.seconds[key]}
+            for key in self.seconds
+        ]
+        summary = pd.DataFrame(rows, columns=["category", "phase", "calls", "seconds"])
+        summary["mean_seconds"] = summary["seconds"] / summary["calls"]
+        return summary.sort_values("seconds", ascending=False).set_index(["category", "phase"])
+
+    def bar_histogram(self, bins: int = 20) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Histogram of the time spent on every processed bar
+
+        :param bins: number of bins
+        :return: counts and bin edges in seconds, as returned by np.histogram
+        """
+        return np.histogram(np.asarray(self.bar_seconds), bins=bins)
+
+    def slowest_bars(self, n: int = 10) -> pd.Series:
+        """Time of the n slowest bars in seconds, indexed by bar"""
+        bar_seconds = pd.Series(self.bar_seconds, index=pd.Index(self.bars, name="bar"), name="seconds")
+        return bar_seconds.nlargest(n)
+
+    def to_dict(self) -> dict:
+        counts, edges = self.bar_histogram() if self.bar_seconds else (np.empty(0), np.empty(0))
+        return {
+            "phases": [
+                {"category": category, "phase": name, **row}
+                for (category, name), row in self.summary().to_dict(orient="index").items()
+            ],
+            "bars": {
+                "processed": len(self.bar_seconds),
+                "seconds": float(np.sum(self.bar_seconds)),
+                "histogram_counts": counts.tolist(),
+                "histogram_edges": edges.tolist(),
+            },
+        }
+
+    def dump(self, path: str):
+        """
+        Save the profile as a Chrome trace JSON file, the summary is stored under otherData
+
+        Trace events are only available when the profiler was created with trace=True.
+
+        :param path:
+        :return:
+        """
+        trace_events = [
+            {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": (start - self._origin) * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": 0,
+                "tid": 0,
+            }
+            for (category, name), start, end in self.events
+        ]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": trace_events, "otherData": self.to_dict()}, f)
+
+
+class NullProfiler:
+    """Profiler used when instrumentation is disabled, every method is a no-op"""
+
+    enabled = False
+
+    _phase = nullcontext()
+
+    def phase(self, name: str, category: str = "backtest"):
+        return self._phase
+
+    def record_bar(self, bar: int, seconds: float):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+class NullProgressBar:
+    """Progress bar used when progress is not shown, every method is a no-op so that tqdm is never imported"""
+
+    def update(self, n: int = 1):
+        pass
+
+    def close(self):
+        pass
+
+
+def progress_bar(total: int = None, enabled: bool = True):
+    """
+    tqdm progress bar, tqdm is imported on the first progress bar shown
+
+    :param total: number of steps, None if unknown
+    :param enabled: False returns a NullProgressBar
+    :return:
+    """
+    if not enabled:
+        return NullProgressBar()
+
+    from tqdm import tqdm
+
+    return tqdm(total=total)
@@ -0,0 +1,219 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Callable, List
+
+import numpy as np
+import pandas as pd
+
+from src.backtest_engine import BacktestEngine
+from src.events import Event, EventStream
+from src.instrumentation import progress_bar
+from src.market_data import MarketData
+
+
+@dataclass
+class Bar:
+    # OHLCV of the bar with (ticker, field) MultiIndex columns, several rows are processed as consecutive bars
+    prices: pd.DataFrame
+    # The last row is the last bar of its trading session, Day orders expire at the end of the session
+    closes_session: bool = True
+
+
+class BarSource:
+    """
+    Asynchronous source of bars, iterated with async for until the feed ends
+    """
+
+    def __aiter__(self) -> AsyncIterator[Bar]:
+        return self.bars()
+
+    def bars(self) -> AsyncIterator[Bar]:
+        raise NotImplementedError
+
+
+class FileReplaySource(BarSource):
+    """
+    Replay the bars of a local OHLCV file one at a time, e.g. to paper trade against recorded data
+    """
+
+    def __init__(self, path: str, interval: float = 0.0, session_start: str = "00:00:00"):
+        """
+        :param path: .parquet file, CSV otherwise, with (ticker, field) MultiIndex columns indexed by date
+        :param interval: seconds to wait between two bars
+        :param session_start: time of the day the sessions start at, used to flag the last bar of every session
+        """
+        self.path = path
+        self.interval = interval
+        self.session_start = pd.Timedelta(session_start).value
+
+    def read(self) -> pd.DataFrame:
+        if self.path.endswith(".parquet"):
+            return pd.read_parquet(self.path)
+        return pd.read_csv(self.path, header=[0, 1], index_col=0, parse_dates=True)
+
+    async def bars(self) -> AsyncIterator[Bar]:
+        ohlvc = self.read()
+        session = MarketData.session_of(pd.DatetimeIndex(ohlvc.index).asi8, self.session_start)
+        closes_session = np.append(session[1:] != session[:-1], True)
+        for i in range(len(ohlvc)):
+            if i and self.interval:
+                await asyncio.sleep(self.interval)
+            yield Bar(prices=ohlvc.iloc[i : i + 1], closes_session=bool(closes_session[i]))
+
+
+class InProcessFeed(BarSource):
+    """
+    Feed the bars are pushed to from the same process, e.g. by a market data handler or a test
+    """
+
+    def __init__(self, maxsize: int = 0):
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    async def put(self, prices: pd.DataFrame, closes_session: bool = True):
+        await self.queue.put(Bar(prices=prices, closes_session=closes_session))
+
+    async def close(self):
+        await self.queue.put(None)
+
+    async def bars(self) -> AsyncIterator[Bar]:
+        while True:
+            bar = await self.queue.get()
+            if bar is None:
+                return
+            yield bar
+
+
+class LiveEngine:
+    """
+    Process the bars of a BarSource as they arrive with the order semantics of a BacktestEngine
+
+    Every bar is processed as a chunk of the backtest, see BacktestEngine.start_chunk: the order book, positions,
+    capital and records are carried over, so replaying bars gives the same results as a backtest over them. The events
+    the event stream of the engine publishes for a bar (orders, positions and NAV, see events.EventStream) are emitted
+    once the bar is processed, and the processing time of every bar is recorded in latencies. The replay stops when
+    the event stream is stopped, e.g. on its drawdown threshold.
+    """
+
+    def __init__(
+        self,
+        backtest_engine: BacktestEngine,
+        source: BarSource,
+        on_event: Callable[[Event], Awaitable] = None,
+        queue: asyncio.Queue = None,
+        latency_budget: float = None,
+    ):
+        """
+        :param backtest_engine: engine built without market data, e.g. BacktestEngine(order_book, fill_mode="batched"),
+            its event stream is used if it has one, otherwise an EventStream with the default settings is attached
+        :param source:
+        :param on_event: coroutine function awaited with every event
+        :param queue: queue every event is put to
+        :param latency_budget: seconds a bar should be processed in, bars over budget are counted in latency_summary
+        """
+        if backtest_engine.event_stream is None:
+            backtest_engine.event_stream = EventStream()
+        # Events published while a bar is processed, the event stream is flushed at the end of every bar
+        self.pending: List[Event] = []
+        backtest_engine.event_stream.subscribe(self.pending.extend)
+        self.backtest_engine = backtest_engine
+        self.source = source
+        self.on_event = on_event
+        self.queue = queue
+        self.latency_budget = latency_budget
+        self.tickers = list(backtest_engine.order_book["ticker"].unique())
+        self.progress = progress_bar(enabled=False)
+        self.bars = 0
+        # Processing time of every bar, in seconds
+        self.latencies = []
+        # Columns of the last bar and position of every field of every ticker in them, see market_data
+        self.columns = None
+        self.field_positions = None
+
+    def market_data(self, prices: pd.DataFrame) -> MarketData:
+        """
+        Price matrices of a bar, the fields are picked by position while the columns of the feed do not change
+
+        Building them with MarketData.from_ohlvc selects the columns of every field by label, which costs far more
+        than processing the orders of a bar.
+
+        :param prices:
+        :return:
+        """
+        if self.columns is None or not prices.columns.equals(self.columns):
+            market_data = MarketData.from_ohlvc(prices, tickers=self.tickers)
+            self.columns = prices.columns
+            self.field_positions = {
+                field: self.columns.get_indexer(pd.MultiIndex.from_product([self.tickers, [field]]))
+                for field in market_data.fields
+            }
+            return market_data
+
+        values = prices.to_numpy(dtype=np.float64)
+        fields = {field: np.ascontiguousarray(values[:, positions]) for field, positions in self.field_positions.items()}
+        return MarketData(index=prices.index, tickers=self.tickers, fields=fields)
+
+    def process_bar(self, bar: Bar) -> List[Event]:
+        """
+        Process the orders against a bar and record the bar
+
+        :param bar:
+        :return: events published by the event stream for the bar
+        """
+        start = time.perf_counter()
+        backtest_engine = self.backtest_engine
+        market_data = self.market_data(bar.prices)
+        market_data.open_session = not bar.closes_session
+
+        backtest_engine.start_chunk(market_data, first=self.bars == 0, keep_records=True)
+        backtest_engine.run_bars(self.progress)
+        events = self.pending[:]
+        self.pending.clear()
+
+        self.bars += len(market_data)
+        self.latencies.append(time.perf_counter() - start)
+        return events
+
+    async def emit(self, event: Event):
+        if self.on_event is not None:
+            await self.on_event(event)
+        if self.queue is not None:
+            await self.queue.put(event)
+
+    async def run(self) -> BacktestEngine:
+        """
+        Process every bar of the source until the feed ends or the event stream is stopped, then rebuild the order
+        book DataFrame
+
+        :return: the backtest engine, with the records of every bar processed
+        """
+        async for bar in self.source:
+            for event in self.process_bar(bar):
+                await self.emit(event)
+            if self.backtest_engine.event_stream.stopped:
+                break
+        if self.bars:
+            self.backtest_engine.finish_backtest()
+        return self.backtest_engine
+
+    def latency_summary(self) -> pd.Series:
+        """
+        Statistics of the processing time of the bars, in seconds
+
+        :return: bars, mean, p50, p95, p99, max and the number of bars over latency_budget
+        """
+        latencies = np.asarray(self.latencies, dtype=np.float64)
+        if len(latencies) == 0:
+            return pd.Series({"bars": 0}, dtype=np.float64)
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        summary = {
+            "bars": len(latencies),
+            "mean": latencies.mean(),
+            "p50": p50,
+            "p95": p95,
+            "p99": p99,
+            "max": latencies.max(),
+        }
+        if self.latency_budget is not None:
+            summary["over_budget"] = int((latencies > self.latency_budget).sum())
+        return pd.Series(summary, dtype=np.float64)
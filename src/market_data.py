@@ -0,0 +1,249 @@
+import hashlib
+from multiprocessing import shared_memory
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class MarketData:
+    """
+    Dense OHLCV price matrices extracted once from the MultiIndex (ticker, field) OHLCV DataFrame
+
+    Every field is stored as a float64 array of shape (bars, tickers), tickers are mapped to their column with
+    the columns dictionary, e.g. market_data.high[bar, market_data.columns["AAPL"]]
+    """
+
+    FIELDS = ["Open", "High", "Low", "Close", "Adj Close", "Volume"]
+    REQUIRED_FIELDS = ["Open", "High", "Low", "Adj Close"]
+
+    # Number of bars summarised by one entry of the block maximum / minimum arrays used to search for triggers
+    BLOCK_SIZE = 64
+
+    NS_PER_DAY = 86_400_000_000_000
+
+    def __init__(self, index: pd.DatetimeIndex, tickers: List[str], fields: Dict[str, np.ndarray]):
+        self.index = index
+        self.tickers = list(tickers)
+        self.columns = {ticker: column for column, ticker in enumerate(self.tickers)}
+        self.fields = fields
+        self._block_high = None
+        self._block_low = None
+        self._sessions = {}
+        # The last session continues after the last bar, e.g. bars received from a live feed, so none of its bars is
+        # the last bar of the session
+        self.open_session = False
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def open(self) -> np.ndarray:
+        return self.fields["Open"]
+
+    @property
+    def high(self) -> np.ndarray:
+        return self.fields["High"]
+
+    @property
+    def low(self) -> np.ndarray:
+        return self.fields["Low"]
+
+    @property
+    def adj_close(self) -> np.ndarray:
+        return self.fields["Adj Close"]
+
+    @classmethod
+    def from_ohlvc(cls, ohlvc: pd.DataFrame, tickers: Iterable[str] = None) -> "MarketData":
+        """
+        Convert the MultiIndex OHLCV DataFrame into price matrices
+
+        Raises a ValueError if the DataFrame is not indexed by (ticker, field) columns, or if any of the tickers
+        is missing one of the required fields.
+
+        :param ohlvc: DataFrame with (ticker, field) MultiIndex columns
+        :param tickers: tickers to extract, defaults to every ticker in the DataFrame
+        :return:
+        """
+        if not isinstance(ohlvc.columns, pd.MultiIndex) or ohlvc.columns.nlevels != 2:
+            raise ValueError("OHLCV data must have (ticker, field) MultiIndex columns")
+
+        available_tickers = list(ohlvc.columns.get_level_values(0).unique())
+        tickers = available_tickers if tickers is None else list(tickers)
+
+        missing_tickers = [ticker for ticker in tickers if ticker not in available_tickers]
+        if missing_tickers:
+            raise ValueError(f"OHLCV data is missing tickers: {missing_tickers}")
+
+        missing_fields = {
+            ticker: [field for field in cls.REQUIRED_FIELDS if (ticker, field) not in ohlvc.columns]
+            for ticker in tickers
+        }
+        missing_fields = {ticker: fields for ticker, fields in missing_fields.items() if fields}
+        if missing_fields:
+            raise ValueError(f"OHLCV data is missing fields: {missing_fields}")
+
+        fields = {}
+        for field in cls.FIELDS:
+            if all((ticker, field) in ohlvc.columns for ticker in tickers):
+                columns = pd.MultiIndex.from_product([tickers, [field]])
+                fields[field] = np.ascontiguousarray(ohlvc[columns].to_numpy(dtype=np.float64))
+
+        return cls(index=ohlvc.index, tickers=tickers, fields=fields)
+
+    def validate_tickers(self, tickers: Iterable[str]):
+        """
+        Raise a ValueError if any of the tickers is not in the price matrices
+
+        :param tickers:
+        :return:
+        """
+        missing_tickers = [ticker for ticker in tickers if ticker not in self.columns]
+        if missing_tickers:
+            raise ValueError(f"OHLCV data is missing tickers: {missing_tickers}")
+
+        missing_fields = [field for field in self.REQUIRED_FIELDS if field not in self.fields]
+        if missing_fields:
+            raise ValueError(f"OHLCV data is missing fields: {missing_fields}")
+
+    def to_shared_memory(self) -> Tuple[shared_memory.SharedMemory, dict]:
+        """
+        Copy the price matrices into a single shared memory block
+
+        The returned spec is small and picklable, other processes rebuild the MarketData from it with
+        from_shared_memory without copying the prices. The caller owns the block and has to close and unlink it.
+
+        :return: shared memory block and spec
+        """
+        field_names = list(self.fields)
+        shape = (len(field_names), len(self), len(self.tickers))
+        block = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * 8, 1))
+        prices = np.ndarray(shape, dtype=np.float64, buffer=block.buf)
+        for i, field in enumerate(field_names):
+            prices[i] = self.fields[field]
+
+        spec = {
+            "name": block.name,
+            "shape": shape,
+            "fields": field_names,
+            "index": self.index,
+            "tickers": self.tickers,
+        }
+        return block, spec
+
+    @classmethod
+    def from_shared_memory(cls, spec: dict) -> Tuple["MarketData", shared_memory.SharedMemory]:
+        """
+        Attach to price matrices created by to_shared_memory
+
+        The block has to be kept alive for as long as the MarketData is used.
+
+        :param spec:
+        :return: market data and shared memory block
+        """
+        block = shared_memory.SharedMemory(name=spec["name"])
+        prices = np.ndarray(spec["shape"], dtype=np.float64, buffer=block.buf)
+        fields = {field: prices[i] for i, field in enumerate(spec["fields"])}
+        return cls(index=spec["index"], tickers=spec["tickers"], fields=fields), block
+
+    def fingerprint(self, end: int = None) -> str:
+        """
+        Hash of the tickers, dates and prices of the bars before end, equal for market data sharing that history
+
+        :param end: exclusive end bar, defaults to all the bars
+        :return:
+        """
+        bars = slice(0, len(self) if end is None else end)
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(repr(self.tickers).encode())
+        digest.update(np.ascontiguousarray(self.index.asi8[bars]).tobytes())
+        for field in sorted(self.fields):
+            digest.update(field.encode())
+            digest.update(np.ascontiguousarray(self.fields[field][bars]).tobytes())
+        return digest.hexdigest()
+
+    @classmethod
+    def session_of(cls, timestamp: int, session_start: int = 0) -> int:
+        """
+        Trading session of a timestamp: the number of days since the epoch of the last session start before it
+
+        :param timestamp: nanoseconds since the epoch, in the clock of the index (UTC for a timezone-aware index)
+        :param session_start: time of the day the sessions start at, in nanoseconds
+        :return:
+        """
+        return (timestamp - session_start) // cls.NS_PER_DAY
+
+    def sessions(self, session_start: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Trading session of every bar and last bar of the session of every bar
+
+        With daily bars every bar is a session of its own, with intraday bars a session groups the bars from one
+        session start to the next one, e.g. session_start of 18:00 for futures trading overnight.
+
+        :param session_start: time of the day the sessions start at, in nanoseconds
+        :return: session and session end arrays, one entry per bar, the session end of the bars of an open session
+            is one past the last bar
+        """
+        if session_start not in self._sessions:
+            session = self.session_of(self.index.asi8, session_start)
+            session_end = np.searchsorted(session, session, side="right") - 1
+            if self.open_session and len(session):
+                session_end[session == session[-1]] = len(session)
+            self._sessions[session_start] = (session, session_end)
+        return self._sessions[session_start]
+
+    def _block_extrema(self):
+        if self._block_high is None:
+            starts = np.arange(0, len(self), self.BLOCK_SIZE)
+            if len(starts) == 0:
+                self._block_high = np.empty((0, len(self.tickers)))
+                self._block_low = np.empty((0, len(self.tickers)))
+            else:
+                # fmax / fmin ignore missing prices, a block without any price never triggers
+                self._block_high = np.fmax.reduceat(self.high, starts, axis=0)
+                self._block_low = np.fmin.reduceat(self.low, starts, axis=0)
+        return self._block_high, self._block_low
+
+    def _first_bar(self, start: int, candidate_blocks: np.ndarray, hit) -> int:
+        """
+        Scan the candidate blocks from the block containing start and return the first bar where hit is True
+
+        :param start: first bar to search
+        :param candidate_blocks: blocks whose extrema allow a hit, one boolean per block
+        :param hit: function of (start, end) returning the boolean hit mask of bars start:end
+        :return: bar index, len(self) if there is no hit
+        """
+        n = len(self)
+        if start >= n:
+            return n
+
+        for block in np.flatnonzero(candidate_blocks[start // self.BLOCK_SIZE:]) + start // self.BLOCK_SIZE:
+            block_start = max(block * self.BLOCK_SIZE, start)
+            block_end = min((block + 1) * self.BLOCK_SIZE, n)
+            hits = np.flatnonzero(hit(block_start, block_end))
+            if len(hits) != 0:
+                return block_start + hits[0]
+        return n
+
+    def first_bar_high_at_or_above(self, column: int, price: float, start: int) -> int:
+        """First bar from start where the High is at or above the price, len(self) if there is none"""
+        block_high, _ = self._block_extrema()
+        high = self.high[:, column]
+        return self._first_bar(start, block_high[:, column] >= price, lambda s, e: high[s:e] >= price)
+
+    def first_bar_low_at_or_below(self, column: int, price: float, start: int) -> int:
+        """First bar from start where the Low is at or below the price, len(self) if there is none"""
+        _, block_low = self._block_extrema()
+        low = self.low[:, column]
+        return self._first_bar(start, block_low[:, column] <= price, lambda s, e: low[s:e] <= price)
+
+    def first_bar_in_range(self, column: int, price: float, start: int) -> int:
+        """First bar from start where the price is within the Low / High range, len(self) if there is none"""
+        block_high, block_low = self._block_extrema()
+        high = self.high[:, column]
+        low = self.low[:, column]
+        return self._first_bar(
+            start,
+            (block_low[:, column] <= price) & (price <= block_high[:, column]),
+            lambda s, e: (low[s:e] <= price) & (price <= high[s:e]),
+        )
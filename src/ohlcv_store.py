@@ -0,0 +1,220 @@
+import json
+import os
+from typing import Callable, Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.market_data import MarketData
+
+# Date range [start, end) requested from the data source
+Interval = Tuple[pd.Timestamp, pd.Timestamp]
+
+
+def download_yahoo(symbol: str, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+    """
+    Download the daily OHLCV data of one ticker from Yahoo Finance, end is exclusive
+
+    :param symbol:
+    :param start:
+    :param end:
+    :return: DataFrame with one column per field
+    """
+    import yfinance as yf
+
+    df = yf.download(symbol, start=start, end=end, auto_adjust=False, progress=False)
+    if symbol in yf.shared._ERRORS:
+        raise RuntimeError(f"Failed to download {symbol}: {yf.shared._ERRORS[symbol]}")
+
+    # Newer yfinance versions return (field, ticker) columns even for a single ticker
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.get_level_values(0)
+    return df
+
+
+class OHLCVStore:
+    """
+    On-disk cache of daily OHLCV data, one directory per ticker
+
+    Every ticker is stored as two NumPy files, dates.npy (int64 nanoseconds, sorted) and prices.npy (float64 array
+    of shape (dates, fields) in MarketData.FIELDS order), plus coverage.json recording the date ranges already
+    requested from the data source so that non-trading days are not downloaded again. Files are memory mapped when
+    loading, only the requested date range is read.
+    """
+
+    FIELDS = MarketData.FIELDS
+
+    def __init__(self, root: str, downloader: Callable[[str, pd.Timestamp, pd.Timestamp], pd.DataFrame] = None):
+        self.root = root
+        self.downloader = download_yahoo if downloader is None else downloader
+
+    def _path(self, symbol: str, file_name: str) -> str:
+        return os.path.join(self.root, symbol, file_name)
+
+    def tickers(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            symbol for symbol in os.listdir(self.root) if os.path.isfile(self._path(symbol, "dates.npy"))
+        )
+
+    def coverage(self, symbol: str) -> List[Interval]:
+        """
+        Sorted, disjoint date ranges [start, end) already requested for the ticker, empty if the ticker is not stored
+
+        :param symbol:
+        :return:
+        """
+        path = self._path(symbol, "coverage.json")
+        if not os.path.isfile(path):
+            return []
+        with open(path) as f:
+            coverage = json.load(f)
+        # Stores written before coverage was kept as a list of ranges hold a single start / end
+        intervals = coverage["intervals"] if "intervals" in coverage else [[coverage["start"], coverage["end"]]]
+        return [(pd.Timestamp(start), pd.Timestamp(end)) for start, end in intervals]
+
+    @staticmethod
+    def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+        """
+        Sorted union of date ranges, overlapping and adjacent ranges are merged
+
+        :param intervals:
+        :return:
+        """
+        merged = []
+        for start, end in sorted(intervals):
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+            else:
+                merged.append((start, end))
+        return merged
+
+    def missing_intervals(self, symbol: str, start: pd.Timestamp, end: pd.Timestamp) -> List[Interval]:
+        """
+        Date ranges of [start, end) not covered by the ranges already requested for the ticker
+
+        :param symbol:
+        :param start:
+        :param end: exclusive end date
+        :return:
+        """
+        missing = []
+        for covered_start, covered_end in self.coverage(symbol):
+            if covered_start >= end:
+                break
+            if covered_start > start:
+                missing.append((start, covered_start))
+            start = max(start, covered_end)
+        if start < end:
+            missing.append((start, end))
+        return missing
+
+    def _read(self, symbol: str) -> Tuple[np.ndarray, np.ndarray]:
+        if not os.path.isfile(self._path(symbol, "dates.npy")):
+            return np.empty(0, dtype=np.int64), np.empty((0, len(self.FIELDS)), dtype=np.float64)
+        dates = np.load(self._path(symbol, "dates.npy"), mmap_mode="r")
+        prices = np.load(self._path(symbol, "prices.npy"), mmap_mode="r")
+        return dates, prices
+
+    def _save(self, symbol: str, file_name: str, array: np.ndarray):
+        # Write to a temporary file first so that an interrupted write never leaves a truncated file behind
+        path = self._path(symbol, file_name)
+        with open(path + ".tmp", "wb") as f:
+            np.save(f, array)
+        os.replace(path + ".tmp", path)
+
+    def write(self, symbol: str, df: pd.DataFrame, start: pd.Timestamp = None, end: pd.Timestamp = None):
+        """
+        Append the OHLCV data of one ticker, dates already in the store are kept
+
+        :param symbol:
+        :param df: DataFrame indexed by date with one column per field, missing fields are stored as NaN
+        :param start: start of the requested date range, defaults to the first date of the DataFrame
+        :param end: exclusive end of the requested date range, defaults to the day after the last date
+        :return:
+        """
+        os.makedirs(os.path.join(self.root, symbol), exist_ok=True)
+
+        index = pd.DatetimeIndex(df.index)
+        if index.tz is not None:
+            index = index.tz_localize(None)
+        new_dates = index.asi8
+        new_prices = df.reindex(columns=self.FIELDS).to_numpy(dtype=np.float64)
+
+        dates, prices = self._read(symbol)
+        missing = ~np.isin(new_dates, dates)
+        dates = np.concatenate([dates, new_dates[missing]])
+        prices = np.concatenate([prices, new_prices[missing]])
+        order = np.argsort(dates, kind="stable")
+        self._save(symbol, "prices.npy", prices[order])
+        self._save(symbol, "dates.npy", dates[order])
+
+        if start is None:
+            start = pd.Timestamp(new_dates.min()) if len(new_dates) else None
+        if end is None:
+            end = pd.Timestamp(new_dates.max()) + pd.Timedelta(days=1) if len(new_dates) else None
+        if start is not None and end is not None:
+            intervals = self.merge_intervals(self.coverage(symbol) + [(start, end)])
+            with open(self._path(symbol, "coverage.json"), "w") as f:
+                json.dump({"intervals": [[start.isoformat(), end.isoformat()] for start, end in intervals]}, f)
+
+    def update(self, symbols: Iterable[str], start, end):
+        """
+        Download only the dates of [start, end) that have not been requested before, every gap between the date ranges
+        already requested is downloaded separately
+
+        Nothing is downloaded, and the store can be used offline, once the date range is covered.
+
+        :param symbols:
+        :param start:
+        :param end: exclusive end date
+        :return:
+        """
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        for symbol in symbols:
+            for missing_start, missing_end in self.missing_intervals(symbol, start, end):
+                df = self.downloader(symbol, missing_start, missing_end)
+                self.write(symbol, df, start=missing_start, end=missing_end)
+
+    def load(self, symbols: Iterable[str], start=None, end=None) -> pd.DataFrame:
+        """
+        Load the OHLCV data in the format expected by BacktestEngine
+
+        Returns a DataFrame with (ticker, field) MultiIndex columns indexed by the union of the dates of every ticker,
+        the same as concatenating the yfinance downloads of each ticker along the columns.
+
+        :param symbols:
+        :param start: first date to load, defaults to the first stored date
+        :param end: exclusive end date, defaults to the last stored date
+        :return:
+        """
+        symbols = list(symbols)
+        start = None if start is None else pd.Timestamp(start).value
+        end = None if end is None else pd.Timestamp(end).value
+
+        ticker_dates = []
+        ticker_prices = []
+        for symbol in symbols:
+            if not os.path.isfile(self._path(symbol, "dates.npy")):
+                raise KeyError(f"{symbol} is not in the OHLCV store {self.root}")
+            dates, prices = self._read(symbol)
+            i = 0 if start is None else np.searchsorted(dates, start, side="left")
+            j = len(dates) if end is None else np.searchsorted(dates, end, side="left")
+            ticker_dates.append(np.asarray(dates[i:j]))
+            ticker_prices.append(prices[i:j])
+
+        index = ticker_dates[0] if ticker_dates else np.empty(0, dtype=np.int64)
+        if not all(np.array_equal(index, dates) for dates in ticker_dates):
+            index = np.unique(np.concatenate(ticker_dates))
+
+        values = np.full((len(index), len(symbols) * len(self.FIELDS)), np.nan)
+        for column, (dates, prices) in enumerate(zip(ticker_dates, ticker_prices)):
+            rows = slice(None) if len(dates) == len(index) else np.searchsorted(index, dates)
+            values[rows, column * len(self.FIELDS) : (column + 1) * len(self.FIELDS)] = prices
+
+        return pd.DataFrame(
+            values,
+            index=pd.DatetimeIndex(index.astype("datetime64[ns]"), name="Date"),
+            columns=pd.MultiIndex.from_product([symbols, self.FIELDS]),
+        )
@@ -0,0 +1,438 @@
+import heapq
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from src import constants
+
+NAT = pd.NaT.value
+
+
+class OrderBook:
+    """
+    Columnar order book used internally by the backtest loop
+
+    Every order field is stored in its own NumPy array (struct-of-arrays) and rows are only ever appended,
+    so a row number identifies an order for the whole run. Three indices are maintained alongside the arrays:
+
+    1. A status index: orders that are dated and not Filled / Cancelled / Expired sit in a schedule heap keyed
+       by order_date and are moved into the active set once the backtest clock reaches them
+    2. An order_id index: order_id -> rows, used to find the parent and attached orders of a bracket
+    3. An OCO index: (order_id, oco_group) -> rows, the attached orders that cancel each other when one of them fills
+
+    The pandas representation is only rebuilt by to_dataframe() once the run finishes.
+    """
+
+    FLOAT_COLUMNS = ["limit_price", "limit_offset", "stop_price", "quantity", "trail", "filled_price"]
+    DATE_COLUMNS = ["order_date", "filled_date"]
+    # oco_group: optional input column, attached orders of a bracket with the same oco_group are one-cancels-other
+    OBJECT_COLUMNS = [
+        "order_id", "ticker", "order_type", "action", "trail_type", "time_in_force", "status", "comments", "oco_group"
+    ]
+    BOOL_COLUMNS = ["attached_order"]
+    # ticker_column: column of the ticker in the MarketData price matrices
+    # trigger_bar: cached first bar on which the order can change state, -1 if unknown
+    # stop_path_start / stop_path_trigger: first bar and trigger bar of the precomputed trailing stop path, -1 if none
+    # stop_updated_bar: last bar whose trailing stop update is applied to stop_price / limit_price
+    INT_COLUMNS = ["ticker_column", "trigger_bar", "stop_path_start", "stop_path_trigger", "stop_updated_bar"]
+    # Enumerated columns encoded once as int8 <column>_code arrays kept in sync with the strings, 0 for unknown values.
+    # The vectorized order selection compares the codes, the strings are kept for the output and per order branching
+    CODED_COLUMNS = {
+        "order_type": constants.ORDER_TYPE_CODES,
+        "action": constants.TRADE_ACTION_CODES,
+        "time_in_force": constants.TIME_IN_FORCE_CODES,
+        "trail_type": constants.TRAIL_TYPE_CODES,
+        "status": constants.ORDER_STATUS_CODES,
+    }
+
+    # Columns appended by the engine when the input order book does not carry them
+    ENGINE_COLUMNS = ["status", "comments", "filled_date", "filled_price"]
+
+    TERMINAL_STATUSES = {
+        constants.ORDER_STATUS_FILLED,
+        constants.ORDER_STATUS_CANCELLED,
+        constants.ORDER_STATUS_EXPIRED,
+    }
+
+    INITIAL_CAPACITY = 64
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY):
+        capacity = max(int(capacity), 1)
+        self.size = 0
+        self.columns: List[str] = []  # Output column order of to_dataframe()
+        self.extra_columns: Dict[str, np.ndarray] = {}  # Input columns the engine does not use
+        self.input_index = None
+        self.input_size = 0
+
+        for column in self.FLOAT_COLUMNS:
+            setattr(self, column, np.full(capacity, np.nan, dtype=np.float64))
+        for column in self.DATE_COLUMNS:
+            setattr(self, column, np.full(capacity, NAT, dtype=np.int64))
+        for column in self.OBJECT_COLUMNS:
+            setattr(self, column, np.full(capacity, "", dtype=object))
+        for column in self.BOOL_COLUMNS:
+            setattr(self, column, np.zeros(capacity, dtype=bool))
+        for column in self.INT_COLUMNS:
+            setattr(self, column, np.full(capacity, -1, dtype=np.int64))
+        for column in self.CODED_COLUMNS:
+            setattr(self, f"{column}_code", np.zeros(capacity, dtype=np.int8))
+
+        self.ticker_columns: Dict[str, int] = {}
+        self._groups: Dict[object, List[int]] = {}
+        self._oco_groups: Dict[tuple, List[int]] = {}
+        self._schedule: List[tuple] = []
+        self._active = set()
+        self._active_rows = None  # Sorted array of the active set, rebuilt only when the active set changes
+        # (row, status) of the orders activated (Pending) or closed since the last drain_changes, None when the
+        # changes are not recorded, see record_changes
+        self.changes = None
+        self._activated = set()
+
+    @property
+    def capacity(self) -> int:
+        return len(self.quantity)
+
+    @classmethod
+    def from_dataframe(cls, order_book: pd.DataFrame) -> "OrderBook":
+        """
+        Build the columnar order book from the input DataFrame
+
+        Missing columns fall back to the defaults of the Order dataclass, empty filled_date / filled_price
+        strings are read as NaT / NaN. A missing or empty oco_group puts all the attached orders of an order_id in
+        the same one-cancels-other group.
+
+        :param order_book:
+        :return:
+        """
+        n = len(order_book)
+        book = cls(capacity=max(n, cls.INITIAL_CAPACITY))
+        book.size = n
+        book.input_size = n
+        book.input_index = order_book.index
+        book.columns = list(order_book.columns) + [c for c in cls.ENGINE_COLUMNS if c not in order_book.columns]
+
+        defaults = {"limit_offset": 0.0, "stop_price": 0.0, "trail": 0.0}
+        for column in cls.FLOAT_COLUMNS:
+            if column in order_book.columns:
+                values = pd.to_numeric(order_book[column], errors="coerce")
+                getattr(book, column)[:n] = values.to_numpy(dtype=np.float64, na_value=np.nan)
+            elif column in defaults:
+                getattr(book, column)[:n] = defaults[column]
+
+        for column in cls.DATE_COLUMNS:
+            if column in order_book.columns:
+                values = pd.to_datetime(order_book[column], errors="coerce")
+                getattr(book, column)[:n] = values.to_numpy(dtype="datetime64[ns]").view(np.int64)
+
+        for column in cls.OBJECT_COLUMNS:
+            if column in order_book.columns:
+                getattr(book, column)[:n] = order_book[column].to_numpy(dtype=object)
+
+        if "oco_group" in order_book.columns:
+            book.oco_group[:n] = order_book["oco_group"].fillna("").astype(str).to_numpy(dtype=object)
+
+        if "attached_order" in order_book.columns:
+            book.attached_order[:n] = order_book["attached_order"].fillna(False).to_numpy(dtype=bool)
+
+        for column in cls.CODED_COLUMNS:
+            getattr(book, f"{column}_code")[:n] = book.encode(column, getattr(book, column)[:n])
+
+        used_columns = set(cls.FLOAT_COLUMNS + cls.DATE_COLUMNS + cls.OBJECT_COLUMNS + cls.BOOL_COLUMNS)
+        for column in order_book.columns:
+            if column not in used_columns:
+                book.extra_columns[column] = order_book[column].to_numpy(copy=True)
+
+        for row in range(n):
+            book._index_row(row)
+            book._schedule_row(row)
+
+        return book
+
+    def to_state(self) -> dict:
+        """
+        State of the order book as plain arrays and containers, e.g. to checkpoint a backtest, see from_state
+
+        :return:
+        """
+        n = self.size
+        state = {column: getattr(self, column)[:n] for column in self._array_columns()}
+        state.update(
+            size=n,
+            columns=self.columns,
+            extra_columns=self.extra_columns,
+            input_index=self.input_index,
+            input_size=self.input_size,
+            ticker_columns=self.ticker_columns,
+            schedule=self._schedule,
+            active=sorted(self._active),
+        )
+        return state
+
+    @classmethod
+    def from_state(cls, state: dict) -> "OrderBook":
+        """
+        Rebuild an order book from to_state, the order_id and OCO indices are rebuilt from the arrays
+
+        :param state:
+        :return:
+        """
+        n = state["size"]
+        book = cls(capacity=max(n, cls.INITIAL_CAPACITY))
+        book.size = n
+        for column in book._array_columns():
+            getattr(book, column)[:n] = state[column]
+        book.columns = list(state["columns"])
+        book.extra_columns = dict(state["extra_columns"])
+        book.input_index = state["input_index"]
+        book.input_size = state["input_size"]
+        book.ticker_columns = dict(state["ticker_columns"])
+        for row in range(n):
+            book._index_row(row)
+        book._schedule = list(state["schedule"])
+        book._active = set(state["active"])
+        return book
+
+    def _array_columns(self) -> List[str]:
+        return (
+            self.FLOAT_COLUMNS
+            + self.DATE_COLUMNS
+            + self.OBJECT_COLUMNS
+            + self.BOOL_COLUMNS
+            + self.INT_COLUMNS
+            + [f"{column}_code" for column in self.CODED_COLUMNS]
+        )
+
+    @classmethod
+    def encode(cls, column: str, values: np.ndarray) -> np.ndarray:
+        """
+        Integer codes of the values of an enumerated column, 0 for missing and unknown values
+
+        :param column: one of CODED_COLUMNS
+        :param values:
+        :return: int8 array
+        """
+        codes = pd.Series(values, dtype=object).map(cls.CODED_COLUMNS[column])
+        return codes.fillna(0).to_numpy(dtype=np.int8)
+
+    def _grow(self):
+        new_capacity = self.capacity * 2
+        fill_values = {}
+        fill_values.update({column: np.nan for column in self.FLOAT_COLUMNS})
+        fill_values.update({column: NAT for column in self.DATE_COLUMNS})
+        fill_values.update({column: "" for column in self.OBJECT_COLUMNS})
+        fill_values.update({column: False for column in self.BOOL_COLUMNS})
+        fill_values.update({column: -1 for column in self.INT_COLUMNS})
+        fill_values.update({f"{column}_code": 0 for column in self.CODED_COLUMNS})
+
+        for column, fill_value in fill_values.items():
+            old = getattr(self, column)
+            new = np.full(new_capacity, fill_value, dtype=old.dtype)
+            new[: self.size] = old[: self.size]
+            setattr(self, column, new)
+
+    def set_ticker_columns(self, ticker_columns: Dict[str, int]):
+        """
+        Map every order to the column of its ticker in the MarketData price matrices
+
+        :param ticker_columns: ticker -> column
+        :return:
+        """
+        self.ticker_columns = ticker_columns
+        for row in range(self.size):
+            self.ticker_column[row] = ticker_columns.get(self.ticker[row], -1)
+
+    def append(
+        self,
+        order_id,
+        attached_order: bool,
+        order_date: int,
+        ticker: str,
+        order_type: str,
+        action: str,
+        limit_price: float,
+        time_in_force: str,
+        quantity: float,
+        stop_price: float = 0.0,
+        trail_type: str = "",
+        trail: float = 0.0,
+        status: str = constants.ORDER_STATUS_PENDING,
+        oco_group: str = "",
+    ) -> int:
+        """
+        Append a new order and return its row number
+
+        :return:
+        """
+        if self.size == self.capacity:
+            self._grow()
+
+        row = self.size
+        self.size += 1
+        self.order_id[row] = order_id
+        self.attached_order[row] = attached_order
+        self.order_date[row] = order_date
+        self.ticker[row] = ticker
+        self.order_type[row] = order_type
+        self.action[row] = action
+        self.limit_price[row] = limit_price
+        self.time_in_force[row] = time_in_force
+        self.quantity[row] = quantity
+        self.stop_price[row] = stop_price
+        self.trail_type[row] = trail_type
+        self.trail[row] = trail
+        self.status[row] = status
+        self.oco_group[row] = oco_group
+        self.ticker_column[row] = self.ticker_columns.get(ticker, -1)
+        self.order_type_code[row] = constants.ORDER_TYPE_CODES.get(order_type, 0)
+        self.action_code[row] = constants.TRADE_ACTION_CODES.get(action, 0)
+        self.time_in_force_code[row] = constants.TIME_IN_FORCE_CODES.get(time_in_force, 0)
+        self.trail_type_code[row] = constants.TRAIL_TYPE_CODES.get(trail_type, 0)
+        self.status_code[row] = constants.ORDER_STATUS_CODES.get(status, 0)
+
+        self._index_row(row)
+        self._schedule_row(row)
+        if self.changes is not None and order_date != NAT:
+            self._record_activation(row)
+        return row
+
+    def _index_row(self, row: int):
+        order_id = self.order_id[row]
+        self._groups.setdefault(order_id, []).append(row)
+        self._oco_groups.setdefault((order_id, self.oco_group[row]), []).append(row)
+
+    def _schedule_row(self, row: int):
+        if self.order_date[row] != NAT and self.status[row] not in self.TERMINAL_STATUSES:
+            heapq.heappush(self._schedule, (self.order_date[row], row))
+
+    def record_changes(self):
+        """
+        Record the orders activated or closed from now on, read them with drain_changes
+
+        An order is activated once: when the backtest clock reaches its order_date, or when it is dated during the
+        run, e.g. the attached orders of a filled order. Orders already active are not reported.
+
+        :return:
+        """
+        self.changes = []
+        self._activated = set(self._active)
+
+    def drain_changes(self) -> List[tuple]:
+        changes = self.changes
+        self.changes = []
+        return changes
+
+    def _record_activation(self, row: int):
+        if row not in self._activated:
+            self._activated.add(row)
+            self.changes.append((row, constants.ORDER_STATUS_PENDING))
+
+    def is_closed(self, row: int) -> bool:
+        return self.status[row] in self.TERMINAL_STATUSES
+
+    def is_active(self, row: int) -> bool:
+        """Whether the row was moved into the active set, i.e. the backtest clock reached its order_date"""
+        return row in self._active
+
+    def group(self, order_id) -> List[int]:
+        """Rows sharing the given order_id, in insertion order"""
+        return self._groups.get(order_id, [])
+
+    def oco_rows(self, row: int) -> List[int]:
+        """Rows of the one-cancels-other group of the given row: same order_id and oco_group, in insertion order"""
+        return self._oco_groups[(self.order_id[row], self.oco_group[row])]
+
+    def set_status(self, row: int, status: str, timestamp: int = None, comments: str = None):
+        self.status[row] = status
+        self.status_code[row] = constants.ORDER_STATUS_CODES.get(status, 0)
+        if comments is not None:
+            self.comments[row] = comments
+        if timestamp is not None:
+            self.filled_date[row] = timestamp
+
+        if status in self.TERMINAL_STATUSES:
+            if self.changes is not None:
+                self.changes.append((row, status))
+            if row in self._active:
+                self._active.discard(row)
+                self._active_rows = None
+        else:
+            self._schedule_row(row)
+
+    def set_order_date(self, row: int, order_date: int):
+        self.order_date[row] = order_date
+        self.trigger_bar[row] = -1
+        self._schedule_row(row)
+        if self.changes is not None:
+            self._record_activation(row)
+
+    def reset_trigger_bars(self):
+        """Forget the cached trigger bars, e.g. when the bars they refer to are replaced"""
+        self.trigger_bar[: self.size] = -1
+
+    def next_order_date(self):
+        """
+        Earliest order_date of the orders that are scheduled but not active yet, None if there are none
+
+        :return:
+        """
+        while self._schedule:
+            order_date, row = self._schedule[0]
+            if order_date == self.order_date[row] and not self.is_closed(row) and row not in self._active:
+                return order_date
+            heapq.heappop(self._schedule)
+        return None
+
+    def active_rows(self, timestamp: int) -> np.ndarray:
+        """
+        Rows with order_date <= timestamp that are not Filled / Cancelled / Expired, in row order
+
+        :param timestamp:
+        :return:
+        """
+        while self._schedule and self._schedule[0][0] <= timestamp:
+            order_date, row = heapq.heappop(self._schedule)
+            # Skip stale heap entries of orders that were rescheduled or closed since they were pushed
+            if order_date == self.order_date[row] and not self.is_closed(row) and row not in self._active:
+                self._active.add(row)
+                self._active_rows = None
+                if self.changes is not None:
+                    self._record_activation(row)
+
+        if self._active_rows is None:
+            self._active_rows = np.array(sorted(self._active), dtype=np.int64)
+        return self._active_rows
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Materialize the order book back into the DataFrame layout of the input order book
+
+        :return:
+        """
+        n = self.size
+        data = {}
+        for column in self.columns + [c for c in self._all_columns() if c not in self.columns]:
+            if column in self.extra_columns:
+                values = pd.Series(self.extra_columns[column])
+                data[column] = values.reindex(range(n)).to_numpy()
+            elif column in self.DATE_COLUMNS:
+                data[column] = getattr(self, column)[:n].view("datetime64[ns]")
+            else:
+                data[column] = getattr(self, column)[:n].copy()
+
+        order_book = pd.DataFrame(data)
+        if n == self.input_size and self.input_index is not None:
+            order_book.index = self.input_index
+
+        # Orders that were never filled keep the empty strings the engine initializes these columns with
+        for column in ["filled_date", "filled_price"]:
+            unset = order_book[column].isna()
+            if unset.any():
+                order_book[column] = order_book[column].astype(object)
+                order_book.loc[unset, column] = ""
+
+        return order_book
+
+    def _all_columns(self) -> List[str]:
+        return ["order_id", "attached_order", "order_date", "ticker", "order_type", "action", "limit_price",
+                "limit_offset", "stop_price", "quantity", "trail_type", "trail", "time_in_force"] + self.ENGINE_COLUMNS
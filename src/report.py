@@ -0,0 +1,290 @@
+import html
+import json
+from functools import cached_property
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from src import constants
+
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+RETURNS_STATS_COLUMNS = [
+    "start",
+    "end",
+    "periods",
+    "total_return",
+    "cagr",
+    "volatility",
+    "sharpe",
+    "sortino",
+    "max_drawdown",
+    "calmar",
+    "best_period",
+    "worst_period",
+    "win_rate",
+]
+
+# Largest number of points drawn in the equity curve of the HTML report
+EQUITY_CURVE_POINTS = 500
+
+
+def returns_stats(returns: pd.DataFrame, periods_per_year: int = 252) -> pd.DataFrame:
+    """
+    Performance statistics of several return series at once, computed column by column on a single 2D array
+
+    Missing returns, e.g. the NaN return of the first bar, count as 0. Annualized figures assume periods_per_year
+    returns a year and a zero risk free rate, the Sortino ratio uses the downside deviation of all the returns.
+
+    :param returns: one column of returns per strategy, indexed by date
+    :param periods_per_year:
+    :return: one row of RETURNS_STATS_COLUMNS per column of returns
+    """
+    r = np.nan_to_num(returns.to_numpy(dtype=np.float64))
+    n = r.shape[0]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        growth = np.cumprod(1 + r, axis=0)
+        total_return = growth[-1] - 1 if n else np.full(r.shape[1], np.nan)
+        cagr = (1 + total_return) ** (periods_per_year / n) - 1 if n else total_return
+        mean = r.mean(axis=0) if n else total_return
+        std = r.std(axis=0, ddof=1) if n > 1 else np.full(r.shape[1], np.nan)
+        downside = np.sqrt((np.minimum(r, 0) ** 2).mean(axis=0)) if n else total_return
+        sharpe = np.where(std > 0, mean / std * np.sqrt(periods_per_year), np.nan)
+        sortino = np.where(downside > 0, mean / downside * np.sqrt(periods_per_year), np.nan)
+        max_drawdown = (growth / np.maximum.accumulate(growth, axis=0) - 1).min(axis=0) if n else total_return
+        calmar = np.where(max_drawdown < 0, cagr / -max_drawdown, np.nan)
+        traded = (r != 0).sum(axis=0)
+        win_rate = np.where(traded > 0, (r > 0).sum(axis=0) / traded, np.nan)
+
+    index = returns.index
+    return pd.DataFrame(
+        {
+            "start": index[0] if n else pd.NaT,
+            "end": index[-1] if n else pd.NaT,
+            "periods": n,
+            "total_return": total_return,
+            "cagr": cagr,
+            "volatility": std * np.sqrt(periods_per_year),
+            "sharpe": sharpe,
+            "sortino": sortino,
+            "max_drawdown": max_drawdown,
+            "calmar": calmar,
+            "best_period": r.max(axis=0) if n else total_return,
+            "worst_period": r.min(axis=0) if n else total_return,
+            "win_rate": win_rate,
+        },
+        index=returns.columns,
+        columns=RETURNS_STATS_COLUMNS,
+    )
+
+
+def monthly_returns(returns: pd.Series) -> pd.DataFrame:
+    """
+    Compounded return of every month, one row per year with a column per month and the year's return
+
+    :param returns:
+    :return:
+    """
+    index = pd.DatetimeIndex(returns.index)
+    growth = pd.Series(1 + np.nan_to_num(returns.to_numpy(dtype=np.float64)), index=index)
+    monthly = growth.groupby([index.year, index.month]).prod() - 1
+    table = monthly.unstack().reindex(columns=range(1, 13))
+    table.columns = MONTHS
+    table["Year"] = growth.groupby(index.year).prod() - 1
+    return table.rename_axis("year")
+
+
+def trade_stats(trades: pd.DataFrame) -> dict:
+    """
+    Summary of the trades of a backtest, e.g. the concatenated StockEntity.trades of every stock
+
+    :param trades: DataFrame with symbol, action, limit_price (filled price), quantity and fees columns
+    :return:
+    """
+    quantity = trades["quantity"].to_numpy(dtype=np.float64)
+    price = trades["limit_price"].to_numpy(dtype=np.float64)
+    fees = trades["fees"].to_numpy(dtype=np.float64) if "fees" in trades else np.zeros(len(trades))
+    action = trades["action"].to_numpy()
+    value = quantity * price
+    return {
+        "trades": len(trades),
+        "buys": int((action == constants.TRADE_ACTION_BUY).sum()),
+        "sells": int((action == constants.TRADE_ACTION_SELL).sum()),
+        "symbols": int(trades["symbol"].nunique()),
+        "traded_quantity": float(quantity.sum()),
+        "traded_value": float(value.sum()),
+        "average_trade_value": float(value.mean()) if len(trades) else np.nan,
+        "total_fees": float(fees.sum()),
+        "fees_per_trade": float(fees.mean()) if len(trades) else np.nan,
+    }
+
+
+def load_benchmark(ohlcv_store, symbol: str, start=None, end=None) -> pd.Series:
+    """
+    Daily returns of a benchmark ticker from the local OHLCV store, nothing is downloaded
+
+    :param ohlcv_store: OHLCVStore the benchmark was cached in, e.g. with ohlcv_store.update(["SPY"], start, end)
+    :param symbol:
+    :param start:
+    :param end: exclusive end date
+    :return: returns of the adjusted close, named after the ticker
+    """
+    prices = ohlcv_store.load([symbol], start=start, end=end)[(symbol, "Adj Close")]
+    return prices.pct_change().rename(symbol)
+
+
+def _json_value(value):
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        return None if pd.isna(value) else pd.Timestamp(value).isoformat()
+    if isinstance(value, (np.integer, int)):
+        return int(value)
+    if isinstance(value, (np.floating, float)):
+        return None if np.isnan(value) else float(value)
+    return value
+
+
+class TearDownReport:
+    """
+    Offline tear down report of a backtest, rendered as HTML or JSON
+
+    Statistics are computed from the returns series with NumPy, no data is downloaded: a benchmark is compared
+    against only when its returns are given, e.g. from load_benchmark. Every table is computed on first access.
+    """
+
+    def __init__(
+        self,
+        returns: pd.Series,
+        trades: pd.DataFrame = None,
+        benchmark: pd.Series = None,
+        title: str = "Strategy",
+        periods_per_year: int = 252,
+    ):
+        """
+        :param returns: returns of the strategy, indexed by date
+        :param trades: trades of the backtest, see trade_stats
+        :param benchmark: returns of the benchmark, aligned to the dates of the strategy returns
+        :param title:
+        :param periods_per_year: number of returns per year, used to annualize the statistics
+        """
+        self.returns = returns.rename(title)
+        self.trades = trades
+        self.benchmark = None
+        if benchmark is not None:
+            name = benchmark.name if benchmark.name is not None else "Benchmark"
+            self.benchmark = benchmark.reindex(returns.index).rename(name)
+        self.title = title
+        self.periods_per_year = periods_per_year
+
+    @classmethod
+    def from_engine(cls, backtest_engine, benchmark: pd.Series = None, title: str = "Strategy") -> "TearDownReport":
+        trades = [stock_entity.trades for stock_entity in backtest_engine.stocks.values()]
+        trades = [df for df in trades if len(df)]
+        # Returns between session closes, the daily returns of intraday bars
+        return cls(
+            returns=backtest_engine.session_analytics.returns,
+            trades=pd.concat(trades, ignore_index=True) if trades else None,
+            benchmark=benchmark,
+            title=title,
+        )
+
+    @property
+    def series(self) -> List[pd.Series]:
+        return [self.returns] if self.benchmark is None else [self.returns, self.benchmark]
+
+    @cached_property
+    def stats(self) -> pd.DataFrame:
+        """Statistics of the strategy and of the benchmark, one row each"""
+        stats = returns_stats(pd.concat(self.series, axis=1), self.periods_per_year)
+        if self.benchmark is not None:
+            r = np.nan_to_num(self.returns.to_numpy(dtype=np.float64))
+            b = np.nan_to_num(self.benchmark.to_numpy(dtype=np.float64))
+            variance = b.var(ddof=1) if len(b) > 1 else np.nan
+            stats.loc[self.returns.name, "beta"] = np.cov(r, b)[0, 1] / variance if variance > 0 else np.nan
+            stats.loc[self.returns.name, "correlation"] = np.corrcoef(r, b)[0, 1] if variance > 0 else np.nan
+        return stats
+
+    @cached_property
+    def monthly_returns(self) -> pd.DataFrame:
+        return monthly_returns(self.returns)
+
+    @cached_property
+    def trade_stats(self) -> Dict[str, float]:
+        return {} if self.trades is None else trade_stats(self.trades)
+
+    def to_dict(self) -> dict:
+        monthly = self.monthly_returns
+        return {
+            "title": self.title,
+            "stats": {
+                name: {column: _json_value(value) for column, value in row.items() if not pd.isna(value)}
+                for name, row in self.stats.iterrows()
+            },
+            "monthly_returns": {
+                str(year): {column: _json_value(value) for column, value in row.items()}
+                for year, row in monthly.iterrows()
+            },
+            "trade_stats": {key: _json_value(value) for key, value in self.trade_stats.items()},
+        }
+
+    def to_json(self, path: str = None) -> str:
+        text = json.dumps(self.to_dict(), indent=2)
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(text)
+        return text
+
+    def _equity_curve_svg(self, width: int = 800, height: int = 240) -> str:
+        curves = []
+        for returns in self.series:
+            growth = np.cumprod(1 + np.nan_to_num(returns.to_numpy(dtype=np.float64)))
+            step = max(1, -(-len(growth) // EQUITY_CURVE_POINTS))
+            curves.append(growth[::step])
+        if not len(curves[0]):
+            return ""
+
+        low = min(curve.min() for curve in curves)
+        high = max(curve.max() for curve in curves)
+        scale = (height - 10) / (high - low) if high > low else 0.0
+        lines = []
+        for curve, color in zip(curves, ["#1f77b4", "#999999"]):
+            x = np.linspace(0, width, len(curve)) if len(curve) > 1 else np.zeros(1)
+            y = height - 5 - (curve - low) * scale
+            points = " ".join(f"{a:.1f},{b:.1f}" for a, b in zip(x, y))
+            lines.append(f'<polyline fill="none" stroke="{color}" stroke-width="1.5" points="{points}"/>')
+        return f'<svg width="{width}" height="{height}" viewBox="0 0 {width} {height}">{"".join(lines)}</svg>'
+
+    def to_html(self, path: str = None) -> str:
+        stats = self.stats.T
+        trade_stats = pd.Series(self.trade_stats, name="value", dtype=object).to_frame()
+        sections = [
+            f"<h1>{html.escape(self.title)}</h1>",
+            self._equity_curve_svg(),
+            "<h2>Key metrics</h2>",
+            stats.to_html(float_format=lambda value: f"{value:.4f}", na_rep=""),
+            "<h2>Monthly returns</h2>",
+            self.monthly_returns.to_html(float_format=lambda value: f"{value:.2%}", na_rep=""),
+        ]
+        if self.trade_stats:
+            sections += ["<h2>Trades</h2>", trade_stats.to_html(header=False)]
+
+        text = (
+            "<!DOCTYPE html>\n<html><head><meta charset='utf-8'>"
+            f"<title>{html.escape(self.title)}</title>"
+            "<style>body{font-family:sans-serif}table{border-collapse:collapse}"
+            "td,th{padding:2px 8px;text-align:right;border-bottom:1px solid #ddd}</style>"
+            f"</head><body>\n{chr(10).join(sections)}\n</body></html>\n"
+        )
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(text)
+        return text
+
+    def write(self, path: str) -> str:
+        """
+        Write the report as JSON if path ends with .json, as HTML otherwise
+
+        :param path:
+        :return: the report
+        """
+        return self.to_json(path) if path.endswith(".json") else self.to_html(path)
@@ -0,0 +1,170 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Iterable, List
+
+import numpy as np
+import pandas as pd
+
+from src import constants
+from src.backtest_engine import BacktestEngine
+from src.market_data import MarketData
+from src.report import TearDownReport, returns_stats
+
+# Market data attached by every worker process once, in _initialize_worker
+_worker_market_data = None
+_worker_shared_memory = None
+
+
+@dataclass
+class SweepResults:
+    # One row per order book: final_nav, total_fees, total_return, sharpe, max_drawdown, trades
+    summary: pd.DataFrame
+    # Portfolio returns of every run, one column per order book
+    returns: pd.DataFrame
+    # Directory the results of every run were exported to, see export.read_results
+    results_dir: str = None
+    results_format: str = "parquet"
+
+    def dataset(self, table: str):
+        """
+        Dataset of one table of every run, see export.read_results
+
+        :param table: orders, trades, holdings or portfolio
+        :return:
+        """
+        from src.export import read_results
+
+        if self.results_dir is None:
+            raise ValueError("The sweep was run without a results_dir")
+        return read_results(self.results_dir, table, export_format=self.results_format)
+
+    def stats(self, periods_per_year: int = 252) -> pd.DataFrame:
+        """
+        Tear down statistics of every run computed in one pass over the returns, see report.returns_stats
+
+        :param periods_per_year:
+        :return: one row per run
+        """
+        return returns_stats(self.returns, periods_per_year)
+
+    def write_reports(self, directory: str, benchmark: pd.Series = None, extension: str = "html") -> List[str]:
+        """
+        Write the tear down report of every run to directory/run_<run>.<extension>
+
+        :param directory:
+        :param benchmark: returns of the benchmark, compared against in every report
+        :param extension: html or json
+        :return: paths of the reports
+        """
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for run, returns in self.returns.items():
+            path = os.path.join(directory, f"run_{run}.{extension}")
+            TearDownReport(returns, benchmark=benchmark, title=f"Run {run}").write(path)
+            paths.append(path)
+        return paths
+
+
+def _initialize_worker(spec: dict):
+    # Workers share the resource tracker of the parent process, which unlinks the block once the sweep is done
+    global _worker_market_data, _worker_shared_memory
+    _worker_market_data, _worker_shared_memory = MarketData.from_shared_memory(spec)
+
+
+def _run(
+    run_id,
+    order_book: pd.DataFrame,
+    initial_capital: float,
+    engine_kwargs: dict,
+    market_data=None,
+    results_dir: str = None,
+    results_format: str = "parquet",
+) -> dict:
+    backtest_engine = BacktestEngine(
+        order_book=order_book,
+        initial_capital=initial_capital,
+        market_data=market_data if market_data is not None else _worker_market_data,
+        show_progress=False,
+        **engine_kwargs,
+    )
+    backtest_engine.backtest()
+    if results_dir is not None:
+        backtest_engine.export_results(results_dir, run_id=run_id, export_format=results_format)
+
+    analytics = backtest_engine.analytics
+    portfolio_value = analytics.nav.to_numpy()
+    final_nav = portfolio_value[-1] if len(portfolio_value) else initial_capital
+    return {
+        "run": run_id,
+        "final_nav": final_nav,
+        "total_fees": backtest_engine.fees,
+        "total_return": final_nav / initial_capital - 1,
+        "sharpe": analytics.sharpe,
+        "max_drawdown": analytics.max_drawdown,
+        "trades": int((backtest_engine.order_book["status"] == constants.ORDER_STATUS_FILLED).sum()),
+        "returns": analytics.returns.to_numpy(),
+    }
+
+
+def run_sweep(
+    ohlvc: pd.DataFrame,
+    order_books: Iterable[pd.DataFrame],
+    initial_capital: float = 100000.0,
+    max_workers: int = None,
+    results_dir: str = None,
+    results_format: str = "parquet",
+    **engine_kwargs,
+) -> SweepResults:
+    """
+    Backtest every order book against the same OHLCV data in a process pool
+
+    The price matrices are extracted once and placed in shared memory, workers attach to them when they start, so
+    only the order books are sent to the workers. Every order book must only trade tickers found in the OHLCV data.
+
+    :param ohlvc: DataFrame with (ticker, field) MultiIndex columns
+    :param order_books: order books to backtest, run ids are their position in the iterable
+    :param initial_capital:
+    :param max_workers: number of worker processes, defaults to the number of CPUs. 0 runs in the current process
+    :param results_dir: export the results of every run to this directory, partitioned by run id and ticker, so that
+        all the runs are read with a single dataset scan, see SweepResults.dataset
+    :param results_format: parquet or arrow
+    :param engine_kwargs: passed to every BacktestEngine, e.g. fill_mode or skip_idle_bars
+    :return:
+    """
+    market_data = MarketData.from_ohlvc(ohlvc)
+
+    if max_workers == 0:
+        results = [
+            _run(run_id, order_book, initial_capital, engine_kwargs, market_data, results_dir, results_format)
+            for run_id, order_book in enumerate(order_books)
+        ]
+    else:
+        block, spec = market_data.to_shared_memory()
+        try:
+            with ProcessPoolExecutor(
+                max_workers=max_workers, initializer=_initialize_worker, initargs=(spec,)
+            ) as executor:
+                futures = [
+                    executor.submit(
+                        _run, run_id, order_book, initial_capital, engine_kwargs, None, results_dir, results_format
+                    )
+                    for run_id, order_book in enumerate(order_books)
+                ]
+                results = [future.result() for future in futures]
+        finally:
+            block.close()
+            block.unlink()
+
+    returns = pd.DataFrame(
+        {result["run"]: result.pop("returns") for result in results},
+        index=market_data.index,
+        columns=pd.Index([result["run"] for result in results], name="run"),
+        dtype=np.float64,
+    )
+    summary = pd.DataFrame(
+        results, columns=["run", "final_nav", "total_fees", "total_return", "sharpe", "max_drawdown", "trades"]
+    )
+    return SweepResults(
+        summary=summary.set_index("run"), returns=returns, results_dir=results_dir, results_format=results_format
+    )
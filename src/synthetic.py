@@ -0,0 +1,161 @@
+from typing import Dict, Iterable
+
+import numpy as np
+import pandas as pd
+
+from src import constants
+
+DEFAULT_PARENT_MIX = {constants.LIMIT_ORDER: 0.8, constants.MARKET_ORDER: 0.2}
+
+DEFAULT_ATTACHED_MIX = {
+    constants.LIMIT_ORDER: 0.35,
+    constants.STOP_LIMIT_ORDER: 0.2,
+    constants.STOP_ORDER: 0.1,
+    constants.TRAILING_STOP_ORDER: 0.15,
+    constants.TRAILING_STOP_LIMIT_ORDER: 0.15,
+    constants.MARKET_ORDER: 0.05,
+}
+
+
+def intraday_index(
+    sessions: int,
+    start: str = "2022-01-03",
+    session_open: str = "09:30:00",
+    session_close: str = "16:00:00",
+    freq: str = "1min",
+) -> pd.DatetimeIndex:
+    """
+    Intraday bar timestamps of consecutive business day sessions, from the session open to before the close
+
+    :param sessions: number of sessions
+    :param start: first session date
+    :param session_open: time of the first bar of a session
+    :param session_close: end of the session, excluded
+    :param freq: bar frequency
+    :return:
+    """
+    offsets = pd.timedelta_range(session_open, session_close, freq=freq, closed="left")
+    days = pd.bdate_range(start, periods=sessions)
+    timestamps = (days.values[:, None] + offsets.values[None, :]).ravel()
+    return pd.DatetimeIndex(timestamps, name="Date")
+
+
+def generate_ohlcv(
+    tickers: Iterable[str], bars: int, seed: int = 0, start: str = "2022-01-03", index: pd.DatetimeIndex = None
+) -> pd.DataFrame:
+    """
+    Random walk OHLCV data with (ticker, field) MultiIndex columns on business days
+
+    :param tickers:
+    :param bars: number of bars
+    :param seed:
+    :param start: first date
+    :param index: bar timestamps to use instead of business days, e.g. from intraday_index
+    :return:
+    """
+    tickers = list(tickers)
+    rng = np.random.default_rng(seed)
+    shape = (bars, len(tickers))
+
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, shape), axis=0))
+    open_price = close * np.exp(rng.normal(0, 0.01, shape))
+    high = np.maximum(open_price, close) * np.exp(np.abs(rng.normal(0, 0.01, shape)))
+    low = np.minimum(open_price, close) * np.exp(-np.abs(rng.normal(0, 0.01, shape)))
+    volume = rng.integers(100_000, 1_000_000, shape).astype(np.float64)
+
+    # (bars, tickers, fields) flattened to ticker-major columns
+    values = np.stack([open_price, high, low, close, close, volume], axis=2).reshape(bars, -1)
+    return pd.DataFrame(
+        values,
+        index=pd.bdate_range(start, periods=bars, name="Date") if index is None else index[:bars],
+        columns=pd.MultiIndex.from_product([tickers, ["Open", "High", "Low", "Close", "Adj Close", "Volume"]]),
+    )
+
+
+def generate_order_book(
+    ohlcv: pd.DataFrame,
+    groups: int,
+    seed: int = 0,
+    parent_mix: Dict[str, float] = None,
+    attached_mix: Dict[str, float] = None,
+    attached_ratio: float = 1.0,
+) -> pd.DataFrame:
+    """
+    Random order book of parent orders with attached take profit, stop and trailing stop orders
+
+    Parent orders are priced around the previous Close, attached orders 1% to 8% away from it on the exit side.
+
+    :param ohlcv: DataFrame with (ticker, field) MultiIndex columns
+    :param groups: number of parent orders
+    :param seed:
+    :param parent_mix: probability of every parent order type, Limit and Market
+    :param attached_mix: probability of every attached order type
+    :param attached_ratio: average number of attached orders per parent order, at most 3 per parent
+    :return:
+    """
+    parent_mix = DEFAULT_PARENT_MIX if parent_mix is None else parent_mix
+    attached_mix = DEFAULT_ATTACHED_MIX if attached_mix is None else attached_mix
+    rng = np.random.default_rng(seed)
+
+    tickers = list(ohlcv.columns.get_level_values(0).unique())
+    close = ohlcv.xs("Close", axis=1, level=1)[tickers].to_numpy()
+    parent_types = list(parent_mix)
+    parent_p = np.array(list(parent_mix.values())) / sum(parent_mix.values())
+    attached_types = list(attached_mix)
+    attached_p = np.array(list(attached_mix.values())) / sum(attached_mix.values())
+
+    rows = []
+    for group in range(groups):
+        column = rng.integers(len(tickers))
+        bar = rng.integers(len(ohlcv))
+        reference_price = close[max(bar - 1, 0), column]
+        action, exit_action, sign = (
+            (constants.TRADE_ACTION_BUY, constants.TRADE_ACTION_SELL, 1)
+            if rng.random() < 0.6
+            else (constants.TRADE_ACTION_SELL, constants.TRADE_ACTION_BUY, -1)
+        )
+        order_type = parent_types[rng.choice(len(parent_types), p=parent_p)]
+        order = {
+            "order_id": f"GROUP_{group}",
+            "attached_order": False,
+            "order_date": ohlcv.index[bar],
+            "ticker": tickers[column],
+            "order_type": order_type,
+            "action": action,
+            "limit_price": (
+                round(reference_price * (1 - sign * rng.uniform(0, 0.02)), 2)
+                if order_type == constants.LIMIT_ORDER
+                else np.nan
+            ),
+            "limit_offset": 0.0,
+            "stop_price": 0.0,
+            "quantity": float(rng.integers(1, 50)),
+            "trail_type": "N.A.",
+            "trail": 0.0,
+            "time_in_force": rng.choice([constants.TIME_IN_FORCE_DAY, constants.TIME_IN_FORCE_GTC]),
+        }
+        rows.append(order)
+
+        for attached_type in rng.choice(attached_types, size=min(rng.poisson(attached_ratio), 3), p=attached_p):
+            attached = dict(order, attached_order=True, order_date=pd.NaT, order_type=attached_type)
+            attached["action"] = exit_action
+            attached["limit_price"] = np.nan
+            attached["time_in_force"] = constants.TIME_IN_FORCE_GTC
+            if attached_type == constants.LIMIT_ORDER:
+                attached["limit_price"] = round(reference_price * (1 + sign * rng.uniform(0.01, 0.08)), 2)
+            elif attached_type in constants.STOP_LOST_TRIGGERS:
+                attached["stop_price"] = round(reference_price * (1 - sign * rng.uniform(0.01, 0.08)), 2)
+                attached["limit_offset"] = round(rng.uniform(0, 1), 2)
+                attached["limit_price"] = attached["stop_price"] - sign * attached["limit_offset"]
+                if attached_type in [constants.TRAILING_STOP_ORDER, constants.TRAILING_STOP_LIMIT_ORDER]:
+                    if rng.random() < 0.5:
+                        attached["trail_type"] = constants.TRAIL_TYPE_VALUE
+                        attached["trail"] = round(rng.uniform(1, 5), 2)
+                    else:
+                        attached["trail_type"] = constants.TRAIL_TYPE_PERCENTAGE
+                        attached["trail"] = round(rng.uniform(0.02, 0.08), 3)
+            rows.append(attached)
+
+    order_book = pd.DataFrame(rows)
+    order_book["order_date"] = pd.to_datetime(order_book["order_date"])
+    return order_book
@@ -0,0 +1,27 @@
+import pytest
+
+from src import constants
+from src.synthetic import generate_ohlcv
+from src.test.helpers import make_trade_orders
+
+# Engine settings a feature is checked under, each one gives the same results as the default sequential engine
+ENGINE_KWARGS = {
+    "sequential": {},
+    "batched": {"fill_mode": constants.FILL_MODE_BATCHED},
+    "batched-skip-idle": {"fill_mode": constants.FILL_MODE_BATCHED, "skip_idle_bars": True},
+}
+
+
+@pytest.fixture
+def ohlvc():
+    return generate_ohlcv(["AAPL", "GOOGL", "MSFT"], 150, seed=0)
+
+
+@pytest.fixture
+def trade_orders(ohlvc):
+    return make_trade_orders(ohlvc, groups=60, seed=0)
+
+
+@pytest.fixture(params=list(ENGINE_KWARGS.values()), ids=list(ENGINE_KWARGS))
+def engine_kwargs(request):
+    return request.param
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+from src import constants
+from src.backtest_engine import BacktestEngine
+
+
+def make_trade_orders(ohlvc, groups, seed):
+    """Random brackets: a Limit / Market parent with up to three attached take profit, stop and trailing legs"""
+    rng = np.random.default_rng(seed)
+    tickers = list(ohlvc.columns.get_level_values(0).unique())
+    # Calendar days so that some Day orders are dated on a weekend and expire
+    dates = pd.date_range(ohlvc.index[0], ohlvc.index[-1])
+    attached_types = [
+        constants.LIMIT_ORDER,
+        constants.MARKET_ORDER,
+        constants.STOP_ORDER,
+        constants.STOP_LIMIT_ORDER,
+        constants.TRAILING_STOP_ORDER,
+        constants.TRAILING_STOP_LIMIT_ORDER,
+    ]
+    rows = []
+    for group in range(groups):
+        ticker = tickers[rng.integers(len(tickers))]
+        order_date = dates[rng.integers(len(dates))]
+        reference_price = ohlvc[(ticker, "Close")].asof(order_date)
+        reference_price = ohlvc[(ticker, "Close")].iloc[0] if np.isnan(reference_price) else reference_price
+        action, exit_action, sign = (
+            (constants.TRADE_ACTION_BUY, constants.TRADE_ACTION_SELL, 1)
+            if rng.random() < 0.6
+            else (constants.TRADE_ACTION_SELL, constants.TRADE_ACTION_BUY, -1)
+        )
+        order_type = constants.LIMIT_ORDER if rng.random() < 0.8 else constants.MARKET_ORDER
+        order = {
+            "order_id": f"GROUP_{group}",
+            "attached_order": False,
+            "order_date": order_date,
+            "ticker": ticker,
+            "order_type": order_type,
+            "action": action,
+            "limit_price": round(reference_price * (1 - sign * rng.uniform(0, 0.02)), 2),
+            "limit_offset": 0.0,
+            "stop_price": 0.0,
+            "quantity": float(rng.integers(1, 50)),
+            "trail_type": "N.A.",
+            "trail": 0.0,
+            "time_in_force": rng.choice([constants.TIME_IN_FORCE_DAY, constants.TIME_IN_FORCE_GTC]),
+        }
+        rows.append(order)
+
+        for attached_type in rng.choice(attached_types, size=rng.integers(0, 4)):
+            attached = dict(order, attached_order=True, order_date=pd.NaT, order_type=attached_type)
+            attached["action"] = exit_action
+            attached["time_in_force"] = constants.TIME_IN_FORCE_GTC
+            if rng.random() < 0.1:
+                attached["time_in_force"] = constants.TIME_IN_FORCE_DAY
+            if attached_type == constants.LIMIT_ORDER:
+                attached["limit_price"] = round(reference_price * (1 + sign * rng.uniform(0.01, 0.08)), 2)
+            elif attached_type in constants.STOP_LOST_TRIGGERS:
+                attached["stop_price"] = round(reference_price * (1 - sign * rng.uniform(0.01, 0.08)), 2)
+                attached["limit_offset"] = round(rng.uniform(0, 1), 2)
+                attached["limit_price"] = attached["stop_price"] - sign * attached["limit_offset"]
+                if attached_type in [constants.TRAILING_STOP_ORDER, constants.TRAILING_STOP_LIMIT_ORDER]:
+                    if rng.random() < 0.5:
+                        attached["trail_type"] = constants.TRAIL_TYPE_VALUE
+                        attached["trail"] = rng.uniform(1, 5)
+                    else:
+                        attached["trail_type"] = constants.TRAIL_TYPE_PERCENTAGE
+                        attached["trail"] = rng.uniform(0.02, 0.08)
+            rows.append(attached)
+
+    return pd.DataFrame(rows)
+
+
+def run_backtest(trade_orders, ohlvc, **kwargs):
+    backtest_engine = BacktestEngine(order_book=trade_orders, ohlvc=ohlvc, initial_capital=100000.0, **kwargs)
+    backtest_engine.backtest()
+    return backtest_engine
+
+
+def assert_same_results(expected: BacktestEngine, result: BacktestEngine):
+    pd.testing.assert_frame_equal(expected.order_book, result.order_book)
+    for symbol, stock_entity in expected.stocks.items():
+        pd.testing.assert_frame_equal(stock_entity.trades, result.stocks[symbol].trades)
+        pd.testing.assert_frame_equal(stock_entity.holding_records, result.stocks[symbol].holding_records)
+    pd.testing.assert_frame_equal(expected.combined_holding_records, result.combined_holding_records)
+    assert expected.current_capital == result.current_capital
+    assert expected.fees == result.fees
@@ -0,0 +1,45 @@
+import pandas as pd
+import pytest
+
+from src import constants
+from src.accounts import Account, MultiAccountEngine, split_accounts
+from src.backtest_engine import BacktestEngine
+from src.test.helpers import assert_same_results, make_trade_orders
+
+
+class TestAccounts:
+    @pytest.fixture
+    def accounts(self, ohlvc):
+        return {
+            "a": Account(make_trade_orders(ohlvc, groups=40, seed=0)),
+            "b": Account(make_trade_orders(ohlvc[["AAPL"]], groups=20, seed=1), initial_capital=50000.0),
+            "c": Account(make_trade_orders(ohlvc, groups=40, seed=2), fee_model=constants.FEE_MODEL_TIERED),
+        }
+
+    def test_matches_backtest(self, ohlvc, accounts, engine_kwargs):
+        multi_account_engine = MultiAccountEngine(accounts, ohlvc=ohlvc, show_progress=False, **engine_kwargs)
+        multi_account_engine.backtest()
+
+        for name, account in accounts.items():
+            expected = BacktestEngine(
+                order_book=account.order_book,
+                ohlvc=ohlvc,
+                initial_capital=account.initial_capital,
+                fee_model=account.fee_model,
+                show_progress=False,
+                **engine_kwargs,
+            )
+            expected.backtest()
+            assert_same_results(expected, multi_account_engine.engines[name])
+            pd.testing.assert_frame_equal(
+                multi_account_engine.combined_holding_records[name], expected.combined_holding_records
+            )
+            assert multi_account_engine.summary.loc[name, "total_fees"] == expected.fees
+
+    def test_split_accounts(self, ohlvc, accounts):
+        order_book = pd.concat([account.order_book.assign(account=name) for name, account in accounts.items()])
+        split = split_accounts(order_book, initial_capital=50000.0)
+
+        assert list(split) == ["a", "b", "c"]
+        assert split["b"].initial_capital == 50000.0
+        pd.testing.assert_frame_equal(split["b"].order_book, accounts["b"].order_book)
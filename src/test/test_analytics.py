@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.analytics import PortfolioAnalytics
+from src.synthetic import generate_ohlcv
+from src.test.helpers import make_trade_orders, run_backtest
+
+
+class TestPortfolioAnalytics:
+    @pytest.fixture
+    def analytics(self):
+        # Buy 10 A on the second record, short 5 B on the third one
+        return PortfolioAnalytics(
+            dates=pd.bdate_range("2022-01-03", periods=4).values,
+            tickers=["A", "B"],
+            quantities=[np.array([0.0, 10.0, 10.0, 10.0]), np.array([0.0, 0.0, -5.0, -5.0])],
+            prices=[np.array([10.0, 10.0, 12.0, 9.0]), np.array([20.0, 20.0, 20.0, np.nan])],
+            capital=np.array([1000.0, 900.0, 1000.0, 1000.0]),
+            fees=np.zeros(4),
+        )
+
+    def test_metrics(self, analytics):
+        np.testing.assert_array_equal(analytics.nav.to_numpy(), [1000.0, 1000.0, 1020.0, 1090.0])
+        np.testing.assert_allclose(analytics.returns.to_numpy(), [np.nan, 0.0, 0.02, 70 / 1020])
+        np.testing.assert_array_equal(analytics.drawdown.to_numpy(), [0.0, 0.0, 0.0, 0.0])
+        np.testing.assert_array_equal(analytics.gross_exposure.to_numpy(), [0.0, 100.0, 220.0, 90.0])
+        np.testing.assert_array_equal(analytics.net_exposure.to_numpy(), [0.0, 100.0, 20.0, 90.0])
+        np.testing.assert_array_equal(analytics.long_count.to_numpy(), [0, 1, 1, 1])
+        np.testing.assert_array_equal(analytics.short_count.to_numpy(), [0, 0, 1, 1])
+        np.testing.assert_allclose(analytics.turnover.to_numpy(), [0.0, 0.1, 100 / 1020, 0.0])
+        assert analytics.max_drawdown == 0.0
+
+        stats = analytics.portfolio_stats
+        assert stats.columns.tolist() == PortfolioAnalytics.PORTFOLIO_STATS_COLUMNS
+        assert stats.index.name == "date"
+        assert np.isnan(stats["sharpe"].iloc[:2]).all()
+        assert stats["sharpe"].iloc[-1] == pytest.approx(analytics.sharpe)
+
+    def test_cached(self, analytics):
+        assert analytics.nav is analytics.nav
+        assert "drawdown" not in analytics.__dict__
+        analytics.max_drawdown
+        assert "drawdown" in analytics.__dict__
+
+    def test_from_engine(self):
+        ohlvc = generate_ohlcv(["AAPL", "GOOGL"], 100, seed=0)
+        backtest_engine = run_backtest(make_trade_orders(ohlvc, groups=30, seed=0), ohlvc)
+
+        # Metrics do not build the combined holding records
+        analytics = backtest_engine.analytics
+        assert analytics.sharpe == analytics.sharpe
+        assert backtest_engine._combined_holding_records is None
+        assert backtest_engine.analytics is analytics
+
+        portfolio = backtest_engine.combined_holding_records["Portfolio"]
+        np.testing.assert_array_equal(analytics.nav.to_numpy(), portfolio["portfolio_value"].to_numpy())
+        np.testing.assert_array_equal(analytics.returns.to_numpy(), portfolio["returns"].to_numpy())
+        assert analytics.max_drawdown == pytest.approx(
+            (portfolio["portfolio_value"] / portfolio["portfolio_value"].cummax() - 1).min()
+        )
+        assert len(backtest_engine.portfolio_stats) == 100
+        # Every daily bar is a session of its own
+        assert backtest_engine.session_analytics is backtest_engine.analytics
+
+        # Cleared caches are rebuilt from the record arrays
+        combined_holding_records = backtest_engine.combined_holding_records
+        backtest_engine.clear_cached_records()
+        assert backtest_engine._combined_holding_records is None
+        assert backtest_engine.analytics is not analytics
+        pd.testing.assert_frame_equal(backtest_engine.combined_holding_records, combined_holding_records)
@@ -0,0 +1,82 @@
+import json
+
+import numpy as np
+import pytest
+
+from src import constants
+from src.benchmark import BenchmarkConfig, compare, import_time, main, run_benchmark
+from src.synthetic import generate_ohlcv, generate_order_book
+
+
+class TestBenchmark:
+    @pytest.fixture
+    def config(self):
+        return BenchmarkConfig(name="tiny", tickers=2, bars=30, groups=10, repeat=1)
+
+    def test_generators(self):
+        ohlcv = generate_ohlcv(["AAPL", "GOOGL"], bars=50, seed=0)
+        assert ohlcv.shape == (50, 12)
+        assert (ohlcv.xs("High", axis=1, level=1) >= ohlcv.xs("Low", axis=1, level=1)).all().all()
+
+        order_book = generate_order_book(
+            ohlcv, groups=40, seed=0, attached_mix={constants.TRAILING_STOP_ORDER: 1.0}, attached_ratio=2.0
+        )
+        attached = order_book[order_book["attached_order"]]
+        assert (~order_book["attached_order"]).sum() == 40
+        assert len(attached) > 40
+        assert (attached["order_type"] == constants.TRAILING_STOP_ORDER).all()
+        assert attached["trail_type"].isin([constants.TRAIL_TYPE_VALUE, constants.TRAIL_TYPE_PERCENTAGE]).all()
+
+    def test_run_benchmark(self, config):
+        results = run_benchmark(config)
+        assert results["orders"] >= 10
+        assert results["backtest_seconds"] > 0
+        assert results["backtest_peak_memory_bytes"] > 0
+        assert results["bars_per_second"] == pytest.approx(30 / results["backtest_seconds"])
+
+    def test_run_intraday_benchmark(self):
+        config = BenchmarkConfig(name="tiny-intraday", tickers=2, bars=100, groups=10, repeat=1, intraday_freq="5min")
+        results = run_benchmark(config)
+        assert results["orders"] >= 10
+        assert results["backtest_seconds"] > 0
+
+    def test_main_writes_json(self, tmp_path):
+        output = tmp_path / "benchmark.json"
+        main(["--tickers", "2", "--bars", "30", "--groups", "10", "--repeat", "1", "--output", str(output)])
+        with open(output) as f:
+            results = json.load(f)
+
+        assert results["benchmarks"][0]["config"]["name"] == "custom"
+        comparison = compare(results, results)
+        assert (comparison["ratio"] == 1.0).all()
+        assert "backtest_seconds" in comparison["metric"].tolist()
+        assert "import_seconds" in comparison["metric"].tolist()
+
+    def test_compare_missing_and_zero_baseline(self):
+        baseline = {
+            "benchmarks": [{"config": {"name": "tiny"}, "results": {"backtest_seconds": 2.0, "fees_seconds": 0.0}}],
+            "import": {"import_seconds": 0.0},
+        }
+        results = {
+            "benchmarks": [
+                {
+                    "config": {"name": "tiny"},
+                    "results": {"backtest_seconds": 1.0, "fees_seconds": 0.5, "combine_holding_records_seconds": 0.1},
+                }
+            ],
+            "import": {"import_seconds": 0.2},
+        }
+        comparison = compare(baseline, results).set_index("metric")
+
+        assert comparison.loc["backtest_seconds", "ratio"] == 0.5
+        assert np.isnan(comparison.loc["fees_seconds", "ratio"])
+        assert np.isnan(comparison.loc["combine_holding_records_seconds", "baseline"])
+        assert np.isnan(comparison.loc["combine_holding_records_seconds", "ratio"])
+        assert np.isnan(comparison.loc["import_seconds", "ratio"])
+
+    @pytest.mark.parametrize("module", ["src.backtest_engine", "src.sweep"])
+    def test_import_time(self, module):
+        # Reporting and progress bar dependencies are only imported when used
+        results = import_time(module, repeat=1)
+        assert results["optional_modules"] == []
+        assert results["import_seconds"] > 0
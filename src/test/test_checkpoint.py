@@ -0,0 +1,59 @@
+import pickle
+
+import pytest
+
+from src.backtest_engine import BacktestEngine
+from src.checkpoint import read_checkpoint
+from src.synthetic import generate_ohlcv
+from src.test.helpers import assert_same_results, run_backtest
+
+
+def make_engine(trade_orders, ohlvc, **kwargs) -> BacktestEngine:
+    return BacktestEngine(
+        order_book=trade_orders, ohlvc=ohlvc, initial_capital=100000.0, show_progress=False, **kwargs
+    )
+
+
+class TestCheckpoint:
+    def test_resume_matches_backtest(self, ohlvc, trade_orders, tmp_path, engine_kwargs):
+        expected = run_backtest(trade_orders, ohlvc, show_progress=False, **engine_kwargs)
+        path = str(tmp_path / "checkpoint.pkl")
+
+        # Saving checkpoints does not change the results
+        backtest_engine = make_engine(trade_orders, ohlvc, **engine_kwargs)
+        backtest_engine.backtest(checkpoint_path=path, checkpoint_every=100)
+        assert_same_results(expected, backtest_engine)
+        assert 100 <= read_checkpoint(path)["bar"] < 150
+
+        resumed = make_engine(trade_orders, ohlvc, **engine_kwargs)
+        resumed.backtest(checkpoint_path=path, resume=True)
+        assert_same_results(expected, resumed)
+
+    def test_warm_start(self, ohlvc, trade_orders, tmp_path):
+        # A variant sharing the first 100 bars resumes from the checkpoint of the original data
+        variant = generate_ohlcv(["AAPL", "GOOGL", "MSFT"], 150, seed=1)
+        variant.iloc[:100] = ohlvc.iloc[:100].to_numpy()
+        path = str(tmp_path / "checkpoint.pkl")
+        make_engine(trade_orders, ohlvc).backtest(checkpoint_path=path, checkpoint_every=100)
+
+        resumed = make_engine(trade_orders, variant)
+        resumed.backtest(checkpoint_path=path, resume=True)
+        assert_same_results(run_backtest(trade_orders, variant, show_progress=False), resumed)
+
+    def test_different_history(self, ohlvc, trade_orders, tmp_path):
+        path = str(tmp_path / "checkpoint.pkl")
+        make_engine(trade_orders, ohlvc).backtest(checkpoint_path=path, checkpoint_every=100)
+
+        changed = ohlvc.copy()
+        changed.iloc[50, 0] += 1.0
+        with pytest.raises(ValueError, match="does not start with the 100 bars"):
+            make_engine(trade_orders, changed).backtest(checkpoint_path=path, resume=True)
+
+    def test_version(self, ohlvc, trade_orders, tmp_path):
+        path = str(tmp_path / "checkpoint.pkl")
+        with open(path, "wb") as f:
+            pickle.dump({"version": 0, "state": {}}, f)
+        with pytest.raises(ValueError, match="expected version"):
+            make_engine(trade_orders, ohlvc).backtest(checkpoint_path=path, resume=True)
+        with pytest.raises(ValueError, match="need a checkpoint_path"):
+            make_engine(trade_orders, ohlvc).backtest(checkpoint_every=10)
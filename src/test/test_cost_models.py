@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import constants
+from src.backtest_engine import BacktestEngine
+from src.cost_models import (
+    COMMISSION_MODELS,
+    SLIPPAGE_MODELS,
+    CommissionModel,
+    FixedBpsSlippage,
+    get_commission_model,
+    get_slippage_model,
+    register_commission_model,
+)
+from src.test.helpers import assert_same_results
+
+
+class TestCostModels:
+    def test_registry(self):
+        assert isinstance(get_commission_model(constants.FEE_MODEL_FIXED), CommissionModel)
+        model = FixedBpsSlippage(bps=10)
+        assert get_slippage_model(model) is model
+        with pytest.raises(ValueError, match="unknown"):
+            get_commission_model("unknown")
+
+        @register_commission_model("test_flat")
+        class FlatCommission(CommissionModel):
+            def commission(self, quantity, price, month_volume):
+                return 2.0
+
+        try:
+            assert isinstance(get_commission_model("test_flat"), FlatCommission)
+            assert get_commission_model("test_flat").commissions([1, 2], [10.0, 20.0], [0, 1]).tolist() == [2.0, 2.0]
+        finally:
+            del COMMISSION_MODELS["test_flat"]
+
+    @pytest.mark.parametrize("name", list(COMMISSION_MODELS))
+    def test_vectorized_commissions(self, name):
+        rng = np.random.default_rng(0)
+        quantity = rng.integers(1, 10000, 100).astype(np.float64)
+        price = rng.uniform(1, 500, 100)
+        month_volume = rng.uniform(0, 1e7, 100)
+        model = get_commission_model(name)
+        expected = [model.commission(q, p, v) for q, p, v in zip(quantity, price, month_volume)]
+        np.testing.assert_allclose(model.commissions(quantity, price, month_volume), expected, rtol=1e-12)
+
+    @pytest.mark.parametrize("name", list(SLIPPAGE_MODELS))
+    def test_vectorized_slippage(self, name):
+        rng = np.random.default_rng(0)
+        is_buy = rng.random(100) < 0.5
+        price = rng.uniform(90, 110, 100)
+        quantity = rng.integers(1, 10000, 100).astype(np.float64)
+        high = price + rng.uniform(0, 5, 100)
+        low = price - rng.uniform(0, 5, 100)
+        volume = np.where(rng.random(100) < 0.2, np.nan, rng.uniform(1e4, 1e6, 100))
+        model = get_slippage_model(name)
+        expected = [model.slipped_price(*fill) for fill in zip(is_buy, price, quantity, high, low, volume)]
+        result = model.slipped_prices(is_buy, price, quantity, high, low, volume)
+        np.testing.assert_allclose(result, expected, rtol=1e-12)
+        assert (result[is_buy] >= price[is_buy]).all()
+        assert (result[~is_buy] <= price[~is_buy]).all()
+
+    def test_participation_slippage(self):
+        model = get_slippage_model("participation")
+        # Within the cap of a daily bar of 1e6 shares, over the cap of a minute bar of 2500 shares
+        assert model.slipped_price(True, 100.0, 1000, 102.0, 99.0, 1e6) == 100.0
+        assert model.slipped_price(True, 100.0, 1000, 100.5, 99.5, 2500) == pytest.approx(100.375)
+        assert model.slipped_price(False, 100.0, 1000, 100.5, 99.5, 2500) == pytest.approx(99.625)
+        assert model.slipped_price(True, 100.0, 1000, 100.5, 99.5, np.nan) == 100.0
+
+    def test_engine_slippage(self, ohlvc, trade_orders):
+        backtest_engine = BacktestEngine(trade_orders, ohlvc, slippage_model=FixedBpsSlippage(bps=10))
+        backtest_engine.backtest()
+
+        order_book = backtest_engine.order_book
+        filled = order_book[
+            (order_book["status"] == constants.ORDER_STATUS_FILLED) & (order_book["filled_price"] != "")
+        ]
+        market = filled[filled["order_type"] == constants.MARKET_ORDER]
+        assert len(market) > 0
+        opens = [ohlvc.loc[row.filled_date, (row.ticker, "Open")] for row in market.itertuples()]
+        sign = np.where(market["action"] == constants.TRADE_ACTION_BUY, 1, -1)
+        np.testing.assert_allclose(market["filled_price"].astype(float), np.array(opens) * (1 + sign * 0.001))
+
+        # Limit orders are filled at their limit price
+        limit = filled[filled["order_type"] == constants.LIMIT_ORDER]
+        np.testing.assert_array_equal(limit["filled_price"].astype(float), limit["limit_price"])
+
+        trades = pd.concat([stock_entity.trades for stock_entity in backtest_engine.stocks.values()])
+        assert sorted(trades["limit_price"]) == sorted(filled["filled_price"].astype(float))
+        cash_flow = np.where(trades["action"] == constants.TRADE_ACTION_BUY, -1, 1) * trades["limit_price"]
+        expected_capital = 100000.0 + (cash_flow * trades["quantity"]).sum() - trades["fees"].sum()
+        assert backtest_engine.current_capital == pytest.approx(expected_capital)
+
+    def test_ticker_models(self, ohlvc, trade_orders):
+        backtest_engine = BacktestEngine(
+            trade_orders, ohlvc, ticker_fee_models={"AAPL": "zero"}, ticker_slippage_models={"GOOGL": "range"}
+        )
+        backtest_engine.backtest()
+
+        assert (backtest_engine.stocks["AAPL"].trades["fees"] == 0).all()
+        assert (backtest_engine.stocks["GOOGL"].trades["fees"] >= 1).all()
+        fees = [backtest_engine.stocks[ticker].trades["fees"].sum() for ticker in ["GOOGL", "MSFT"]]
+        assert backtest_engine.fees == pytest.approx(sum(fees))
+
+    def test_vectorized_settlement(self, ohlvc, trade_orders, monkeypatch):
+        kwargs = {"fee_model": constants.FEE_MODEL_TIERED, "slippage_model": "volume_share"}
+        expected = BacktestEngine(trade_orders, ohlvc, **kwargs)
+        expected.backtest()
+
+        monkeypatch.setattr(BacktestEngine, "VECTORIZE_MIN_FILLS", 1)
+        result = BacktestEngine(trade_orders, ohlvc, **kwargs)
+        result.backtest()
+        assert_same_results(expected, result)
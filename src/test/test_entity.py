@@ -1,7 +1,7 @@
 import pandas as pd
 import pytest
 
-from src.entity import StockEntity, Trade
+from src.entity import StockEntity, Trade, TradeLedger
 
 
 class TestEntity:
@@ -163,3 +163,87 @@ class TestEntity:
 
     def test_stock_entity_get_historical_records(self, stock_entity):
         assert isinstance(stock_entity.get_historical_records(), pd.DataFrame)
+
+    def test_stock_entity_position_tracks_trades(self):
+        stock_entity = StockEntity(symbol="AAPL")
+        for action, quantity in [("Buy", 10), ("Buy", 5), ("Sell", 20)]:
+            stock_entity.market_order(
+                Trade(
+                    date="2020-01-01 00:00:00",
+                    symbol="AAPL",
+                    order_type="Market",
+                    action=action,
+                    limit_price=100,
+                    quantity=quantity,
+                    fees=1,
+                )
+            )
+        assert stock_entity.position == -5
+
+    def test_stock_entity_update_holding_records(self):
+        stock_entity = StockEntity(symbol="AAPL")
+        stock_entity.initialize_holding_records(2)
+        dates = pd.bdate_range("2020-01-01", periods=4)
+        prices = [100.0, 110.0, 99.0, 88.0]
+        actions = [("Buy", 10), None, ("Sell", 20), None]
+
+        for date, price, trade in zip(dates, prices, actions):
+            if trade is not None:
+                stock_entity.market_order(
+                    Trade(
+                        date=str(date),
+                        symbol="AAPL",
+                        order_type="Market",
+                        action=trade[0],
+                        limit_price=price,
+                        quantity=trade[1],
+                        fees=1,
+                    )
+                )
+            stock_entity.update_holding_records(timestamp=date, price=price)
+
+        holding_records = stock_entity.holding_records
+        assert list(holding_records.index) == list(dates)
+        assert holding_records["quantity"].tolist() == [10, 10, -10, -10]
+        assert holding_records["portfolio_value"].tolist() == [1000, 1100, -990, -880]
+        assert holding_records["daily_returns"].tolist() == pytest.approx([0.0, 0.1, 1.9, 1 / 9])
+
+    def test_trade_ledger(self):
+        trade_ledger = TradeLedger(capacity=1)
+        for i in range(5):
+            trade_ledger.append(
+                Trade(
+                    date=f"2020-01-0{i + 1} 00:00:00",
+                    symbol="AAPL",
+                    order_type="Market" if i % 2 else "Limit",
+                    action="Buy",
+                    limit_price=100.0 + i,
+                    quantity=10.0,
+                    fees=1.0,
+                )
+            )
+
+        trades = trade_ledger.to_dataframe()
+        assert len(trade_ledger) == 5
+        assert trade_ledger.values["order_type"] == ["Limit", "Market"]
+        assert list(trades.columns) == TradeLedger.COLUMNS
+        assert trades["date"].iloc[-1] == "2020-01-05 00:00:00"
+        assert trades["order_type"].tolist() == ["Limit", "Market", "Limit", "Market", "Limit"]
+        assert trades["limit_price"].tolist() == [100.0, 101.0, 102.0, 103.0, 104.0]
+
+    def test_stock_entity_trades_cache(self):
+        stock_entity = StockEntity(symbol="AAPL")
+        assert stock_entity.trades.empty
+        trade = Trade(
+            date="2020-01-01 00:00:00",
+            symbol="AAPL",
+            order_type="Market",
+            action="Buy",
+            limit_price=100,
+            quantity=10,
+            fees=1,
+        )
+        stock_entity.market_order(trade)
+        assert stock_entity.trades is stock_entity.trades
+        stock_entity.market_order(trade)
+        assert len(stock_entity.trades) == 2
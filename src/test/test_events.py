@@ -0,0 +1,83 @@
+import numpy as np
+
+from src import constants
+from src.backtest_engine import BacktestEngine
+from src.events import EventStream, NavEvent, OrderEvent, PositionEvent
+from src.test.helpers import assert_same_results, run_backtest
+
+
+class TestEvents:
+    def test_events_match_results(self, ohlvc, trade_orders, engine_kwargs):
+        batches = []
+        event_stream = EventStream(batch_size=50, subscribers=[batches.append])
+        backtest_engine = run_backtest(
+            trade_orders, ohlvc, show_progress=False, event_stream=event_stream, **engine_kwargs
+        )
+        assert_same_results(run_backtest(trade_orders, ohlvc, show_progress=False, **engine_kwargs), backtest_engine)
+        events = [event for batch in batches for event in batch]
+
+        # Every order closed during the run is reported once, with its final status
+        order_book = backtest_engine.order_book.reset_index(drop=True)
+        order_events = [event for event in events if isinstance(event, OrderEvent)]
+        closed = {event.row: event for event in order_events if event.kind != constants.EVENT_ORDER_ACTIVATED}
+        terminal = [constants.ORDER_STATUS_FILLED, constants.ORDER_STATUS_CANCELLED, constants.ORDER_STATUS_EXPIRED]
+        assert sorted(closed) == order_book.index[order_book["status"].isin(terminal)].tolist()
+        for row, event in closed.items():
+            is_stop = order_book.loc[row, "order_type"] in constants.STOP_LOST_TRIGGERS
+            filled = constants.EVENT_ORDER_TRIGGERED if is_stop else constants.EVENT_ORDER_FILLED
+            expected = {
+                constants.ORDER_STATUS_FILLED: filled,
+                constants.ORDER_STATUS_CANCELLED: constants.EVENT_ORDER_CANCELLED,
+                constants.ORDER_STATUS_EXPIRED: constants.EVENT_ORDER_EXPIRED,
+            }[order_book.loc[row, "status"]]
+            assert event.kind == expected
+            assert event.timestamp == order_book.loc[row, "filled_date"]
+            if event.kind == constants.EVENT_ORDER_FILLED:
+                assert event.price == order_book.loc[row, "filled_price"]
+
+        # Filled orders were activated before, or on the bar they filled
+        activated = {}
+        for i, event in enumerate(order_events):
+            if event.kind == constants.EVENT_ORDER_ACTIVATED:
+                activated.setdefault(event.row, i)
+        for i, event in enumerate(order_events):
+            if event.kind in [constants.EVENT_ORDER_FILLED, constants.EVENT_ORDER_TRIGGERED]:
+                assert activated[event.row] < i
+
+        positions = {event.ticker: event.quantity for event in events if isinstance(event, PositionEvent)}
+        stocks = backtest_engine.stocks
+        assert positions == {ticker: stocks[ticker].position for ticker in positions}
+
+        nav = [event.nav for event in events if isinstance(event, NavEvent)]
+        np.testing.assert_allclose(nav, backtest_engine.analytics.nav.to_numpy())
+
+    def test_backtest_events(self, ohlvc, trade_orders):
+        subscribed = []
+        event_stream = EventStream(subscribers=[subscribed.extend])
+        run_backtest(trade_orders, ohlvc, show_progress=False, event_stream=event_stream)
+
+        generated = []
+        backtest_engine = BacktestEngine(trade_orders, ohlvc, show_progress=False)
+        for batch in backtest_engine.backtest_events(EventStream(batch_size=20, nav_every=10)):
+            assert len(batch) > 0
+            generated.extend(batch)
+
+        assert [event for event in generated if not isinstance(event, NavEvent)] == [
+            event for event in subscribed if not isinstance(event, NavEvent)
+        ]
+        assert len([event for event in generated if isinstance(event, NavEvent)]) == 15
+        assert_same_results(run_backtest(trade_orders, ohlvc, show_progress=False), backtest_engine)
+
+    def test_max_drawdown(self, ohlvc, trade_orders):
+        full = run_backtest(trade_orders, ohlvc, show_progress=False)
+        drawdown = full.analytics.drawdown.to_numpy()
+        threshold = -drawdown.min() / 2
+        stop_bar = int(np.argmax(drawdown <= -threshold))
+
+        events = []
+        event_stream = EventStream(max_drawdown=threshold, subscribers=[events.extend])
+        backtest_engine = run_backtest(trade_orders, ohlvc, show_progress=False, event_stream=event_stream)
+        nav_events = [event for event in events if isinstance(event, NavEvent)]
+        assert len(nav_events) == stop_bar + 1
+        assert nav_events[-1].drawdown <= -threshold
+        assert len(backtest_engine.combined_holding_records) == stop_bar + 1
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pytest
+
+from src import constants
+from src.export import orders_table, read_results
+from src.sweep import run_sweep
+from src.synthetic import generate_ohlcv
+from src.test.helpers import make_trade_orders, run_backtest
+
+
+class TestExport:
+    @pytest.fixture
+    def ohlvc(self):
+        return generate_ohlcv(["AAPL", "GOOGL", "MSFT"], 120, seed=0)
+
+    @pytest.fixture
+    def backtest_engine(self, ohlvc):
+        return run_backtest(make_trade_orders(ohlvc, groups=40, seed=0), ohlvc, show_progress=False)
+
+    @pytest.mark.parametrize("export_format", ["parquet", "arrow"])
+    def test_matches_results(self, backtest_engine, tmp_path, export_format):
+        backtest_engine.export_results(str(tmp_path), run_id="a", export_format=export_format)
+
+        orders = read_results(str(tmp_path), "orders", export_format).to_table().to_pandas()
+        assert set(orders["run_id"]) == {"a"}
+        expected = backtest_engine.order_book.set_index("order_id", append=True)
+        orders = orders.sort_values("order_date", kind="stable")
+        for ticker, rows in orders.groupby("ticker", observed=True):
+            expected_rows = expected[expected["ticker"] == ticker].sort_values("order_date", kind="stable")
+            assert rows["order_id"].tolist() == expected_rows.index.get_level_values("order_id").tolist()
+            assert rows["status"].astype(object).fillna("").tolist() == expected_rows["status"].tolist()
+            filled = expected_rows["filled_date"] != ""
+            assert rows["filled_date"].isna().tolist() == (~filled).tolist()
+            np.testing.assert_array_equal(
+                rows["filled_date"][filled.to_numpy()], pd.to_datetime(expected_rows["filled_date"][filled])
+            )
+            # Cancelled and expired orders are dated but have no price
+            priced = (expected_rows["filled_price"] != "").to_numpy()
+            assert rows["filled_price"].isna().tolist() == (~priced).tolist()
+            np.testing.assert_array_equal(
+                rows["filled_price"][priced], expected_rows["filled_price"][priced].astype(float)
+            )
+        assert orders["filled_date"].dtype == "datetime64[ns]"
+        assert orders["filled_price"].dtype == np.float64
+
+        trades = read_results(str(tmp_path), "trades", export_format).to_table(filter=pc.field("ticker") == "AAPL")
+        aapl = backtest_engine.stocks["AAPL"]
+        np.testing.assert_array_equal(trades["fees"].to_numpy(), aapl.trades["fees"])
+        assert trades["action"].to_pylist() == aapl.trades["action"].tolist()
+        assert pd.DatetimeIndex(trades["date"].to_numpy()).equals(pd.DatetimeIndex(aapl.trades["date"]))
+
+        holdings = read_results(str(tmp_path), "holdings", export_format).to_table(filter=pc.field("ticker") == "AAPL")
+        np.testing.assert_array_equal(holdings["portfolio_value"].to_numpy(), aapl.holding_records["portfolio_value"])
+
+        portfolio = read_results(str(tmp_path), "portfolio", export_format).to_table()
+        expected = backtest_engine.combined_holding_records["Portfolio"]
+        np.testing.assert_array_equal(portfolio["portfolio_value"].to_numpy(), expected["portfolio_value"])
+        assert portfolio["returns"].null_count == 1
+
+    def test_zero_copy(self, backtest_engine):
+        table = orders_table(backtest_engine)
+        book = backtest_engine.book
+        assert table["quantity"].chunk(0).buffers()[1].address == book.quantity.ctypes.data
+        assert table["order_date"].chunk(0).buffers()[1].address == book.order_date.ctypes.data
+        assert table["status"].type == pa.dictionary(pa.int8(), pa.string())
+
+    def test_sweep_dataset(self, ohlvc, tmp_path):
+        order_books = [make_trade_orders(ohlvc, groups=10, seed=seed) for seed in range(3)]
+        results = run_sweep(ohlvc, order_books, max_workers=0, results_dir=str(tmp_path))
+
+        # One scan over the portfolio records of every run
+        portfolio = results.dataset("portfolio").to_table().to_pandas()
+        final_nav = portfolio.sort_values("date").groupby("run_id", observed=True).tail(1).set_index("run_id")["portfolio_value"]
+        np.testing.assert_array_equal(final_nav.sort_index().to_numpy(), results.summary["final_nav"].to_numpy())
+
+        filled = results.dataset("orders").to_table(filter=pc.field("status") == constants.ORDER_STATUS_FILLED)
+        assert pc.value_counts(filled["run_id"]).to_pylist()
+        assert filled.num_rows == results.summary["trades"].sum()
@@ -0,0 +1,307 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import constants
+from src.backtest_engine import BacktestEngine
+from src.report import TearDownReport
+from src.synthetic import generate_ohlcv, intraday_index
+from src.test.helpers import assert_same_results, make_trade_orders, run_backtest
+
+
+class TestFillModes:
+    @pytest.mark.parametrize("seed", [0, 1, 2, 3, 4])
+    @pytest.mark.parametrize(
+        "kwargs",
+        [
+            {"fill_mode": constants.FILL_MODE_BATCHED},
+            {"fill_mode": constants.FILL_MODE_SEQUENTIAL, "skip_idle_bars": True},
+            {"fill_mode": constants.FILL_MODE_BATCHED, "skip_idle_bars": True},
+        ],
+    )
+    def test_matches_sequential(self, seed, kwargs):
+        ohlvc = generate_ohlcv(["AAPL", "GOOGL", "MSFT"], 150, seed=seed)
+        trade_orders = make_trade_orders(ohlvc, groups=60, seed=seed)
+
+        sequential = run_backtest(trade_orders, ohlvc, fill_mode=constants.FILL_MODE_SEQUENTIAL)
+        result = run_backtest(trade_orders, ohlvc, **kwargs)
+
+        assert (sequential.order_book["status"] == constants.ORDER_STATUS_FILLED).any()
+        assert_same_results(sequential, result)
+
+    def test_skip_idle_bars(self, monkeypatch):
+        ohlvc = generate_ohlcv(["AAPL", "GOOGL"], 1000, seed=0)
+        trade_orders = make_trade_orders(ohlvc, groups=5, seed=0)
+        trade_orders = trade_orders[~trade_orders["order_type"].str.startswith("Trailing")]
+
+        backtest_engine = BacktestEngine(
+            trade_orders, ohlvc, fill_mode=constants.FILL_MODE_BATCHED, skip_idle_bars=True
+        )
+        processed_bars = []
+        process_orders = backtest_engine.process_orders
+
+        def record_bar(bar, current_timestamp):
+            processed_bars.append(bar)
+            process_orders(bar, current_timestamp)
+
+        monkeypatch.setattr(backtest_engine, "process_orders", record_bar)
+        backtest_engine.backtest()
+
+        assert len(processed_bars) < 50
+        assert len(backtest_engine.combined_holding_records) == 1000
+        assert_same_results(run_backtest(trade_orders, ohlvc), backtest_engine)
+
+    @pytest.mark.parametrize("skip_idle_bars", [False, True])
+    def test_trailing_stop_processed_on_trigger_bar(self, monkeypatch, skip_idle_bars):
+        ohlvc = generate_ohlcv(["AAPL"], 300, seed=0)
+        close = ohlvc[("AAPL", "Close")]
+        # Buy on the first bar, the trailing stop follows the High 10 below and triggers once the Low drops to it
+        trade_orders = pd.DataFrame(
+            {
+                "order_id": ["TRAIL_1", "TRAIL_1"],
+                "attached_order": [False, True],
+                "order_date": [ohlvc.index[0], pd.NaT],
+                "ticker": ["AAPL", "AAPL"],
+                "order_type": [constants.MARKET_ORDER, constants.TRAILING_STOP_ORDER],
+                "action": [constants.TRADE_ACTION_BUY, constants.TRADE_ACTION_SELL],
+                "limit_price": [np.nan, close.iloc[0] - 10],
+                "stop_price": [0.0, close.iloc[0] - 10],
+                "quantity": [10.0, 10.0],
+                "trail_type": ["N.A.", constants.TRAIL_TYPE_VALUE],
+                "trail": [0.0, 10.0],
+                "time_in_force": [constants.TIME_IN_FORCE_DAY, constants.TIME_IN_FORCE_GTC],
+            }
+        )
+        sequential = run_backtest(trade_orders, ohlvc)
+        # Parent, trailing stop and the limit order created when it triggers
+        assert sequential.order_book["status"].tolist() == [constants.ORDER_STATUS_FILLED] * 3
+        trigger_bar = ohlvc.index.get_loc(sequential.order_book["filled_date"].iloc[1])
+
+        backtest_engine = BacktestEngine(
+            trade_orders, ohlvc, fill_mode=constants.FILL_MODE_BATCHED, skip_idle_bars=skip_idle_bars
+        )
+        processed_bars = []
+        process_order = backtest_engine.process_order
+
+        def record_bar(idx, bar, current_timestamp, active_orders):
+            if idx == 1:
+                processed_bars.append(bar)
+            process_order(idx, bar, current_timestamp, active_orders)
+
+        monkeypatch.setattr(backtest_engine, "process_order", record_bar)
+        backtest_engine.backtest()
+
+        # Processed on the bar it is activated on, then only on the trigger bar of its stop path
+        assert processed_bars == [0, trigger_bar]
+        assert trigger_bar > 10
+        assert_same_results(sequential, backtest_engine)
+
+    def test_select_orders_to_process(self):
+        ohlvc = generate_ohlcv(["AAPL"], 5, seed=0)
+        low_price = ohlvc[("AAPL", "Low")].iloc[0]
+        trade_orders = pd.DataFrame(
+            {
+                "order_id": ["REST_1", "FILL_1", "DAY_1"],
+                "attached_order": [False, False, False],
+                "order_date": [ohlvc.index[0]] * 3,
+                "ticker": ["AAPL"] * 3,
+                "order_type": [constants.LIMIT_ORDER] * 3,
+                "action": [constants.TRADE_ACTION_BUY] * 3,
+                "limit_price": [1.0, low_price, 1.0],
+                "quantity": [10.0] * 3,
+                "time_in_force": [
+                    constants.TIME_IN_FORCE_GTC,
+                    constants.TIME_IN_FORCE_GTC,
+                    constants.TIME_IN_FORCE_DAY,
+                ],
+            }
+        )
+        backtest_engine = BacktestEngine(trade_orders, ohlvc, fill_mode=constants.FILL_MODE_BATCHED)
+        backtest_engine.backtest()
+
+        # The resting GTC order is never selected, the Day order is cancelled on its first bar
+        assert backtest_engine.order_book["status"].tolist() == [
+            "",
+            constants.ORDER_STATUS_FILLED,
+            constants.ORDER_STATUS_CANCELLED,
+        ]
+        rows = backtest_engine.book.active_rows(ohlvc.index[-1].value)
+        assert rows.tolist() == [0]
+        assert backtest_engine.select_orders_to_process(rows, bar=4).tolist() == []
+
+
+class TestOcoGroups:
+    @pytest.fixture
+    def ohlvc(self):
+        index = pd.bdate_range("2022-01-03", periods=3)
+        df = pd.DataFrame(
+            {
+                "Open": [100.0, 100.0, 95.0],
+                "High": [101.0, 106.0, 96.0],
+                "Low": [99.0, 99.0, 79.0],
+                "Close": [100.0, 100.0, 85.0],
+                "Adj Close": [100.0, 100.0, 85.0],
+                "Volume": 1e6,
+            },
+            index=index,
+        )
+        df.columns = pd.MultiIndex.from_product([["AAPL"], df.columns])
+        return df
+
+    @pytest.mark.parametrize("fill_mode", [constants.FILL_MODE_SEQUENTIAL, constants.FILL_MODE_BATCHED])
+    def test_fill_cancels_only_its_group(self, ohlvc, fill_mode):
+        # Buy 100, then two brackets of 50 shares: take profit 105 / stop 90 and take profit 120 / stop 80
+        trade_orders = pd.DataFrame(
+            {
+                "order_id": ["BRACKET_1"] * 5,
+                "attached_order": [False, True, True, True, True],
+                "order_date": [ohlvc.index[0]] + [pd.NaT] * 4,
+                "ticker": ["AAPL"] * 5,
+                "order_type": [
+                    constants.MARKET_ORDER,
+                    constants.LIMIT_ORDER,
+                    constants.STOP_ORDER,
+                    constants.LIMIT_ORDER,
+                    constants.STOP_ORDER,
+                ],
+                "action": [constants.TRADE_ACTION_BUY] + [constants.TRADE_ACTION_SELL] * 4,
+                "limit_price": [np.nan, 105.0, 90.0, 120.0, 80.0],
+                "stop_price": [0.0, 0.0, 90.0, 0.0, 80.0],
+                "quantity": [100.0, 50.0, 50.0, 50.0, 50.0],
+                "time_in_force": [constants.TIME_IN_FORCE_DAY] + [constants.TIME_IN_FORCE_GTC] * 4,
+                "oco_group": ["", "A", "A", "B", "B"],
+            }
+        )
+        backtest_engine = run_backtest(trade_orders, ohlvc, fill_mode=fill_mode)
+        order_book = backtest_engine.order_book
+
+        assert order_book["status"].tolist() == [
+            constants.ORDER_STATUS_FILLED,
+            constants.ORDER_STATUS_FILLED,  # Take profit of A on the second bar
+            constants.ORDER_STATUS_CANCELLED,
+            constants.ORDER_STATUS_CANCELLED,  # Cancelled by the stop of B on the third bar
+            constants.ORDER_STATUS_FILLED,
+            constants.ORDER_STATUS_FILLED,  # Limit order created by the stop of B, it inherits its oco_group
+        ]
+        assert order_book["comments"].iloc[2] == "Attached Order Cancelled"
+        assert order_book["oco_group"].tolist() == ["", "A", "A", "B", "B", "B"]
+        assert backtest_engine.stocks["AAPL"].trades["quantity"].sum() == 200.0
+
+    def test_without_oco_group_every_attached_order_cancels_the_others(self, ohlvc):
+        trade_orders = pd.DataFrame(
+            {
+                "order_id": ["BRACKET_1"] * 3,
+                "attached_order": [False, True, True],
+                "order_date": [ohlvc.index[0], pd.NaT, pd.NaT],
+                "ticker": ["AAPL"] * 3,
+                "order_type": [constants.MARKET_ORDER, constants.LIMIT_ORDER, constants.LIMIT_ORDER],
+                "action": [constants.TRADE_ACTION_BUY, constants.TRADE_ACTION_SELL, constants.TRADE_ACTION_SELL],
+                "limit_price": [np.nan, 105.0, 120.0],
+                "quantity": [100.0, 100.0, 100.0],
+                "time_in_force": [constants.TIME_IN_FORCE_DAY] + [constants.TIME_IN_FORCE_GTC] * 2,
+            }
+        )
+        order_book = run_backtest(trade_orders, ohlvc).order_book
+
+        assert order_book["status"].tolist() == [
+            constants.ORDER_STATUS_FILLED,
+            constants.ORDER_STATUS_FILLED,
+            constants.ORDER_STATUS_CANCELLED,
+        ]
+        assert "oco_group" not in order_book.columns
+
+
+class TestIntraday:
+    @pytest.fixture
+    def ohlvc(self):
+        # Two sessions of 5 minute bars
+        index = intraday_index(2, freq="5min")
+        return generate_ohlcv(["AAPL"], len(index), seed=0, index=index)
+
+    def make_order(self, ohlvc, **kwargs):
+        order = {
+            "order_id": "ORDER_1",
+            "attached_order": False,
+            "order_date": ohlvc.index[0],
+            "ticker": "AAPL",
+            "order_type": constants.LIMIT_ORDER,
+            "action": constants.TRADE_ACTION_BUY,
+            "limit_price": 1.0,
+            "quantity": 10.0,
+            "time_in_force": constants.TIME_IN_FORCE_DAY,
+        }
+        order.update(kwargs)
+        return order
+
+    @pytest.mark.parametrize(
+        "kwargs",
+        [
+            {"fill_mode": constants.FILL_MODE_SEQUENTIAL},
+            {"fill_mode": constants.FILL_MODE_BATCHED},
+            {"fill_mode": constants.FILL_MODE_BATCHED, "skip_idle_bars": True},
+        ],
+    )
+    def test_day_orders_rest_until_the_end_of_the_session(self, ohlvc, kwargs):
+        low = ohlvc[("AAPL", "Low")].to_numpy()
+        # First new low after the fifth bar
+        fill_bar = next(bar for bar in range(5, len(low)) if low[bar] < low[:bar].min())
+        # Reached within the first session, never reached, and the exit of a position bought at the open that
+        # expires with the session
+        trade_orders = pd.DataFrame(
+            [
+                self.make_order(ohlvc, order_id="FILLED", limit_price=low[fill_bar]),
+                self.make_order(ohlvc, order_id="CANCELLED"),
+                self.make_order(ohlvc, order_id="EXPIRED", order_type=constants.MARKET_ORDER, limit_price=np.nan),
+                self.make_order(
+                    ohlvc, order_id="EXPIRED", attached_order=True, order_date=pd.NaT, action=constants.TRADE_ACTION_SELL
+                ),
+            ]
+        )
+        order_book = run_backtest(trade_orders, ohlvc, **kwargs).order_book
+        session_end = ohlvc.index[ohlvc.index.normalize() == ohlvc.index[0].normalize()][-1]
+
+        assert order_book["status"].tolist() == [
+            constants.ORDER_STATUS_FILLED,
+            constants.ORDER_STATUS_CANCELLED,
+            constants.ORDER_STATUS_FILLED,
+            constants.ORDER_STATUS_EXPIRED,
+        ]
+        assert ohlvc.index[fill_bar] < session_end
+        assert order_book["filled_date"].tolist() == [
+            ohlvc.index[fill_bar],
+            session_end,
+            ohlvc.index[0],
+            ohlvc.index[ohlvc.index > session_end][0],
+        ]
+
+    def test_session_start(self):
+        # Overnight sessions from 18:00 to 17:00 the next day
+        index = pd.date_range("2022-01-02 18:00", "2022-01-04 17:00", freq="1h")
+        index = index[index.hour != 17]
+        ohlvc = generate_ohlcv(["ES"], len(index), seed=0, index=index)
+        trade_orders = pd.DataFrame([self.make_order(ohlvc, ticker="ES")])
+
+        backtest_engine = run_backtest(trade_orders, ohlvc, session_start="18:00:00")
+        assert backtest_engine.order_book["filled_date"].iloc[0] == pd.Timestamp("2022-01-03 16:00")
+        assert backtest_engine.session_end[0] == 22
+
+    def test_session_records(self, ohlvc):
+        trade_orders = pd.DataFrame([self.make_order(ohlvc, order_type=constants.MARKET_ORDER, limit_price=np.nan)])
+        backtest_engine = run_backtest(trade_orders, ohlvc, skip_idle_bars=True)
+
+        # Every bar is recorded, the daily view holds the last bar of every session
+        every_bar = backtest_engine.combined_holding_records
+        assert len(every_bar) == len(ohlvc)
+        sessions = backtest_engine.session_holding_records
+        last_bars = every_bar.groupby(ohlvc.index.normalize()).tail(1)
+        assert len(sessions) == 2
+        pd.testing.assert_frame_equal(
+            sessions.drop(columns=[("Portfolio", "returns")]),
+            last_bars.drop(columns=[("Portfolio", "returns")]),
+            check_freq=False,
+            check_names=False,
+        )
+        nav = last_bars[("Portfolio", "portfolio_value")]
+        assert sessions[("Portfolio", "returns")].iloc[1] == pytest.approx(nav.iloc[1] / nav.iloc[0] - 1)
+        assert len(backtest_engine.session_analytics) == 2
+        assert backtest_engine.session_analytics.returns.equals(TearDownReport.from_engine(backtest_engine).returns)
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import constants
+from src.backtest_engine import BacktestEngine
+from src.ibkr_fees import (
+    calculate_ibkr_fixed_cost,
+    calculate_ibkr_fixed_costs,
+    calculate_ibkr_tiered_cost,
+    calculate_ibkr_tiered_costs,
+    monthly_volume_before,
+)
+from src.synthetic import generate_ohlcv
+from src.test.helpers import make_trade_orders
+
+
+class TestIBKRFees:
+    @pytest.mark.parametrize(
+        "current_month_vol, qty, price, expected",
+        [
+            (0, 100, 50.0, 0.825951944),
+            (299990, 100, 20.0, 0.742490228),
+            (2999000, 5000, 10.0, 26.2334828),
+            (99999999, 10, 100.0, 0.4115054804),
+            (0, 0, 10.0, 0.35),
+            (5e8, 1000, 3.0, 3.951952556),
+        ],
+    )
+    def test_tiered_cost(self, current_month_vol, qty, price, expected):
+        assert calculate_ibkr_tiered_cost(current_month_vol, qty, price) == pytest.approx(expected, rel=1e-12)
+        assert calculate_ibkr_tiered_costs([current_month_vol], [qty], [price])[0] == pytest.approx(
+            expected, rel=1e-12
+        )
+
+    def test_vectorized_costs(self):
+        rng = np.random.default_rng(0)
+        qty = rng.integers(1, 100000, 1000).astype(np.float64)
+        price = rng.uniform(0.1, 500, 1000)
+        current_month_vol = rng.uniform(0, 2e8, 1000)
+
+        expected = [calculate_ibkr_fixed_cost(q, p) for q, p in zip(qty, price)]
+        np.testing.assert_array_equal(calculate_ibkr_fixed_costs(qty, price), expected)
+
+        expected = [calculate_ibkr_tiered_cost(v, q, p) for v, q, p in zip(current_month_vol, qty, price)]
+        np.testing.assert_allclose(calculate_ibkr_tiered_costs(current_month_vol, qty, price), expected, rtol=1e-12)
+
+    def test_monthly_volume_before(self):
+        dates = pd.to_datetime(["2022-01-03", "2022-01-10", "2022-02-01", "2022-02-02", "2022-02-03", "2022-03-05"])
+        result = monthly_volume_before(dates.values, [1, 2, 3, 4, 5, 6])
+        assert result.tolist() == [0, 1, 0, 3, 7, 0]
+
+    def test_engine_tiered_fees(self):
+        ohlvc = generate_ohlcv(["AAPL", "GOOGL"], 150, seed=0)
+        trade_orders = make_trade_orders(ohlvc, groups=60, seed=0)
+        trade_orders["quantity"] *= 10000
+        backtest_engine = BacktestEngine(trade_orders, ohlvc, fee_model=constants.FEE_MODEL_TIERED)
+        backtest_engine.backtest()
+
+        trades = pd.concat([stock_entity.trades for stock_entity in backtest_engine.stocks.values()])
+        trades = trades.sort_values("date", kind="stable")
+        assert trades["date"].str[:7].nunique() > 1
+        assert backtest_engine.monthly_volume > 300000
+
+        # Fees are charged once per fill, with the monthly volume of the fills before it
+        assert backtest_engine.fees == pytest.approx(trades["fees"].sum())
+        dates = pd.to_datetime(trades["date"]).values
+        expected = calculate_ibkr_tiered_costs(
+            monthly_volume_before(dates, trades["quantity"]), trades["quantity"], trades["limit_price"]
+        )
+        assert backtest_engine.fees == pytest.approx(expected.sum())
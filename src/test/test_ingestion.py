@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import constants
+from src.backtest_engine import BacktestEngine
+from src.ingestion import OrderBookValidationError, read_order_book, validate_order_book
+from src.synthetic import generate_ohlcv
+from src.test.helpers import make_trade_orders
+
+DEMO_ORDER_BOOK = "src/data_store/order_input/aapl_demo_trade_order_v2.csv"
+
+
+class TestIngestion:
+    @pytest.fixture
+    def trade_orders(self):
+        return make_trade_orders(generate_ohlcv(["AAPL", "GOOGL"], 60, seed=0), groups=20, seed=0)
+
+    @pytest.mark.parametrize("extension", ["csv", "parquet"])
+    def test_read_order_book(self, tmp_path, extension):
+        expected = read_order_book(DEMO_ORDER_BOOK)
+        if extension == "parquet":
+            pytest.importorskip("pyarrow")
+            path = str(tmp_path / "orders.parquet")
+            pd.read_csv(DEMO_ORDER_BOOK).to_parquet(path)
+            order_book = read_order_book(path)
+            pd.testing.assert_frame_equal(order_book, expected)
+        else:
+            order_book = expected
+
+        assert order_book["attached_order"].dtype == bool
+        assert order_book["order_date"].dtype == "datetime64[ns]"
+        assert order_book["quantity"].dtype == np.float64
+        # Missing values are filled after validation
+        assert not order_book[["limit_price", "limit_offset", "stop_price", "trail"]].isna().any().any()
+        assert (order_book.loc[~order_book["attached_order"], "trail_type"] == "N.A.").all()
+
+    def test_valid(self, trade_orders):
+        validate_order_book(trade_orders)
+
+    def test_invalid(self, trade_orders):
+        trade_orders.loc[0, "order_type"] = "Market Order"
+        trade_orders.loc[1, "action"] = "Hold"
+        trailing = trade_orders.index[trade_orders["order_type"] == constants.TRAILING_STOP_ORDER]
+        trade_orders.loc[trailing[0], "trail"] = np.nan
+        trade_orders.loc[trailing[1], "trail_type"] = "N.A."
+        orphan = trade_orders.index[trade_orders["attached_order"]][-1]
+        trade_orders.loc[orphan, "order_id"] = "NO_PARENT"
+        trade_orders.loc[2, "quantity"] = 0.0
+
+        with pytest.raises(OrderBookValidationError) as error:
+            validate_order_book(trade_orders)
+        problems = error.value.problems
+        assert problems[0] == "1 orders with an unknown order_type, e.g. rows [0]: ['Market Order']"
+        assert problems[1] == "1 orders with an unknown action, e.g. rows [1]: ['Hold']"
+        assert problems[2] == f"1 orders trailing stop orders with an unknown trail_type, e.g. rows [{trailing[1]}]"
+        assert problems[3] == f"1 orders trailing stop orders without a trail, e.g. rows [{trailing[0]}]"
+        assert problems[4] == f"1 orders attached to an order_id without an unattached order, e.g. rows [{orphan}]"
+        assert problems[5] == "1 orders without a positive quantity, e.g. rows [2]"
+
+    def test_engine_fails_fast(self, trade_orders):
+        ohlvc = generate_ohlcv(["AAPL", "GOOGL"], 60, seed=0)
+        trade_orders = trade_orders.drop(columns="time_in_force")
+        with pytest.raises(OrderBookValidationError, match=r"missing columns \['time_in_force'\]"):
+            BacktestEngine(order_book=trade_orders, ohlvc=ohlvc)
@@ -0,0 +1,54 @@
+import json
+
+from src import constants
+from src.backtest_engine import BacktestEngine
+from src.instrumentation import Profiler
+from src.synthetic import generate_ohlcv
+from src.test.helpers import assert_same_results, make_trade_orders, run_backtest
+
+
+class TestInstrumentation:
+    def test_profiler(self, tmp_path):
+        ohlvc = generate_ohlcv(["AAPL", "GOOGL"], 100, seed=0)
+        trade_orders = make_trade_orders(ohlvc, groups=30, seed=0)
+        profiler = Profiler(trace=True)
+        backtest_engine = BacktestEngine(trade_orders, ohlvc, profiler=profiler)
+        backtest_engine.backtest()
+
+        assert_same_results(run_backtest(trade_orders, ohlvc), backtest_engine)
+
+        summary = profiler.summary()
+        assert summary.loc[("backtest", "select_active_orders"), "calls"] == 100
+        assert summary.loc[("backtest", "update_records"), "calls"] == 100
+        assert summary.loc[("backtest", "combine_holding_records"), "calls"] == 1
+        assert ("fill", constants.LIMIT_ORDER) in summary.index
+        filled = (backtest_engine.order_book["status"] == constants.ORDER_STATUS_FILLED).sum()
+        assert summary.loc[("backtest", "update_capital"), "calls"] == filled - (
+            backtest_engine.order_book["order_type"].isin(constants.STOP_LOST_TRIGGERS)
+            & (backtest_engine.order_book["status"] == constants.ORDER_STATUS_FILLED)
+        ).sum()
+
+        counts, edges = profiler.bar_histogram(bins=5)
+        assert counts.sum() == 100
+        assert len(profiler.slowest_bars(3)) == 3
+
+        trace_path = tmp_path / "trace.json"
+        profiler.dump(trace_path)
+        with open(trace_path) as f:
+            trace = json.load(f)
+        assert len(trace["traceEvents"]) == summary["calls"].sum()
+        assert trace["traceEvents"][0]["ph"] == "X"
+        assert trace["otherData"]["bars"]["processed"] == 100
+
+    def test_skip_idle_bars(self):
+        ohlvc = generate_ohlcv(["AAPL"], 200, seed=0)
+        trade_orders = make_trade_orders(ohlvc, groups=3, seed=0)
+        profiler = Profiler()
+        backtest_engine = BacktestEngine(
+            trade_orders, ohlvc, fill_mode=constants.FILL_MODE_BATCHED, skip_idle_bars=True, profiler=profiler
+        )
+        backtest_engine.backtest()
+
+        assert len(profiler.bar_seconds) == profiler.summary().loc[("backtest", "next_event_bar"), "calls"]
+        assert len(profiler.bar_seconds) < 200
+        assert profiler.events == []
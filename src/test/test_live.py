@@ -0,0 +1,113 @@
+import asyncio
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import constants
+from src.backtest_engine import BacktestEngine
+from src.events import EventStream, NavEvent, PositionEvent
+from src.live import FileReplaySource, InProcessFeed, LiveEngine
+from src.synthetic import generate_ohlcv, intraday_index
+from src.test.helpers import assert_same_results, make_trade_orders, run_backtest
+
+
+def replay(trade_orders, ohlvc, closes_session=None, **kwargs):
+    """Push the bars of ohlvc one at a time to an in-process feed while a LiveEngine processes them"""
+    feed = InProcessFeed(maxsize=1)
+    events = []
+
+    async def on_event(event):
+        events.append(event)
+
+    async def produce():
+        for i in range(len(ohlvc)):
+            await feed.put(ohlvc.iloc[i : i + 1], True if closes_session is None else closes_session[i])
+        await feed.close()
+
+    async def main():
+        live_engine = LiveEngine(
+            BacktestEngine(trade_orders, initial_capital=100000.0, show_progress=False, **kwargs),
+            feed,
+            on_event=on_event,
+            latency_budget=1.0,
+        )
+        await asyncio.gather(produce(), live_engine.run())
+        return live_engine
+
+    return asyncio.run(main()), events
+
+
+class TestLive:
+    @pytest.fixture
+    def ohlvc(self):
+        return generate_ohlcv(["AAPL", "GOOGL", "MSFT"], 120, seed=0)
+
+    @pytest.fixture
+    def trade_orders(self, ohlvc):
+        return make_trade_orders(ohlvc, groups=50, seed=0)
+
+    @pytest.mark.parametrize(
+        "kwargs",
+        [
+            {},
+            {"fill_mode": constants.FILL_MODE_BATCHED, "skip_idle_bars": True},
+        ],
+    )
+    def test_matches_backtest(self, ohlvc, trade_orders, kwargs):
+        live_engine, events = replay(trade_orders, ohlvc, **kwargs)
+        expected = run_backtest(trade_orders, ohlvc, show_progress=False, **kwargs)
+        assert_same_results(expected, live_engine.backtest_engine)
+
+        # The same events as the event stream of a backtest, the NAV of one bar at a time up to rounding
+        published = []
+        event_stream = EventStream(subscribers=[published.extend])
+        run_backtest(trade_orders, ohlvc, show_progress=False, event_stream=event_stream, **kwargs)
+        nav = [event.nav for event in events if isinstance(event, NavEvent)]
+        assert [event for event in events if not isinstance(event, NavEvent)] == [
+            event for event in published if not isinstance(event, NavEvent)
+        ]
+        np.testing.assert_allclose(nav, [event.nav for event in published if isinstance(event, NavEvent)])
+        assert len(nav) == len(ohlvc)
+
+        # Fills are linked to their order
+        fills = [event for event in events if getattr(event, "kind", None) == constants.EVENT_ORDER_FILLED]
+        order_ids = expected.order_book["order_id"].tolist()
+        assert len(fills) > 0
+        assert [event.order_id for event in fills] == [order_ids[event.row] for event in fills]
+        positions = {event.ticker: event.quantity for event in events if isinstance(event, PositionEvent)}
+        assert len(positions) > 0
+        assert positions == {ticker: expected.stocks[ticker].position for ticker in positions}
+
+        summary = live_engine.latency_summary()
+        assert summary["bars"] == len(ohlvc)
+        assert 0 < summary["p50"] <= summary["p99"] <= summary["max"]
+        assert summary["over_budget"] == 0
+
+    def test_intraday_sessions(self):
+        # Day orders rest until the bar flagged as the last of the session
+        index = intraday_index(2, freq="30min")
+        ohlvc = generate_ohlcv(["AAPL"], len(index), seed=0, index=index)
+        trade_orders = make_trade_orders(ohlvc, groups=20, seed=0)
+        trade_orders["order_date"] = ohlvc.index[0]
+        session = index.normalize()
+        closes_session = np.append(session[1:] != session[:-1], True)
+
+        live_engine, _ = replay(trade_orders, ohlvc, closes_session=closes_session)
+        assert_same_results(run_backtest(trade_orders, ohlvc, show_progress=False), live_engine.backtest_engine)
+
+    def test_file_replay(self, ohlvc, trade_orders, tmp_path):
+        path = str(tmp_path / "bars.csv")
+        ohlvc.to_csv(path)
+        queue = asyncio.Queue()
+        live_engine = LiveEngine(
+            BacktestEngine(trade_orders, initial_capital=100000.0, show_progress=False),
+            FileReplaySource(path),
+            queue=queue,
+        )
+        backtest_engine = asyncio.run(live_engine.run())
+
+        expected = run_backtest(trade_orders, ohlvc, show_progress=False)
+        assert backtest_engine.current_capital == pytest.approx(expected.current_capital)
+        assert len(backtest_engine.combined_holding_records) == len(ohlvc)
+        assert queue.qsize() > 0
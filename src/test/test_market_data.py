@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.market_data import MarketData
+
+
+class TestMarketData:
+    @pytest.fixture
+    def ohlvc(self):
+        dfs = []
+        for offset, symbol in enumerate(["AAPL", "GOOGL"]):
+            df = pd.DataFrame(
+                {
+                    "Open": [100.0 + offset, 101.0 + offset],
+                    "High": [105.0 + offset, 106.0 + offset],
+                    "Low": [95.0 + offset, 96.0 + offset],
+                    "Close": [102.0 + offset, 103.0 + offset],
+                    "Adj Close": [102.0 + offset, 103.0 + offset],
+                    "Volume": [1000, 2000],
+                },
+                index=pd.to_datetime(["2022-01-03", "2022-01-04"]),
+            )
+            df.columns = pd.MultiIndex.from_product([[symbol], df.columns])
+            dfs.append(df)
+        return pd.concat(dfs, axis=1)
+
+    def test_from_ohlvc(self, ohlvc):
+        market_data = MarketData.from_ohlvc(ohlvc, tickers=["GOOGL", "AAPL"])
+        assert len(market_data) == 2
+        assert market_data.columns == {"GOOGL": 0, "AAPL": 1}
+        assert market_data.high.shape == (2, 2)
+        assert market_data.high.dtype == np.float64
+        assert market_data.high[1, market_data.columns["AAPL"]] == 106.0
+        assert market_data.adj_close[0, market_data.columns["GOOGL"]] == 103.0
+
+    def test_missing_ticker(self, ohlvc):
+        with pytest.raises(ValueError, match="MSFT"):
+            MarketData.from_ohlvc(ohlvc, tickers=["AAPL", "MSFT"])
+
+    def test_missing_field(self, ohlvc):
+        with pytest.raises(ValueError, match="Adj Close"):
+            MarketData.from_ohlvc(ohlvc.drop(columns=[("AAPL", "Adj Close")]))
+
+    def test_single_level_columns(self, ohlvc):
+        with pytest.raises(ValueError):
+            MarketData.from_ohlvc(ohlvc["AAPL"])
+
+    def test_first_bar_search(self):
+        index = pd.bdate_range("2022-01-03", periods=200)
+        high = np.full(200, 110.0)
+        low = np.full(200, 90.0)
+        high[150] = 130.0
+        low[70] = 60.0
+        df = pd.DataFrame({"Open": 100.0, "High": high, "Low": low, "Adj Close": 100.0}, index=index)
+        df.columns = pd.MultiIndex.from_product([["AAPL"], df.columns])
+        market_data = MarketData.from_ohlvc(df)
+
+        assert market_data.first_bar_high_at_or_above(0, 120.0, start=0) == 150
+        assert market_data.first_bar_high_at_or_above(0, 120.0, start=151) == 200
+        assert market_data.first_bar_low_at_or_below(0, 70.0, start=10) == 70
+        assert market_data.first_bar_in_range(0, 125.0, start=0) == 150
+        assert market_data.first_bar_in_range(0, 100.0, start=199) == 199
+        assert market_data.first_bar_in_range(0, 200.0, start=0) == 200
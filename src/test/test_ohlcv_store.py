@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.backtest_engine import BacktestEngine
+from src.ohlcv_store import OHLCVStore
+from src.synthetic import generate_ohlcv
+from src.test.helpers import make_trade_orders
+
+
+class TestOHLCVStore:
+    @pytest.fixture
+    def ohlvc(self):
+        return generate_ohlcv(["AAPL", "GOOGL"], 100, seed=0)
+
+    @pytest.fixture
+    def downloads(self):
+        return []
+
+    @pytest.fixture
+    def ohlcv_store(self, tmp_path, ohlvc, downloads):
+        def download(symbol, start, end):
+            downloads.append((symbol, start, end))
+            df = ohlvc[symbol]
+            return df[(df.index >= start) & (df.index < end)]
+
+        return OHLCVStore(str(tmp_path), downloader=download)
+
+    def test_load_matches_concat(self, ohlcv_store, ohlvc):
+        ohlcv_store.update(["AAPL", "GOOGL"], ohlvc.index[0], ohlvc.index[-1] + pd.Timedelta(days=1))
+
+        assert ohlcv_store.tickers() == ["AAPL", "GOOGL"]
+        pd.testing.assert_frame_equal(ohlcv_store.load(["AAPL", "GOOGL"]), ohlvc, check_names=False, check_freq=False)
+        pd.testing.assert_frame_equal(
+            ohlcv_store.load(["GOOGL"], start=ohlvc.index[10], end=ohlvc.index[20]),
+            ohlvc[["GOOGL"]].iloc[10:20],
+            check_names=False,
+            check_freq=False,
+        )
+
+    def test_update_downloads_missing_dates(self, ohlcv_store, ohlvc, downloads):
+        ohlcv_store.update(["AAPL"], ohlvc.index[20], ohlvc.index[50])
+        ohlcv_store.update(["AAPL"], ohlvc.index[20], ohlvc.index[50])
+        assert len(downloads) == 1
+
+        ohlcv_store.update(["AAPL"], ohlvc.index[0], ohlvc.index[-1] + pd.Timedelta(days=1))
+        assert downloads[1:] == [
+            ("AAPL", ohlvc.index[0], ohlvc.index[20]),
+            ("AAPL", ohlvc.index[50], ohlvc.index[-1] + pd.Timedelta(days=1)),
+        ]
+        pd.testing.assert_frame_equal(ohlcv_store.load(["AAPL"]), ohlvc[["AAPL"]], check_names=False, check_freq=False)
+
+    def test_update_downloads_every_gap(self, ohlcv_store, downloads):
+        ohlvc = generate_ohlcv(["AAPL", "MSFT"], 120, seed=0)
+
+        def download(symbol, start, end):
+            downloads.append((start, end))
+            return ohlvc[symbol][(ohlvc.index >= start) & (ohlvc.index < end)]
+
+        ohlcv_store.downloader = download
+        ohlcv_store.update(["AAPL"], ohlvc.index[0], ohlvc.index[20])
+        ohlcv_store.update(["AAPL"], ohlvc.index[100], ohlvc.index[-1] + pd.Timedelta(days=1))
+        ohlcv_store.update(["AAPL"], ohlvc.index[0], ohlvc.index[-1] + pd.Timedelta(days=1))
+
+        assert downloads[2:] == [(ohlvc.index[20], ohlvc.index[100])]
+        assert ohlcv_store.coverage("AAPL") == [(ohlvc.index[0], ohlvc.index[-1] + pd.Timedelta(days=1))]
+        pd.testing.assert_frame_equal(ohlcv_store.load(["AAPL"]), ohlvc[["AAPL"]], check_names=False, check_freq=False)
+
+        # Several gaps within one update are downloaded separately
+        ohlcv_store.update(["MSFT"], ohlvc.index[10], ohlvc.index[20])
+        ohlcv_store.update(["MSFT"], ohlvc.index[40], ohlvc.index[50])
+        ohlcv_store.update(["MSFT"], ohlvc.index[0], ohlvc.index[60])
+        assert downloads[5:] == [
+            (ohlvc.index[0], ohlvc.index[10]),
+            (ohlvc.index[20], ohlvc.index[40]),
+            (ohlvc.index[50], ohlvc.index[60]),
+        ]
+
+    def test_load_aligns_dates(self, ohlcv_store, ohlvc):
+        ohlcv_store.write("AAPL", ohlvc["AAPL"].iloc[:60])
+        ohlcv_store.write("GOOGL", ohlvc["GOOGL"].iloc[40:].drop(columns=["Volume"]))
+
+        result = ohlcv_store.load(["AAPL", "GOOGL"])
+        assert len(result) == 100
+        assert result[("AAPL", "Close")].iloc[60:].isna().all()
+        assert result[("GOOGL", "Volume")].isna().all()
+        np.testing.assert_array_equal(result[("GOOGL", "High")].iloc[40:], ohlvc[("GOOGL", "High")].iloc[40:])
+
+    def test_missing_ticker(self, ohlcv_store):
+        with pytest.raises(KeyError, match="MSFT"):
+            ohlcv_store.load(["MSFT"])
+
+    def test_backtest_offline(self, ohlcv_store, ohlvc, downloads):
+        ohlcv_store.update(["AAPL", "GOOGL"], ohlvc.index[0], ohlvc.index[-1] + pd.Timedelta(days=1))
+        offline_store = OHLCVStore(ohlcv_store.root, downloader=lambda *args: pytest.fail("downloaded"))
+        offline_store.update(["AAPL", "GOOGL"], ohlvc.index[0], ohlvc.index[-1] + pd.Timedelta(days=1))
+
+        trade_orders = make_trade_orders(ohlvc, groups=20, seed=0)
+        backtest_engine = BacktestEngine(trade_orders, offline_store.load(["AAPL", "GOOGL"]))
+        backtest_engine.backtest()
+        assert len(backtest_engine.combined_holding_records) == 100
@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import constants
+from src.order_book import OrderBook
+
+
+class TestOrderBook:
+    @pytest.fixture
+    def order_book(self):
+        trade_orders = pd.DataFrame(
+            {
+                "order_id": ["TEST_1", "TEST_1", "TEST_2"],
+                "attached_order": [False, True, False],
+                "order_date": pd.to_datetime(["2022-01-03", None, "2022-01-05"]),
+                "ticker": ["AAPL", "AAPL", "GOOGL"],
+                "order_type": [constants.LIMIT_ORDER, constants.LIMIT_ORDER, constants.MARKET_ORDER],
+                "action": [constants.TRADE_ACTION_BUY, constants.TRADE_ACTION_SELL, constants.TRADE_ACTION_BUY],
+                "limit_price": [100.0, 110.0, np.nan],
+                "limit_offset": [0.0, 0.0, 0.0],
+                "stop_price": [0.0, 0.0, 0.0],
+                "quantity": [10, 10, 5],
+                "trail_type": ["N.A.", "N.A.", "N.A."],
+                "trail": [0.0, 0.0, 0.0],
+                "time_in_force": [constants.TIME_IN_FORCE_DAY, constants.TIME_IN_FORCE_GTC, constants.TIME_IN_FORCE_DAY],
+                "strategy": ["a", "a", "b"],
+                "status": ["", "", ""],
+                "comments": ["", "", ""],
+                "filled_date": ["", "", ""],
+                "filled_price": ["", "", ""],
+            }
+        )
+        return OrderBook.from_dataframe(trade_orders)
+
+    def test_from_dataframe(self, order_book):
+        assert order_book.size == 3
+        assert order_book.quantity[:3].tolist() == [10.0, 10.0, 5.0]
+        assert order_book.order_date[1] == pd.NaT.value
+        assert np.isnan(order_book.filled_price[:3]).all()
+        assert order_book.group("TEST_1") == [0, 1]
+
+    def test_codes(self, order_book):
+        assert order_book.order_type_code[:3].tolist() == [
+            constants.LIMIT_ORDER_CODE,
+            constants.LIMIT_ORDER_CODE,
+            constants.MARKET_ORDER_CODE,
+        ]
+        assert order_book.time_in_force_code[:3].tolist() == [
+            constants.TIME_IN_FORCE_DAY_CODE,
+            constants.TIME_IN_FORCE_GTC_CODE,
+            constants.TIME_IN_FORCE_DAY_CODE,
+        ]
+        # Unknown and missing values
+        assert order_book.trail_type_code[:3].tolist() == [0, 0, 0]
+        assert order_book.status_code[:3].tolist() == [0, 0, 0]
+
+        order_book.set_status(0, constants.ORDER_STATUS_FILLED, pd.Timestamp("2022-01-03").value)
+        assert order_book.status_code[0] == constants.ORDER_STATUS_FILLED_CODE
+        row = order_book.append(
+            order_id="TEST_1",
+            attached_order=True,
+            order_date=pd.NaT.value,
+            ticker="AAPL",
+            order_type=constants.TRAILING_STOP_ORDER,
+            action=constants.TRADE_ACTION_SELL,
+            limit_price=90.0,
+            time_in_force=constants.TIME_IN_FORCE_GTC,
+            quantity=10,
+            trail_type=constants.TRAIL_TYPE_PERCENTAGE,
+            trail=0.05,
+        )
+        assert order_book.order_type_code[row] == constants.TRAILING_STOP_ORDER_CODE
+        assert order_book.action_code[row] == constants.TRADE_ACTION_SELL_CODE
+        assert order_book.trail_type_code[row] == constants.TRAIL_TYPE_PERCENTAGE_CODE
+        assert order_book.status_code[row] == constants.ORDER_STATUS_PENDING_CODE
+
+    def test_active_rows(self, order_book):
+        assert order_book.active_rows(pd.Timestamp("2022-01-02").value).tolist() == []
+        assert order_book.active_rows(pd.Timestamp("2022-01-03").value).tolist() == [0]
+        assert order_book.active_rows(pd.Timestamp("2022-01-05").value).tolist() == [0, 2]
+
+        order_book.set_status(0, constants.ORDER_STATUS_FILLED, pd.Timestamp("2022-01-05").value)
+        order_book.set_status(1, constants.ORDER_STATUS_PENDING)
+        order_book.set_order_date(1, pd.Timestamp("2022-01-05").value)
+        assert order_book.active_rows(pd.Timestamp("2022-01-05").value).tolist() == [1, 2]
+
+    def test_append_grows_and_indexes_order_id(self, order_book):
+        rows = [
+            order_book.append(
+                order_id="TEST_1",
+                attached_order=True,
+                order_date=pd.Timestamp("2022-01-04").value,
+                ticker="AAPL",
+                order_type=constants.LIMIT_ORDER,
+                action=constants.TRADE_ACTION_SELL,
+                limit_price=95.0,
+                time_in_force=constants.TIME_IN_FORCE_GTC,
+                quantity=10,
+            )
+            for _ in range(100)
+        ]
+        assert order_book.size == 103
+        assert order_book.capacity >= 103
+        assert order_book.group("TEST_1") == [0, 1] + rows
+        assert order_book.oco_rows(rows[0]) == [0, 1] + rows
+        assert order_book.limit_price[rows[-1]] == 95.0
+
+    def test_oco_rows(self, order_book):
+        row = order_book.append(
+            order_id="TEST_1",
+            attached_order=True,
+            order_date=pd.NaT.value,
+            ticker="AAPL",
+            order_type=constants.STOP_ORDER,
+            action=constants.TRADE_ACTION_SELL,
+            limit_price=90.0,
+            time_in_force=constants.TIME_IN_FORCE_GTC,
+            quantity=10,
+            stop_price=90.0,
+            oco_group="A",
+        )
+        assert order_book.group("TEST_1") == [0, 1, row]
+        assert order_book.oco_rows(1) == [0, 1]
+        assert order_book.oco_rows(row) == [row]
+
+    def test_to_dataframe(self, order_book):
+        order_book.set_status(0, constants.ORDER_STATUS_FILLED, pd.Timestamp("2022-01-03").value)
+        order_book.filled_price[0] = 100.0
+        order_book.set_status(2, constants.ORDER_STATUS_CANCELLED, pd.Timestamp("2022-01-05").value, comments="x")
+
+        result = order_book.to_dataframe()
+        assert list(result.columns[:3]) == ["order_id", "attached_order", "order_date"]
+        assert result["strategy"].tolist() == ["a", "a", "b"]
+        assert result["status"].tolist() == [constants.ORDER_STATUS_FILLED, "", constants.ORDER_STATUS_CANCELLED]
+        assert result["filled_price"].tolist() == [100.0, "", ""]
+        assert result.loc[0, "filled_date"] == pd.Timestamp("2022-01-03")
+        assert result.loc[1, "filled_date"] == ""
+        assert pd.isna(result.loc[1, "order_date"])
@@ -0,0 +1,91 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import constants
+from src.report import RETURNS_STATS_COLUMNS, monthly_returns, returns_stats, trade_stats
+from src.sweep import run_sweep
+from src.synthetic import generate_ohlcv
+from src.test.helpers import make_trade_orders, run_backtest
+
+
+class TestReport:
+    @pytest.fixture
+    def returns(self):
+        index = pd.bdate_range("2022-01-03", periods=300)
+        return pd.Series(np.random.default_rng(0).normal(0.0005, 0.01, 300), index=index)
+
+    def test_returns_stats(self, returns):
+        stats = returns_stats(pd.concat([returns, returns * 2], axis=1, keys=["a", "b"]))
+
+        assert stats.columns.tolist() == RETURNS_STATS_COLUMNS
+        assert stats.index.tolist() == ["a", "b"]
+        r = returns.to_numpy()
+        growth = np.cumprod(1 + r)
+        a = stats.loc["a"]
+        assert a["periods"] == 300
+        assert a["total_return"] == pytest.approx(growth[-1] - 1)
+        assert a["cagr"] == pytest.approx(growth[-1] ** (252 / 300) - 1)
+        assert a["sharpe"] == pytest.approx(r.mean() / r.std(ddof=1) * np.sqrt(252))
+        assert a["sortino"] == pytest.approx(r.mean() / np.sqrt(np.mean(np.minimum(r, 0) ** 2)) * np.sqrt(252))
+        assert a["max_drawdown"] == pytest.approx((growth / np.maximum.accumulate(growth) - 1).min())
+        assert a["win_rate"] == pytest.approx((r > 0).mean())
+        # Doubling the returns does not change the Sharpe ratio
+        assert stats.loc["b", "sharpe"] == pytest.approx(a["sharpe"])
+
+    def test_monthly_returns(self, returns):
+        table = monthly_returns(returns)
+
+        assert table.index.tolist() == [2022, 2023]
+        january = returns[(returns.index.year == 2022) & (returns.index.month == 1)]
+        assert table.loc[2022, "Jan"] == pytest.approx(np.prod(1 + january) - 1)
+        assert table.loc[2022, "Year"] == pytest.approx(np.prod(1 + returns[returns.index.year == 2022]) - 1)
+        assert np.isnan(table.loc[2023, "Dec"])
+
+    def test_trade_stats(self):
+        trades = pd.DataFrame(
+            {
+                "symbol": ["A", "A", "B"],
+                "action": [constants.TRADE_ACTION_BUY, constants.TRADE_ACTION_SELL, constants.TRADE_ACTION_BUY],
+                "limit_price": [10.0, 12.0, 5.0],
+                "quantity": [10.0, 10.0, 4.0],
+                "fees": [1.0, 1.0, 1.0],
+            }
+        )
+        stats = trade_stats(trades)
+
+        assert stats["trades"] == 3
+        assert stats["buys"] == 2 and stats["sells"] == 1
+        assert stats["symbols"] == 2
+        assert stats["traded_value"] == 240.0
+        assert stats["total_fees"] == 3.0
+
+    def test_from_engine(self, tmp_path):
+        ohlvc = generate_ohlcv(["AAPL", "GOOGL"], 100, seed=0)
+        backtest_engine = run_backtest(make_trade_orders(ohlvc, groups=30, seed=0), ohlvc)
+        benchmark = ohlvc[("AAPL", "Adj Close")].pct_change().rename("AAPL")
+
+        report = backtest_engine.generate_tear_down(str(tmp_path / "report.html"), benchmark=benchmark)
+        assert report.stats.index.tolist() == ["Strategy", "AAPL"]
+        assert report.trade_stats["trades"] == sum(len(s.trades) for s in backtest_engine.stocks.values())
+        assert report.trade_stats["total_fees"] == pytest.approx(backtest_engine.fees)
+        assert "<svg" in (tmp_path / "report.html").read_text()
+
+        backtest_engine.generate_tear_down(str(tmp_path / "report.json"), benchmark=benchmark)
+        data = json.loads((tmp_path / "report.json").read_text())
+        assert data["stats"]["Strategy"]["sharpe"] == pytest.approx(report.stats.loc["Strategy", "sharpe"])
+        assert "beta" not in data["stats"]["AAPL"]
+
+    def test_sweep_reports(self, tmp_path):
+        ohlvc = generate_ohlcv(["AAPL", "GOOGL"], 60, seed=0)
+        results = run_sweep(ohlvc, [make_trade_orders(ohlvc, groups=10, seed=seed) for seed in range(3)], max_workers=0)
+
+        stats = results.stats()
+        assert stats.index.tolist() == [0, 1, 2]
+        np.testing.assert_allclose(stats["total_return"], results.summary["total_return"])
+        np.testing.assert_allclose(stats["max_drawdown"], results.summary["max_drawdown"])
+
+        paths = results.write_reports(str(tmp_path), extension="json")
+        assert [json.load(open(path))["title"] for path in paths] == ["Run 0", "Run 1", "Run 2"]
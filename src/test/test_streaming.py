@@ -0,0 +1,69 @@
+import pandas as pd
+import pytest
+
+from src import constants
+from src.backtest_engine import BacktestEngine
+from src.synthetic import generate_ohlcv, generate_order_book, intraday_index
+from src.test.helpers import make_trade_orders, run_backtest
+
+
+def iterate_chunks(ohlvc, chunk_size):
+    for start in range(0, len(ohlvc), chunk_size):
+        yield ohlvc.iloc[start : start + chunk_size]
+
+
+class TestStreaming:
+    @pytest.mark.parametrize("seed", [0, 1])
+    @pytest.mark.parametrize(
+        "kwargs",
+        [
+            {},
+            {"fill_mode": constants.FILL_MODE_BATCHED, "skip_idle_bars": True},
+        ],
+    )
+    def test_matches_backtest(self, tmp_path, seed, kwargs):
+        ohlvc = generate_ohlcv(["AAPL", "GOOGL", "MSFT"], 150, seed=seed)
+        trade_orders = make_trade_orders(ohlvc, groups=60, seed=seed)
+        expected = run_backtest(trade_orders, ohlvc, **kwargs)
+
+        records_path = tmp_path / "records.csv"
+        backtest_engine = BacktestEngine(trade_orders, initial_capital=100000.0, **kwargs)
+        backtest_engine.backtest_stream(iterate_chunks(ohlvc, 40), records_path)
+
+        pd.testing.assert_frame_equal(expected.order_book, backtest_engine.order_book)
+        for symbol, stock_entity in expected.stocks.items():
+            pd.testing.assert_frame_equal(stock_entity.trades, backtest_engine.stocks[symbol].trades)
+        assert expected.current_capital == backtest_engine.current_capital
+        assert expected.fees == backtest_engine.fees
+
+        # Only the records of the last chunk are kept in memory
+        assert len(backtest_engine.combined_holding_records) == 30
+        records = pd.read_csv(records_path, header=[0, 1], index_col=0, parse_dates=True)
+        pd.testing.assert_frame_equal(
+            records, expected.combined_holding_records, check_names=False, check_freq=False, check_dtype=False
+        )
+
+    @pytest.mark.parametrize(
+        "kwargs",
+        [
+            {},
+            {"fill_mode": constants.FILL_MODE_BATCHED, "skip_idle_bars": True},
+        ],
+    )
+    def test_intraday_matches_backtest(self, tmp_path, kwargs):
+        # Sessions of 78 bars split into chunks of 20, Day orders rest across the chunks of their session
+        index = intraday_index(3, freq="5min")
+        ohlvc = generate_ohlcv(["AAPL", "GOOGL"], len(index), seed=0, index=index)
+        trade_orders = generate_order_book(ohlvc, groups=60, seed=0)
+        expected = run_backtest(trade_orders, ohlvc, **kwargs)
+
+        backtest_engine = BacktestEngine(trade_orders, initial_capital=100000.0, **kwargs)
+        backtest_engine.backtest_stream(iterate_chunks(ohlvc, 20), tmp_path / "records.csv")
+
+        order_book = expected.order_book
+        day_orders = order_book["time_in_force"] == constants.TIME_IN_FORCE_DAY
+        assert (day_orders & (order_book["status"] == constants.ORDER_STATUS_FILLED)).any()
+        pd.testing.assert_frame_equal(order_book, backtest_engine.order_book)
+        for symbol, stock_entity in expected.stocks.items():
+            pd.testing.assert_frame_equal(stock_entity.trades, backtest_engine.stocks[symbol].trades)
+        assert expected.current_capital == backtest_engine.current_capital
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import constants
+from src.market_data import MarketData
+from src.sweep import run_sweep
+from src.synthetic import generate_ohlcv
+from src.test.helpers import make_trade_orders, run_backtest
+
+
+class TestSweep:
+    @pytest.fixture
+    def ohlvc(self):
+        return generate_ohlcv(["AAPL", "GOOGL", "MSFT"], 120, seed=0)
+
+    @pytest.fixture
+    def order_books(self, ohlvc):
+        return [make_trade_orders(ohlvc, groups=30, seed=seed) for seed in range(4)]
+
+    @pytest.mark.parametrize("max_workers", [0, 2])
+    def test_matches_backtest(self, ohlvc, order_books, max_workers):
+        results = run_sweep(ohlvc, order_books, max_workers=max_workers, fill_mode=constants.FILL_MODE_BATCHED)
+
+        assert results.summary.index.tolist() == [0, 1, 2, 3]
+        assert results.returns.shape == (120, 4)
+        for run_id, order_book in enumerate(order_books):
+            expected = run_backtest(order_book, ohlvc)
+            portfolio = expected.combined_holding_records["Portfolio"]
+            assert results.summary.loc[run_id, "final_nav"] == portfolio["portfolio_value"].iloc[-1]
+            assert results.summary.loc[run_id, "total_fees"] == expected.fees
+            np.testing.assert_array_equal(results.returns[run_id].to_numpy(), portfolio["returns"].to_numpy())
+
+    def test_shared_memory(self, ohlvc):
+        market_data = MarketData.from_ohlvc(ohlvc)
+        block, spec = market_data.to_shared_memory()
+        try:
+            shared, shared_block = MarketData.from_shared_memory(spec)
+            assert shared.columns == market_data.columns
+            np.testing.assert_array_equal(shared.high, market_data.high)
+            np.testing.assert_array_equal(shared.adj_close, market_data.adj_close)
+            del shared
+            shared_block.close()
+        finally:
+            block.close()
+            block.unlink()
+
+    def test_missing_ticker(self, ohlvc, order_books):
+        order_book = order_books[0].assign(ticker="TSLA")
+        with pytest.raises(ValueError, match="TSLA"):
+            run_sweep(ohlvc, [order_book], max_workers=0)